@@ -0,0 +1,132 @@
+#
+# A registry of the capabilities of remote NLIP agents.
+#
+# A coordinator learns what a remote agent can do by asking it "What are your NLIP Capabilities?".
+# The answer (the agent's NAME and capabilities) costs a full LLM turn at the remote agent, and
+# without a registry every coordinator session asks again.  The registry keeps the answers by
+# agent URL (scheme://netloc), shared by all coordinator sessions in the process:
+#
+#   - an answer is fresh for ttl seconds, after which the agent is asked again
+#   - an entry is invalidated explicitly, or when the agent stops answering
+#
+# The registry can be preloaded from a JSON file, and new answers are written back to that file.
+#
+#   {
+#     "mem://weather": {"capabilities": "My name is [Weather] ...", "updated_at": 1760000000.0},
+#     ...
+#   }
+#
+
+import asyncio
+import json
+import os
+import threading
+import time
+from typing import Optional
+
+from checkr_agents import logger
+
+CAPABILITY_REGISTRY_ENV = "CHECKR_CAPABILITY_REGISTRY"
+
+# the question that discovers the capabilities of an agent
+CAPABILITY_QUERY = "What are your NLIP Capabilities?"
+
+# defaults
+CAPABILITY_TTL = 3600.0    # seconds
+
+
+def is_capability_query(msg: str) -> bool:
+    return " ".join(msg.split()).strip().lower() == CAPABILITY_QUERY.lower()
+
+
+class CapabilityRegistry:
+
+    def __init__(self, path: Optional[str] = None, ttl: float = CAPABILITY_TTL):
+        """
+        Args:
+          path: a JSON file to preload from and persist to (None: memory only)
+          ttl: the number of seconds an answer stays fresh
+        """
+
+        self.path = path
+        self.ttl = ttl
+        self.agents: dict[str, dict] = { }
+        self.lock = threading.Lock()
+
+        # snapshots are numbered, so that an older one is never written over a newer one
+        self.generation = 0
+        self.saved_generation = 0
+
+        # counters
+        self.hits = 0            # discovery round-trips saved
+        self.discoveries = 0     # answers recorded
+        self.invalidations = 0
+
+        if path and os.path.exists(path):
+            self.load(path)
+
+    def load(self, path: str):
+        """Preload (or merge) entries from a JSON file."""
+        with open(path) as f:
+            self.agents.update(json.load(f))
+        logger.info(f"CapabilityRegistry: loaded {len(self.agents)} agents from {path}")
+
+    def get(self, hashkey: str) -> Optional[str]:
+        """The capabilities of the agent at hashkey, if they are fresh."""
+        entry = self.agents.get(hashkey, None)
+        if entry is None or time.time() - entry["updated_at"] > self.ttl:
+            return None
+        self.hits += 1
+        return entry["capabilities"]
+
+    async def put(self, hashkey: str, capabilities: str):
+        self.agents[hashkey] = {"capabilities": capabilities, "updated_at": time.time()}
+        self.discoveries += 1
+        if self.path:
+            await asyncio.to_thread(self.save, self.snapshot())
+
+    async def invalidate(self, hashkey: Optional[str] = None):
+        """Forget the agent at hashkey (None: forget all agents)."""
+        if hashkey is None:
+            self.invalidations += len(self.agents)
+            self.agents.clear()
+        elif self.agents.pop(hashkey, None) is not None:
+            self.invalidations += 1
+        else:
+            return
+
+        if self.path:
+            await asyncio.to_thread(self.save, self.snapshot())
+
+    #
+    # The registry is changed on the event loop and written in a thread: the thread writes a copy
+    # taken on the loop, never the live dict.
+    #
+
+    def snapshot(self) -> tuple[int, dict]:
+        self.generation += 1
+        return self.generation, {key: dict(entry) for key, entry in self.agents.items()}
+
+    def save(self, snapshot: Optional[tuple[int, dict]] = None):
+        """Write a snapshot of the registry (default: the registry now) to its file atomically."""
+        generation, agents = snapshot if snapshot is not None else self.snapshot()
+        with self.lock:
+            if generation <= self.saved_generation:
+                return    # a newer snapshot has been written already
+            tmp = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp, "w") as f:
+                json.dump(agents, f, indent=1)
+            os.replace(tmp, self.path)
+            self.saved_generation = generation
+
+    def metrics(self) -> dict:
+        return {
+            "agents": len(self.agents),
+            "hits": self.hits,
+            "discoveries": self.discoveries,
+            "invalidations": self.invalidations,
+        }
+
+
+# the registry shared by the coordinators of this process
+CAPABILITIES = CapabilityRegistry(path=os.environ.get(CAPABILITY_REGISTRY_ENV, None))
@@ -7,31 +7,203 @@
 #   - loads assertion modules
 #   - sets up assertion loggers (ToDo:)
 #
+# Scopes.  Checkr() is one process-wide instance shared by all agents.  Concurrent sessions then
+# interleave their events and flags in one runner.  An agent can instead use a scoped Checkr of
+# its own (scope "agent", i.e. one per session) or one per agent class (scope "class"), selected
+# with the checkr_scope argument of the agent or the CHECKR_SCOPE environment variable.
+#
+#   - a scoped Checkr has its own runner, events and flags, and its own private copy of each
+#     assertion module, so the same assertions run independently in every scope
+#   - the assertion specs of scoped Checkrs are registered with add_scoped_spec()
+#   - the process-wide Checkr is the aggregator: when a spec has been loaded into it, the events
+#     and flag changes of every scoped Checkr are also posted to it, for assertions across agents
+#     (its flags are those of all scopes together, as with a process-wide Checkr)
+#
+# Evaluation.  By default ("inline") post_and_run evaluates the assertions right away, on the
+# request path of the agent.  In the "deferred" mode (CHECKR_EVAL=deferred) events and flag
+# changes are appended to a bounded queue instead, and a background task drains it in batches:
+# the events between two flag changes are posted together and evaluated with one run_until.
+#
+#   - when the queue is full, the overflow policy decides: "inline" (the producer evaluates the
+#     backlog itself - backpressure), "drop_oldest" or "drop_newest" (events are dropped and
+#     counted; flag changes are never dropped)
+#   - flush() evaluates everything queued; flush_checkrs() flushes all deferred Checkrs and is
+#     registered by the servers of agent sessions to run when the last app of the process shuts down
+#
+# Subscriptions.  An event that no loaded assertion subscribes to (and that is not written to an
+# event log) costs next to nothing: post_and_run returns at once.  An assertion module subscribes
+# to every event, unless it declares its events in a module global:
+#
+#     SUBSCRIBE = ["on_query_received", "on_query_handled"]   - these events only
+#     SUBSCRIBE = "auto"                                       - the events named in its code
+#
+# "auto" finds the names referred to by the functions and classes of the module (the events its
+# watchers wait on); it does not see events reached through helpers of other modules.  Events can
+# also be added at run time with subscribe("on_one_tool_called", ...).
+#
+# Event log.  With CHECKR_EVENT_LOG set (see event_log.py), every event and flag change posted to
+# a Checkr is also written to an NDJSON log, so that assertions can be checked out of process by
+# the event_checker.  Events forwarded to the aggregator are not written twice.
+#
 
+import asyncio
+import importlib
+import importlib.util
+import inspect
 import logging
+import os
+import time
+import types
+import weakref
+from typing import Optional
+from collections import deque
+from uuid import uuid4
 
 from oroboro import *
-import importlib
 
 from checkr_agents import logger # get the logger
+from .event_log import EventLog, event_log_from_env
+from .event_payload import EVENT_CONTENT_ENV
+
+CHECKR_SCOPE_ENV = "CHECKR_SCOPE"
+CHECKR_SCOPES = ("process", "class", "agent")
+
+# the default scope of the Checkr of an agent
+CHECKR_SCOPE = os.environ.get(CHECKR_SCOPE_ENV, "process")
+
+# assertion specs loaded into every scoped Checkr
+SCOPED_SPECS: list[str] = [ ]
+
+# the Checkrs of the "class" scope: agent class name -> Checkr
+_class_checkrs = { }
+
+CHECKR_EVAL_ENV = "CHECKR_EVAL"
+EVAL_MODES = ("inline", "deferred")
+OVERFLOW_POLICIES = ("inline", "drop_oldest", "drop_newest")
+
+# defaults of the evaluation
+EVAL_MODE = os.environ.get(CHECKR_EVAL_ENV, "inline")
+QUEUE_SIZE = 10000      # queued entries before the overflow policy applies
+MAX_BATCH = 256         # entries evaluated by the drain task before it yields
+OVERFLOW = "inline"
+
+# the Checkrs with a drain task, flushed at shutdown
+_deferred_checkrs = weakref.WeakSet()
+
+# the live Checkrs of the process, for their metrics
+_checkrs = weakref.WeakSet()
+
+# the event log of the Checkrs of this process
+EVENT_LOG: Optional[EventLog] = event_log_from_env()
+
+# the SUBSCRIBE of an assertion module whose events are found in its code
+SUBSCRIBE_AUTO = "auto"
+
+
+#
+# The global names referred to by the functions and classes of a module, the functions nested in
+# them, and the closures they keep
+#
+
+def _code_of(value) -> list:
+    if isinstance(value, (staticmethod, classmethod)):
+        value = value.__func__
+    elif isinstance(value, property):
+        return [code for f in (value.fget, value.fset, value.fdel) for code in _code_of(f)]
+    if inspect.isfunction(value):
+        codes = [value.__code__]
+        for cell in value.__closure__ or ( ):
+            try:
+                codes.extend(_code_of(cell.cell_contents))
+            except ValueError:
+                pass    # an empty cell
+        return codes
+    return [ ]
+
+
+def referenced_names(mod) -> set[str]:
+    codes = [ ]
+    for value in vars(mod).values():
+        if getattr(value, "__module__", None) != mod.__name__:
+            continue
+        if inspect.isclass(value):
+            for member in vars(value).values():
+                codes.extend(_code_of(member))
+        else:
+            codes.extend(_code_of(value))
+
+    names = set()
+    seen = set()
+    while codes:
+        code = codes.pop()
+        if id(code) in seen:
+            continue
+        seen.add(id(code))
+        names.update(code.co_names)
+        codes.extend(c for c in code.co_consts if isinstance(c, types.CodeType))
+    return names
+
+
+def add_scoped_spec(modspec: str):
+    """Load the assertion spec (ex: "checkr_agents.assertions.assertion1:mainfn") into every scoped Checkr."""
+    if modspec not in SCOPED_SPECS:
+        SCOPED_SPECS.append(modspec)
+
 
 class Checkr:
 
-    # Make this a singleton in a multi-agent system
+    # The process-wide instance is a singleton in a multi-agent system
     _instance = None
     
-    def __new__(cls, *args, **kwargs):
+    def __new__(cls, *args, scoped: bool = False, **kwargs):
+        if scoped:
+            return super().__new__(cls)
         if cls._instance is None:
              # create new instance if none exists
             cls._instance = super().__new__(cls)
         return cls._instance
 
-    def __init__(self):
+    def __init__(self, scoped: bool = False, aggregator: "Checkr" = None):
 
         # initialize only if is the first time
         if hasattr(self, 'oro'):
             return
 
+        # time is relative to the creation of this Checkr
+        self.tstart = time.time()
+        _checkrs.add(self)
+
+        # a scoped Checkr has private assertion modules and forwards its events to the aggregator
+        self.scoped = scoped
+        self.aggregator = aggregator
+        self.scoped_specs_loaded = False
+
+        # id(event) -> name, for forwarding and the event log
+        self.event_names = { }
+
+        # the names of the events the loaded assertions subscribe to (or all of them), and the
+        # ids of the events posted locally, forwarded to the aggregator or at least logged
+        self.subscribed: set[str] = set()
+        self.subscribe_all = False
+        self.local_events: set[int] = set()
+        self.forwarded_events: set[int] = set()
+        self.live_events: set[int] = set()
+        self.listening = False
+
+        # bumped when the subscriptions of this Checkr may have changed; the live events are
+        # recomputed when this one's or the aggregator's has changed
+        self.subscriptions_version = 0
+        self.subscriptions_seen = (-1, -1)
+
+        # names of the events whose payloads carry their full content (see event_payload.py)
+        self.content_events: set[str] = {
+            name.strip() for name in os.environ.get(EVENT_CONTENT_ENV, "").split(",") if name.strip()
+        }
+
+        # events are also written to the event log, if any, under the name of this Checkr
+        self.event_log: Optional[EventLog] = EVENT_LOG
+        self.source = uuid4().hex[:8] if scoped else "process"
+
         # globals for use in eval
         self.globs = { }
 
@@ -65,31 +237,214 @@ class Checkr:
         # experimental: populate the flags in the module
         self.globs['flags'] = self.flags
 
+        # assertions call this to receive the full content of events
+        self.globs['want_content'] = self.want_content
+
+        # assertions call this to receive events they do not name in their code
+        self.globs['subscribe'] = self.subscribe
+
         # the Oroboro runner
         self.oro = Oroboro()
 
-        # the Assertion module and mainfn generator
+        # the Assertion modules and the mainfn generator of the last one
+        self.mods = [ ]
         self.mod = None
         self.mainfn = None
-        
+
+        # evaluation: a queue of (t, event, args) and flag changes (None, fn, args)
+        self.set_evaluation(EVAL_MODE)
+        self.queue = deque()
+        self.drain_task = None
+        self.wakeup = None
+
+        # the time of the latest event posted to the runner
+        self.last_t = 0.0
+
+        # counters
+        self.posted = 0
+        self.skipped = 0
+        self.evaluated = 0
+        self.dropped = 0
+        self.batches = 0
+        self.overflows = 0
+        self.max_depth = 0
+
+    def set_evaluation(self, mode: str, queue_size: int = QUEUE_SIZE, max_batch: int = MAX_BATCH, overflow: str = OVERFLOW):
+        """Evaluate "inline" or "deferred" (queued, in batches, by a background task)."""
+
+        if mode not in EVAL_MODES:
+            raise ValueError(f"Unknown Checkr evaluation mode:{mode}")
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown Checkr overflow policy:{overflow}")
+
+        if getattr(self, "queue", None):
+            self.flush_now()
+
+        self.eval_mode = mode
+        self.queue_size = queue_size
+        self.max_batch = max_batch
+        self.overflow = overflow
+
+    #
+    # The Checkr of an agent in a scope
+    #
+
+    @classmethod
+    def for_scope(cls, scope: str, class_name: str) -> "Checkr":
+
+        if scope not in CHECKR_SCOPES:
+            raise ValueError(f"Unknown Checkr scope:{scope}")
+
+        if scope == "process":
+            return cls()
+
+        if scope == "class":
+            checkr = _class_checkrs.get(class_name, None)
+            if checkr is None:
+                checkr = cls(scoped=True, aggregator=cls())
+                _class_checkrs[class_name] = checkr
+            return checkr
+
+        return cls(scoped=True, aggregator=cls())
+
+    def load_scoped_specs(self):
+        """Load the registered scoped specs, once, after the agent has defined its events."""
+        if not self.scoped or self.scoped_specs_loaded:
+            return
+        self.scoped_specs_loaded = True
+        for modspec in SCOPED_SPECS:
+            self.load_spec(modspec)
+
+    # time relative to the creation of this Checkr
+    def trel(self):
+        return time.time() - self.tstart
+
+
+    #
+    # Flag changes are ordered with the events, so that deferred predicates see the flags of their
+    # time.  They are forwarded to the aggregator with the events.
+    #
+
+    def _set_flag_value(self, name, val):
+        self.flags[name] = val
+        if self.forwarded_events:
+            self.aggregator._post_flag(self.aggregator._set_flag_value, (name, val))
+
+    def _clear_flags(self):
+        self.flags.clear()
+        if self.forwarded_events:
+            self.aggregator._post_flag(self.aggregator._clear_flags, ( ))
+
+    def _post_flag(self, fn, args):
+        if not self._defer((None, fn, args)):
+            fn(*args)
 
     def set_flag(self, name):
-        self.flags[name] = 1
+        if not self._listening():
+            return
+        self._log({"flag": name, "val": 1})
+        self._post_flag(self._set_flag_value, (name, 1))
 
     def clear_flag(self, name):
-        self.flags[name] = 0
+        if not self._listening():
+            return
+        self._log({"flag": name, "val": 0})
+        self._post_flag(self._set_flag_value, (name, 0))
 
     def get_flag(self, name):
         return self.flags.get(name, 0)
 
     def clear_all_flags(self):
-        self.flags.clear()
+        if not self._listening():
+            return
+        self._log({"clear_flags": True})
+        self._post_flag(self._clear_flags, ( ))
+
+    #
+    # Which events anybody listens to: the assertions of this Checkr, those of the aggregator,
+    # or the event log
+    #
+
+    def subscribe(self, *names):
+        self.subscribed.update(names)
+        self.subscriptions_changed()
+
+    def subscriptions_changed(self):
+        self.subscriptions_version += 1
+
+    def _subscriptions_stale(self) -> bool:
+        aggregator = self.aggregator
+        aggregator_version = aggregator.subscriptions_version if aggregator is not None else 0
+        return self.subscriptions_seen != (self.subscriptions_version, aggregator_version)
+
+    def refresh_subscriptions(self):
+        aggregator = self.aggregator
+        self.subscriptions_seen = (self.subscriptions_version,
+                                   aggregator.subscriptions_version if aggregator is not None else 0)
+
+        def subscribed_ids(checkr):
+            if checkr is None:
+                return set()
+            if checkr.subscribe_all:
+                return set(self.event_names)
+            return {key for key, name in self.event_names.items() if name in checkr.subscribed}
+
+        self.local_events = subscribed_ids(self)
+        self.forwarded_events = subscribed_ids(aggregator)
+
+        if self.event_log is not None:
+            self.live_events = set(self.event_names)
+        else:
+            self.live_events = self.local_events | self.forwarded_events
+
+        self.listening = bool(self.local_events or self.forwarded_events or self.event_log is not None)
+
+    # is anybody listening to this event?  (to skip building its payload)
+    def is_live(self, evt) -> bool:
+        if self._subscriptions_stale():
+            self.refresh_subscriptions()
+        return id(evt) in self.live_events
+
+    def _listening(self) -> bool:
+        if self._subscriptions_stale():
+            self.refresh_subscriptions()
+        return self.listening
+
+    #
+    # Event payloads carry the full content only for the events an assertion wants it for
+    #
+
+    def want_content(self, *names):
+        self.content_events.update(names)
+        self.subscribe(*names)
+
+    def wants_content(self, evt) -> bool:
+        name = self.event_names.get(id(evt), None)
+        if name in self.content_events:
+            return True
+        aggregator = self.aggregator
+        return aggregator is not None and name in aggregator.content_events
+
+    def set_event_log(self, event_log: Optional[EventLog]):
+        self.event_log = event_log
+        self.subscriptions_changed()
+
+    def _log(self, record: dict, t=None):
+        if self.event_log is None:
+            return
+        record["ts"] = time.time()
+        record["t"] = self.trel() if t is None else t
+        record["source"] = self.source
+        try:
+            self.event_log.emit(record)
+        except Exception as e:
+            logger.error(f"Checkr: writing the event log: {e}")
         
     # define in globs table and pass through if module has been loaded
     def define_symbol(self, name, val):
         self.globs[name] = val
-        if self.mod:
-            setattr(self.mod, name, val)
+        for mod in self.mods:
+            setattr(mod, name, val)
 
     # define a predicate that checks the flags table - used by tool calls in agent
     def define_pred(self, name):
@@ -128,13 +483,161 @@ class Checkr:
 
         # memoize
         self.event_dict[name] = evt
+        self.event_names[id(evt)] = name
+        self.subscriptions_changed()
 
         return evt
 
-    # post the event and run until t
+    # post the event and run until t (now, or later in the deferred mode)
     def post_and_run(self, t, evt, *args):
-        self.oro.post_at(t, evt, *args)
-        self.oro.run_until(t)
+        if self._subscriptions_stale():
+            self.refresh_subscriptions()
+
+        # nobody is listening: a near no-op
+        key = id(evt)
+        if key not in self.live_events:
+            self.skipped += 1
+            return
+
+        if self.event_log is not None:
+            self._log({"event": self.event_names.get(key, str(evt)), "args": list(args)}, t)
+
+        if key in self.local_events:
+            self._post(t, evt, args)
+        elif key in self.forwarded_events:
+            # only the aggregator listens; keep the order with the queued entries
+            if not self._defer((None, self._forward, (t, evt, args))):
+                self._forward(t, evt, args)
+
+    #
+    # Post an event to the aggregator at the time it was posted here, on the clock of the
+    # aggregator.  Events forwarded late (from a deferred queue) are not posted before events it
+    # has already seen.
+    #
+
+    def _forward(self, t, evt, args):
+        aggregator = self.aggregator
+        name = self.event_names[id(evt)]
+        t = max(t + self.tstart - aggregator.tstart, aggregator.last_t)
+        aggregator._post(t, aggregator.define_observer_event(name), args)
+
+    def _post(self, t, evt, args):
+        self.posted += 1
+        self.last_t = max(self.last_t, t)
+        if not self._defer((t, evt, args)):
+            self._evaluate([(t, evt, args)])
+
+    #
+    # Evaluate queued entries in order.  The events between two flag changes are posted
+    # together and evaluated with one run_until.
+    #
+
+    def _evaluate(self, entries):
+        events = [ ]
+        for t, evt, args in entries:
+            if t is None:
+                self._run(events)
+                events = [ ]
+                evt(*args)
+            else:
+                self.oro.post_at(t, evt, *args)
+                events.append((t, evt, args))
+        self._run(events)
+
+    def _run(self, events):
+        if not events:
+            return
+
+        self.oro.run_until(events[-1][0])
+        self.evaluated += len(events)
+        self.batches += 1
+
+        # cross-agent assertions see the events of every scope
+        if self.forwarded_events:
+            for t, evt, args in events:
+                if id(evt) in self.forwarded_events:
+                    self._forward(t, evt, args)
+
+    #
+    # Queue an entry for the drain task.  Returns False if it is to be evaluated now.
+    #
+
+    def _defer(self, entry) -> bool:
+        if self.eval_mode != "deferred":
+            return False
+
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            # no loop to drain the queue: keep the order and evaluate now
+            self.flush_now()
+            return False
+
+        if len(self.queue) >= self.queue_size:
+            self.overflows += 1
+            if self.overflow == "inline":
+                self.flush_now()
+            elif self.overflow == "drop_oldest":
+                oldest = self.queue.popleft()
+                if oldest[0] is None:
+                    self._evaluate([oldest])
+                else:
+                    self.dropped += 1
+            elif entry[0] is not None:
+                self.dropped += 1
+                return True
+
+        self.queue.append(entry)
+        self.max_depth = max(self.max_depth, len(self.queue))
+
+        if self.drain_task is None or self.drain_task.done():
+            self.wakeup = asyncio.Event()
+            self.drain_task = asyncio.create_task(self._drain())
+            _deferred_checkrs.add(self)
+        self.wakeup.set()
+        return True
+
+    async def _drain(self):
+        while True:
+            await self.wakeup.wait()
+            self.wakeup.clear()
+
+            while self.queue:
+                batch = [self.queue.popleft() for _ in range(min(len(self.queue), self.max_batch))]
+                try:
+                    self._evaluate(batch)
+                except Exception as e:
+                    logger.error(f"Checkr: evaluating {len(batch)} queued entries: {e}")
+                await asyncio.sleep(0)
+
+    def flush_now(self):
+        """Evaluate everything queued, on the caller's stack."""
+        while self.queue:
+            batch = [self.queue.popleft() for _ in range(min(len(self.queue), self.max_batch))]
+            self._evaluate(batch)
+
+    async def flush(self):
+        self.flush_now()
+
+    async def aclose(self):
+        self.flush_now()
+        if self.drain_task is not None:
+            self.drain_task.cancel()
+            self.drain_task = None
+        _deferred_checkrs.discard(self)
+
+    def metrics(self) -> dict:
+        return {
+            "eval_mode": self.eval_mode,
+            "posted": self.posted,
+            "skipped": self.skipped,
+            "evaluated": self.evaluated,
+            "dropped": self.dropped,
+            "batches": self.batches,
+            "overflows": self.overflows,
+            "queued": len(self.queue),
+            "max_depth": self.max_depth,
+        }
 
     def dump(self):
         for name, val in self.globs.items():
@@ -150,7 +653,11 @@ class Checkr:
         modpath, mainname = modspec.split(":")
 
         # self.mod = importlib.__import__(modpath, self.globs, self.globs, fromlist = [ mainname ])
-        self.mod = importlib.import_module(modpath)
+        if self.scoped:
+            self.mod = self.private_module(modpath)
+        else:
+            self.mod = importlib.import_module(modpath)
+        self.mods.append(self.mod)
         logger.info(f"LOADSPEC ASSERTION MODULE:{self.mod}")
 
         # Populate the namespace of the assertion module dynamically with the Oroboro names
@@ -158,15 +665,74 @@ class Checkr:
         for name, val in self.globs.items():
             setattr(self.mod, name, val)
 
+        # the events its watchers wait on: those it declares, those named in its code, or all
+        declared = getattr(self.mod, "SUBSCRIBE", None)
+        if declared is None:
+            self.subscribe_all = True
+            self.subscriptions_changed()
+        elif declared == SUBSCRIBE_AUTO:
+            self.subscribe(*referenced_names(self.mod))
+        else:
+            self.subscribe(*declared)
+
         # retrieve the main function by name and retain
         self.mainfn = getattr(self.mod, mainname)
         
         # now start it running as a Task
         self.oro.start(self.mainfn)
+
+    #
+    # A new copy of an assertion module for a scoped Checkr.  The watchers of an assertion refer
+    # to the events as module globals, so each scope needs a module namespace of its own.
+    #
+
+    def private_module(self, modpath):
+        spec = importlib.util.find_spec(modpath)
+        if spec is None:
+            raise ImportError(f"Assertion module not found:{modpath}")
+        mod = importlib.util.module_from_spec(spec)
+        for name, val in self.globs.items():
+            setattr(mod, name, val)
+        spec.loader.exec_module(mod)
+        return mod
          
         
 
 
+#
+# Flush the queues of all deferred Checkrs.  They serve every app of the process, so register
+# with app.add_shared_shutdown_callback.
+#
+
+async def flush_checkrs():
+    for checkr in list(_deferred_checkrs):
+        await checkr.aclose()
+
+#
+# The metrics of the live Checkrs of the process (the process-wide one, and those of the classes
+# and agents), summed; max_depth is the deepest queue of any of them.
+#
+
+CHECKR_COUNTERS = ("posted", "skipped", "evaluated", "dropped", "batches", "overflows", "queued")
+
+def checkr_metrics() -> dict:
+    checkrs = list(_checkrs)
+    totals = {
+        "checkrs": len(checkrs),
+        "scoped": sum(1 for checkr in checkrs if checkr.scoped),
+        "eval_modes": sorted({checkr.eval_mode for checkr in checkrs}),
+        "max_depth": 0,
+    }
+    totals.update((name, 0) for name in CHECKR_COUNTERS)
+
+    for checkr in checkrs:
+        metrics = checkr.metrics()
+        for name in CHECKR_COUNTERS:
+            totals[name] += metrics[name]
+        totals["max_depth"] = max(totals["max_depth"], metrics["max_depth"])
+    return totals
+
+
 # eval evaulates an expression
 # exec executes a string as a block of statements
 # setattr(obj, name, value)  might work - you can add a method to a object, for example
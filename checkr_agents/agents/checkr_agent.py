@@ -13,10 +13,17 @@
 import logging
 import asyncio
 import time
+import functools
+from concurrent.futures import Executor
+from contextvars import ContextVar
 from typing import Optional, List, Dict, Any
 from typing import Callable
 
-from .checkr import Checkr
+from .checkr import Checkr, CHECKR_SCOPE
+from .event_payload import ResponseEvent, ToolCallEvent
+from .history import HistoryManager, as_dict, turn_message, prompt_messages
+from .single_flight import TOOL_CALLS, call_key
+from checkr_agents.http_client.http_client_pool import HttpClientPool, HTTP_CLIENTS, set_current_pool, reset_current_pool
 
 from checkr_agents import logger
 
@@ -29,7 +36,7 @@ def schema_of(thing):
     adapter = TypeAdapter(thing)
     return adapter.json_schema()
 
-from litellm import completion
+from litellm import completion, acompletion, stream_chunk_builder
 from dotenv import load_dotenv
 
 # Configure Logging for LiteLLM
@@ -53,6 +60,36 @@ load_dotenv()
 # MODEL = "cerebras/llama-4-scout-17b-16e-instruct"   # Nov 3, 2025: deprecated by cerebras
 MODEL = "cerebras/llama3.3-70b"
 
+#
+# How the agent calls the LLM.  The synchronous completion() blocks the event loop that is
+# shared by every app in a MountSpec, so the default is the async path.
+#
+#   "async"  - await litellm.acompletion()
+#   "thread" - run the synchronous completion() in a thread pool (providers without async support)
+#   "sync"   - call completion() directly on the event loop (the original behavior)
+#
+
+COMPLETION_MODE = "async"
+
+#
+# The maximum number of tools of one LLM response that may run at the same time.
+# The default of 1 calls them sequentially.  Agents whose tools are independent of each other
+# (lookups without side effects) pass PARALLEL_TOOL_CONCURRENCY.
+#
+
+TOOL_CONCURRENCY = 1
+PARALLEL_TOOL_CONCURRENCY = 4
+
+#
+# The agent whose tool is running.  Tools are plain functions; the ones that keep per-agent
+# (per-session) state find their agent with current_agent().
+#
+
+_current_agent: ContextVar[Optional["CheckrAgent"]] = ContextVar("checkr_current_agent", default=None)
+
+def current_agent() -> Optional["CheckrAgent"]:
+    return _current_agent.get()
+
 #
 # PROMPTS
 #
@@ -70,6 +107,12 @@ class CheckrAgent:
         model (str): the LLM model to use
         instruction (str): the system instruction
         tools (list): the initial set of tools
+        completion_mode (str): "async", "thread" or "sync"
+        completion_executor (Executor): thread pool for the "thread" mode (default: the loop's executor)
+        tool_concurrency (int): the maximum number of tool calls of one turn to run concurrently
+        history (HistoryManager): keeps the conversation within a token budget (default: unbounded)
+        http_pool (HttpClientPool): HTTP clients for the tools (default: the process-wide pool)
+        checkr_scope (str): "process", "class" or "agent" - which Checkr the agent's events go to
     """
         
 
@@ -77,20 +120,41 @@ class CheckrAgent:
                  name: str,
                  model: str = MODEL,
                  instruction: str = None,
-                 tools: list[Callable] = [ ]
+                 tools: list[Callable] = [ ],
+                 completion_mode: str = COMPLETION_MODE,
+                 completion_executor: Optional[Executor] = None,
+                 tool_concurrency: int = TOOL_CONCURRENCY,
+                 history: Optional[HistoryManager] = None,
+                 http_pool: Optional[HttpClientPool] = None,
+                 checkr_scope: str = CHECKR_SCOPE
                  ):
 
+        if completion_mode not in ("async", "thread", "sync"):
+            raise ValueError(f"Unknown completion_mode:{completion_mode}")
+
+        if tool_concurrency < 1:
+            raise ValueError(f"tool_concurrency must be at least 1:{tool_concurrency}")
+
         # start time
         self.tstart = time.time()
 
-        # create the checkr
-        self.checkr = Checkr()
+        # create the checkr (or share the one of the scope)
+        self.checkr_scope = checkr_scope
+        self.checkr = Checkr.for_scope(checkr_scope, type(self).__name__)
         self.define_checkr_events()
+        self.checkr.load_scoped_specs()
 
         # self.name: str = name
         self.model: str = model
         self.instruction: str = instruction
 
+        # how the LLM is called
+        self.completion_mode: str = completion_mode
+        self.completion_executor: Optional[Executor] = completion_executor
+
+        # compacts the conversation history before each query
+        self.history: Optional[HistoryManager] = history
+
         # the conversation history
         self.messages: list[Any] = [
             {
@@ -109,21 +173,32 @@ class CheckrAgent:
         # tools is a list of dict
         self.tools: list[Dict] = [ ]
 
+        # bound on concurrently running tool calls
+        self.tool_concurrency: int = tool_concurrency
+        self.tool_semaphore = asyncio.Semaphore(tool_concurrency)
+
+        # pooled HTTP clients made available to the tools while they run
+        self.http_pool: HttpClientPool = http_pool if http_pool is not None else HTTP_CLIENTS
+
         # map from tool name to Callable
         self.fnmap: Dict(str, Callable) = { }
 
         # final_text is what is returned to the user after a turn
         self.final_text: list[str] = [ ]
 
+        # context for the current turn only: sent to the LLM just before the query, never kept in the history
+        self.turn_context: list[dict] = [ ]
+        self.turn_start: int = 0
+
         # build the initial tools from a list of python callables
         for fn in tools:
             self.add_tool(fn)
     
     #
-    # relative time since agent birth
+    # relative time on the clock of the agent's Checkr (since agent birth, for a per-agent Checkr)
     #
     def _trel(self):
-        return time.time() - self.tstart
+        return self.checkr.trel()
 
     #
     # the events that define the lifecycle of a query
@@ -177,16 +252,39 @@ class CheckrAgent:
         return self.tools
 
     #
-    # Add a system instruction to refine the Agent's behavior
+    # The state saved by an external session backend: the conversation history and the names of
+    # the tools it refers to.  The tools themselves are code, re-created by the constructor.
     #
 
-    def add_instruction(self, instruction: str):
-        self.messages.append(
-            {
-                "role": "system",
-                "content": instruction
-            }
-        )
+    def get_state(self) -> dict:
+        return {
+            "messages": [as_dict(m) for m in self.messages],
+            "tools": list(self.fnmap.keys()),
+        }
+
+    def set_state(self, state: dict):
+        missing = [name for name in state.get("tools", [ ]) if name not in self.fnmap]
+        if missing:
+            logger.warning(f"Restored conversation refers to tools this agent does not have:{missing}")
+
+        self.messages = list(state["messages"])
+
+    #
+    # Add a system instruction to refine the Agent's behavior.  An instruction for the next query
+    # only (turn=True) is dropped with that turn when the history is compacted; the others are
+    # always kept.
+    #
+
+    def add_instruction(self, instruction: str, turn: bool = False):
+        if turn:
+            self.messages.append(turn_message(instruction))
+        else:
+            self.messages.append(
+                {
+                    "role": "system",
+                    "content": instruction
+                }
+            )
 
         self.checkr.post_and_run(self._trel(), self.on_add_instruction, instruction)
             
@@ -195,44 +293,138 @@ class CheckrAgent:
     # Helper for main loop
     #
 
-    async def _call_tool(self, name: str, args: Dict, tool_call_id: str) -> bool:
-        """Call tool by name return True if it is found.
-            ToDo: consider error handling ...
+    async def _invoke_tool(self, name: str, args: Dict) -> tuple[bool, Any]:
+        """Run the tool by name under the agent's concurrency limit.
+        Return (isFound, result).
         """
-        isFound = False
+        fn = self.fnmap.get(name, None)
+        if fn is None:
+            return (False, None)
 
-        fn = self.fnmap[name]
-        if fn:
-            isFound = True
+        async with self.tool_semaphore:
             logger.info(f"Invoking tool:{name} with args:{args}")
-            result = await fn(**args)
+            token = set_current_pool(self.http_pool)
+            agent_token = _current_agent.set(self)
+            try:
+                if getattr(fn, "coalesce", False):
+                    # identical calls in flight (from any session) share one execution
+                    result = await TOOL_CALLS.do(call_key(fn, args), lambda: fn(**args))
+                else:
+                    result = await fn(**args)
+            finally:
+                _current_agent.reset(agent_token)
+                reset_current_pool(token)
             logger.info(f"Got tool result:{result}")
 
-            self.final_text.append(f"Calling tool:{name} with args:{args}")
+        return (True, result)
 
-            # NOTE: this solves a strange problem with ollama only
-            # if type(result) == int:
-            #    result = str(result)
+    def _record_tool_result(self, name: str, args: Dict, tool_call_id: str, result: Any):
+        """Add the tool result to the conversation and post the event."""
 
-            # serialize to json unless it is already a string
-            content = result
-            if type(content) != str:
-                content = json.dumps(content)
+        self.final_text.append(f"Calling tool:{name} with args:{args}")
 
-            self.messages.append(
-                {
-                    "tool_call_id": tool_call_id,
-                    "role": "tool",
-                    "name": name,
-                    "content": content
-                }
-            )
+        # NOTE: this solves a strange problem with ollama only
+        # if type(result) == int:
+        #    result = str(result)
+
+        # serialize to json unless it is already a string
+        content = result
+        if type(content) != str:
+            content = json.dumps(content)
+
+        self.messages.append(
+            {
+                "tool_call_id": tool_call_id,
+                "role": "tool",
+                "name": name,
+                "content": content
+            }
+        )
+
+        # attach tool name, args and the size of the result to event (the result itself if wanted)
+        if self.checkr.is_live(self.on_one_tool_called):
+            keep = self.checkr.wants_content(self.on_one_tool_called)
+            self.checkr.post_and_run(self._trel(), self.on_one_tool_called, ToolCallEvent(name, args, content, keep))
+
+    async def _call_tool(self, name: str, args: Dict, tool_call_id: str) -> bool:
+        """Call tool by name return True if it is found.
+            ToDo: consider error handling ...
+        """
+        isFound, result = await self._invoke_tool(name, args)
 
-            # attach tool name, args and result to event
-            self.checkr.post_and_run(self._trel(), self.on_one_tool_called, (name, args, result))
+        if isFound:
+            self._record_tool_result(name, args, tool_call_id, result)
 
         return isFound
 
+    #
+    # Call all of the tools requested in one LLM response.
+    #
+    # With tool_concurrency == 1 the tools are called one after the other.  Otherwise they
+    # run concurrently (at most tool_concurrency at a time) and their results are recorded
+    # afterwards in the original call order, so that the conversation history and the
+    # sequence of on_one_tool_called events are the same as in the sequential case.
+    #
+
+    async def _call_tools(self, tool_calls):
+
+        calls = [ ]
+        for tool_call in tool_calls:
+            tool_name = tool_call.function.name
+            tool_args = json.loads(tool_call.function.arguments)
+            tool_call_id = tool_call.id # a uniqe id
+            calls.append((tool_name, tool_args, tool_call_id))
+
+        if self.tool_concurrency == 1 or len(calls) == 1:
+            for (tool_name, tool_args, tool_call_id) in calls:
+                self.checkr.set_flag(tool_name)
+
+                if await self._call_tool(tool_name, tool_args, tool_call_id) == False:
+                    self.messages.append({"role": "user", "content": f"Tool '{tool_name}' not found"})
+            return
+
+        for (tool_name, tool_args, tool_call_id) in calls:
+            self.checkr.set_flag(tool_name)
+
+        results = await asyncio.gather(
+            *[self._invoke_tool(tool_name, tool_args) for (tool_name, tool_args, tool_call_id) in calls]
+        )
+
+        for (tool_name, tool_args, tool_call_id), (isFound, result) in zip(calls, results):
+            if isFound:
+                self._record_tool_result(tool_name, tool_args, tool_call_id, result)
+            else:
+                self.messages.append({"role": "user", "content": f"Tool '{tool_name}' not found"})
+
+
+    #
+    # The messages sent to the LLM: the conversation history with the context of the
+    # current turn (if any) inserted before the query.
+    #
+
+    def _prompt_messages(self) -> list[Any]:
+        if not self.turn_context:
+            return prompt_messages(self.messages)
+        return prompt_messages(self.messages[:self.turn_start] + self.turn_context + self.messages[self.turn_start:])
+
+    #
+    # Call the LLM with the conversation so far, without blocking the event loop
+    # unless the agent was configured with completion_mode="sync".
+    #
+
+    async def _completion(self):
+        kwargs = dict(model=self.model, messages=self._prompt_messages(), tools=self.tools)
+
+        if self.completion_mode == "async":
+            return await acompletion(**kwargs)
+
+        elif self.completion_mode == "thread":
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.completion_executor, functools.partial(completion, **kwargs))
+
+        else:
+            return completion(**kwargs)
+
 
     #
     # Record the response message appropriately in both self.messages and self.final_response
@@ -259,81 +451,141 @@ class CheckrAgent:
             self.messages.append(response_message)
 
 
+    #
+    # Call the LLM with stream=True.  Yield the text deltas as they arrive and collect the
+    # raw chunks so that the complete response can be rebuilt afterwards.  Some chunks (usage,
+    # keep-alive) have no choices.
+    #
+
+    async def _stream_completion(self, chunks: list):
+        response = await acompletion(
+            model=self.model, messages=self._prompt_messages(), tools=self.tools, stream=True
+        )
+
+        async for chunk in response:
+            chunks.append(chunk)
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                yield delta
+
+
     #
     # Process a user query.  Return a message.
     #
             
     async def process_query(self, query: str) -> list[str]:
+
+        async for event in self.process_query_stream(query, stream=False):
+            pass
+
+        return self.final_text
+
+    #
+    # Process a user query, yielding progress as it happens.  Each item is a dict:
+    #
+    #    {"type": "text", "content": str}              - text of an LLM response (a token delta when streaming)
+    #    {"type": "tool_call", "name": str, "args": dict} - a tool is about to be called
+    #    {"type": "tool_result", "name": str}          - the tool has returned
+    #    {"type": "done", "results": list[str]}        - the end of the turn, results as from process_query()
+    #
+    # Token streaming requires completion_mode="async".  Other modes yield each response's text whole.
+    #
+    # An optional context (for example retrieved documents) is given to the LLM as a system message
+    # for this turn only.  It is not recorded in the conversation history.
+    #
+    # A turn that does not finish (the client of a stream disconnects, the task is cancelled or a
+    # tool raises) is rolled back: a tool call without its result would make the provider reject
+    # every later completion of the conversation.
+    #
+
+    async def process_query_stream(self, query: str, stream: bool = True, context: Optional[str] = None):
         print(f"Processing query")
 
+        stream = stream and self.completion_mode == "async"
+
         # checkr.postAndRun(on_query)
 
         # reset the result text
         self.final_text = [ ]
 
-        # add to the conversation history
-        self.messages.append({"role": "user", "content": query})
+        # keep the conversation within its token budget
+        if self.history:
+            self.messages = self.history.compact(self.messages, self.model)
 
-        # attach query to the event
-        self.checkr.post_and_run(self._trel(), self.on_query_received, query)
+        # context of this turn only
+        self.turn_start = len(self.messages)
+        self.turn_context = [{"role": "system", "content": context}] if context else [ ]
 
-        # call the LLM with the conversation
-        response = completion(
-            model=self.model, messages=self.messages, tools=self.tools
-        )
+        try:
+            # add to the conversation history
+            self.messages.append({"role": "user", "content": query})
 
-        response_message = response.choices[0].message
+            # attach query to the event
+            self.checkr.post_and_run(self._trel(), self.on_query_received, query)
 
-        if response_message is None:
-            import sys
-            print(f"RESPONSE:{response_message}")
-            sys.exit(1)
+            # the first response analyzes the query, the following ones analyze tool results
+            analyzed_event = self.on_query_analyzed
 
-        # Save the response
-        self._handle_response(response_message)
+            while True:
 
-        # attach raw response
-        self.checkr.post_and_run(self._trel(), self.on_query_analyzed, response_message)
+                # call the LLM with the conversation
+                if stream:
+                    chunks = [ ]
+                    async for delta in self._stream_completion(chunks):
+                        yield {"type": "text", "content": delta}
+                    response = stream_chunk_builder(chunks, messages=self._prompt_messages())
+                else:
+                    response = await self._completion()
 
-        # Are there tool calls?
-        tool_calls = response_message.tool_calls
+                response_message = response.choices[0].message
 
-        while tool_calls:
+                if response_message is None:
+                    import sys
+                    print(f"RESPONSE:{response_message}")
+                    sys.exit(1)
 
-            for tool_call in response.choices[0].message.tool_calls:
-                tool_name = tool_call.function.name
-                tool_args = json.loads(tool_call.function.arguments)
-                tool_call_id = tool_call.id # a uniqe id
+                if not stream and response_message.content is not None:
+                    yield {"type": "text", "content": response_message.content}
 
-                self.checkr.set_flag(tool_name)
+                # Save the response in the converation and add it to the text result
+                self._handle_response(response_message)
 
-                if await self._call_tool(tool_name, tool_args, tool_call_id) == False:
-                    self.messages.append({"role": "user", "content": "Tool '{tool_name}' not found"})
+                # attach a summary of the response (the response message itself if wanted)
+                if self.checkr.is_live(analyzed_event):
+                    keep = self.checkr.wants_content(analyzed_event)
+                    self.checkr.post_and_run(self._trel(), analyzed_event, ResponseEvent(response, response_message, keep))
 
-            # for now, attach no values to the event
-            self.checkr.post_and_run(self._trel(), self.on_all_tools_called)
-            self.checkr.clear_all_flags()
+                # Are there tool calls?
+                tool_calls = response_message.tool_calls
 
-            # Now call the LLM again with the tool result
-            response = completion(
-                model=self.model, messages=self.messages, tools=self.tools
-            )
+                if not tool_calls:
+                    break
 
-            # Get the final response.
-            response_message = response.choices[0].message
+                for tool_call in tool_calls:
+                    yield {"type": "tool_call", "name": tool_call.function.name, "args": json.loads(tool_call.function.arguments)}
 
-            # Save the response in the converation and add it to the text result
-            self._handle_response(response_message)
+                await self._call_tools(tool_calls)
 
-            # attach response message
-            self.checkr.post_and_run(self._trel(), self.on_tool_calls_analyzed, response_message)
+                for tool_call in tool_calls:
+                    yield {"type": "tool_result", "name": tool_call.function.name}
 
-            # Are there more tool calls?
-            tool_calls = response_message.tool_calls
+                # for now, attach no values to the event
+                self.checkr.post_and_run(self._trel(), self.on_all_tools_called)
+                self.checkr.clear_all_flags()
+
+                analyzed_event = self.on_tool_calls_analyzed
+        except BaseException:
+            del self.messages[self.turn_start:]
+            self.checkr.clear_all_flags()
+            raise
+        finally:
+            self.turn_context = [ ]
 
         self.checkr.post_and_run(self._trel(), self.on_query_handled)
 
-        return self.final_text
+        yield {"type": "done", "results": self.final_text}
 
     #
     # Provide a simple console based command loop for testing
@@ -359,7 +611,12 @@ class CheckrAgent:
                 print(f"\nError: {str(e)}")
 
     async def cleanup(self):
-        pass
+        # evaluate the events of this agent that are still queued; the drain task of a per-agent
+        # Checkr goes with it (a class or process Checkr serves the other agents)
+        if self.checkr_scope == "agent":
+            await self.checkr.aclose()
+        else:
+            await self.checkr.flush()
     
 ################################################################
 #
@@ -7,18 +7,24 @@ import logging
 import asyncio
 from .nlip_agent import NlipAgent
 
-from typing import Any
+from typing import Any, Optional
 import httpx
 import json
 
 # Import NLIP
 from checkr_agents.http_client.nlip_async_client import NlipAsyncClient
+from checkr_agents.http_client.nlip_client_pool import NlipClientPool, NLIP_CLIENTS
 from nlip_sdk.nlip import NLIP_Factory, NLIP_Message
 from urllib.parse import urlparse
 
 from pydantic import AnyHttpUrl
 
-# map host->session
+from .checkr_agent import current_agent
+from .capability_registry import CapabilityRegistry, CAPABILITIES, is_capability_query
+from .nlip_projection import NlipProjection, NLIP_PROJECTION
+
+# map host->session, for the tools when they are called outside of a coordinator agent.
+# Each CoordinatorNlipAgent keeps its own table so that sessions do not share NLIP cookies.
 sessions = { }
 
 # Use the NLIP logger in this package
@@ -31,6 +37,27 @@ MODEL = "anthropic/claude-3-7-sonnet-20250219"
 # MODEL = "cerebras/llama-4-scout-17b-16e-instruct"
 
 
+#
+# The host->client table and client pool of the coordinator whose tool is running
+#
+
+def _session_table() -> dict:
+    agent = current_agent()
+    return getattr(agent, "nlip_sessions", sessions)
+
+def _client_pool() -> NlipClientPool:
+    agent = current_agent()
+    return getattr(agent, "nlip_pool", NLIP_CLIENTS)
+
+def _capability_registry() -> CapabilityRegistry:
+    agent = current_agent()
+    return getattr(agent, "capabilities", CAPABILITIES)
+
+def _projection() -> NlipProjection:
+    agent = current_agent()
+    return getattr(agent, "nlip_projection", NLIP_PROJECTION)
+
+
 #
 # Make a connection and return a status string
 #
@@ -41,72 +68,209 @@ async def connect_to_server(url: AnyHttpUrl):
         parsed_url = urlparse(url)
         scheme = parsed_url.scheme
         netloc = parsed_url.netloc
+        client = _client_pool().create_client(f"{scheme}://{netloc}/nlip/")
     except Exception as e:
-        instance.text = f"Exception: {e}"
-        return
+        return f"Exception: {e}"
+
+    hashkey = f"{scheme}://{netloc}"
 
-    # Establish the URL and return a connection message
-    await asyncio.sleep(1.0)
-    client = NlipAsyncClient.create_from_url(f"{scheme}://{netloc}/nlip/")
+    # Wait until the server reports healthy instead of guessing how long it takes
+    if not await client.wait_ready():
+        await client.aclose()
+        await _capability_registry().invalidate(hashkey)
+        return f"Unable to connect to {scheme}://{netloc}/ (no answer from /health)"
 
     # Remember this client for this server
-    hashkey = f"{scheme}://{netloc}"
-    sessions[hashkey] = client
+    table = _session_table()
+    previous = table.get(hashkey, None)
+    table[hashkey] = client
+
+    if previous is not None:
+        await previous.aclose()
 
     logger.info(f"Saved {netloc} with client {client}")
+
+    # An agent whose capabilities are known does not need to be asked again
+    capabilities = _capability_registry().get(hashkey)
+    if capabilities is not None:
+        return f"Connected to {scheme}://{netloc}/\nKnown capabilities: {capabilities}"
+
     return f"Connected to {scheme}://{netloc}/"
 
 #
 # Send a message to a named host and get a response
 #
 
-# async def send_to_server(url: AnyHttpUrl, msg: str) -> NLIP_Message:
-async def send_to_server(url: AnyHttpUrl, msg: str) -> dict:
+async def send_to_server(url: AnyHttpUrl, msg: str) -> str:
     parsed_url = urlparse(url)
     scheme = parsed_url.scheme
     netloc = parsed_url.netloc
 
     # Look up the client for this server
     hashkey = f"{scheme}://{netloc}" # netloc includes host and port, if specified
-    client = sessions[hashkey]
+    client = _session_table().get(hashkey, None)
+    if client is None:
+        return f"Not connected to {scheme}://{netloc}/.  Use connect_to_server first."
+
+    # Capability discovery is answered from the registry when possible
+    registry = _capability_registry()
+    discovery = is_capability_query(msg)
+    if discovery:
+        capabilities = registry.get(hashkey)
+        if capabilities is not None:
+            return capabilities
 
     nlip_message = NLIP_Factory.create_text(msg)
     logger.info(f"Sending message: {msg}")
-    nlip_resp = await client.async_send(nlip_message)
+    try:
+        nlip_resp = await client.async_send(nlip_message)
+    except Exception:
+        await registry.invalidate(hashkey)
+        raise
     logger.info(f"Received: {nlip_resp.model_dump()}")
-    # return nlip_resp.model_dump() # did not work
-    # return nlip_resp.extract_text() # worked
-    return str(nlip_resp.model_dump())
+
+    if discovery:
+        await registry.put(hashkey, nlip_resp.extract_text())
+
+    # the response becomes part of the conversation, so only its projection is returned
+    return _projection().project(nlip_resp)
+
+
+#
+# Send one message to many connected servers at once.  Each target has its own timeout; the
+# answers that arrive in time are returned together with the names of the targets that were
+# too slow or failed, as one compact JSON document.
+#
+
+BROADCAST_TIMEOUT = 30.0
+
+async def broadcast_to_servers(urls: list[str], msg: str, timeout: float = BROADCAST_TIMEOUT) -> str:
+    """Send the same message to several connected servers concurrently and collect their answers.
+
+    Args:
+        urls: the URLs of connected servers (an empty list means all connected servers)
+        msg: the message to send
+        timeout: seconds to wait for each server
+    """
+    table = _session_table()
+    registry = _capability_registry()
+    discovery = is_capability_query(msg)
+
+    targets = { }
+    responses = { }
+    errors = { }
+    for url in (urls or list(table.keys())):
+        parsed_url = urlparse(url)
+        hashkey = f"{parsed_url.scheme}://{parsed_url.netloc}"
+        client = table.get(hashkey, None)
+        capabilities = registry.get(hashkey) if discovery else None
+        if client is None:
+            errors[hashkey] = "not connected"
+        elif capabilities is not None:
+            responses[hashkey] = capabilities
+        else:
+            targets[hashkey] = client
+
+    async def send_one(client):
+        nlip_message = NLIP_Factory.create_text(msg)
+        return await asyncio.wait_for(client.async_send(nlip_message), timeout)
+
+    logger.info(f"Broadcasting message: {msg} to {list(targets.keys())}")
+    results = await asyncio.gather(*[send_one(client) for client in targets.values()], return_exceptions=True)
+
+    timed_out = [ ]
+    for hashkey, result in zip(targets.keys(), results):
+        if isinstance(result, asyncio.TimeoutError):
+            timed_out.append(hashkey)
+        elif isinstance(result, BaseException):
+            errors[hashkey] = f"{type(result).__name__}: {result}"
+            await registry.invalidate(hashkey)
+        else:
+            responses[hashkey] = _projection().project(result)
+            if discovery:
+                await registry.put(hashkey, result.extract_text())
+
+    aggregate = {"responses": responses}
+    if timed_out:
+        aggregate["timed_out"] = timed_out
+    if errors:
+        aggregate["errors"] = errors
+
+    return json.dumps(aggregate, separators=(",", ":"))
 
 
 NLIP_COORDINATOR_PROMPT = """
 You are an advanced NLIP Agent with the capability to speak to other NLIP Agents.
-You have two tools for this purpose:
+You have three tools for this purpose:
 - connect_to_server
 - send_to_server
+- broadcast_to_servers
 
 When you are asked to connect to a server at a specific URL, use the connect_to_server tool with that URL to establish a connection.
 If the response to that tool begins with: "Connected to ", then the connection is valid.  Otherwise, it is not.
-For a valid connection, you should follow the connect_to_server tool call with a tool call of send_to_server to the same URL with the string: "What are your NLIP Capabilities?"
+If the response also contains "Known capabilities: ", the remote Agent's [NAME] and capabilities are already known; take note of them and do not ask for them again.
+Otherwise, for a valid connection, you should follow the connect_to_server tool call with a tool call of send_to_server to the same URL with the string: "What are your NLIP Capabilities?"
 The remote Agent will respond with its [NAME] and capabilities.  Take note of this information, especially the NAME.  In future requests, if a user asks for you to send a request to NAME you should use the send_to_server tool with the URL that was associated with NAME and use the request as the msg: argument.
+When the same message should go to several connected servers (for example, asking every server for its NLIP Capabilities), use the broadcast_to_servers tool once with all of their URLs instead of several send_to_server calls.  Its result lists the answers by URL and any servers that timed out or failed.
 """
 
+#
+# Note: the tools of the coordinator run sequentially (the default tool_concurrency) because a
+# send_to_server depends on a connect_to_server of the same turn having completed.
+#
+
 class CoordinatorNlipAgent(NlipAgent):
 
     def __init__(self,
                  name: str,
                  model: str = MODEL,
                  instruction: str = None,
-                 tools = [connect_to_server, send_to_server]
+                 tools = [connect_to_server, send_to_server, broadcast_to_servers],
+                 nlip_pool: Optional[NlipClientPool] = None,
+                 capabilities: Optional[CapabilityRegistry] = None,
+                 projection: Optional[NlipProjection] = None,
+                 **kwargs
                  ):
 
-        super().__init__(name, model=model, tools=tools)
+        super().__init__(name, model=model, tools=tools, **kwargs)
+
+        # the NLIP sessions of this coordinator with remote agents: host->client
+        self.nlip_sessions: dict[str, NlipAsyncClient] = { }
+        self.nlip_pool: NlipClientPool = nlip_pool if nlip_pool is not None else NLIP_CLIENTS
+
+        # the capabilities of remote agents, shared with the other coordinators of the process
+        self.capabilities: CapabilityRegistry = capabilities if capabilities is not None else CAPABILITIES
+
+        # how NLIP responses are projected into tool results
+        self.nlip_projection: NlipProjection = projection if projection is not None else NLIP_PROJECTION
 
         self.add_instruction("You are an agent with tools for querying other NLIP Agent Servers")
         self.add_instruction(NLIP_COORDINATOR_PROMPT)
 
         if instruction:
             self.add_instruction(instruction)
+
+    #
+    # The connections are part of the saved session state.  A rehydrated session re-opens them
+    # (with new NLIP sessions at the remote agents).
+    #
+
+    def get_state(self) -> dict:
+        state = super().get_state()
+        state["nlip_connections"] = list(self.nlip_sessions.keys())
+        return state
+
+    def set_state(self, state: dict):
+        super().set_state(state)
+        for hashkey in state.get("nlip_connections", [ ]):
+            if hashkey not in self.nlip_sessions:
+                self.nlip_sessions[hashkey] = self.nlip_pool.create_client(f"{hashkey}/nlip/")
+
+    async def cleanup(self):
+        for client in self.nlip_sessions.values():
+            await client.aclose()
+        self.nlip_sessions.clear()
+        await super().cleanup()
     
 
 # Test program for running with stdin
@@ -0,0 +1,212 @@
+#
+# The Event Checker runs assertions over the events of agents in other processes.
+#
+# Agents with an event log (CHECKR_EVENT_LOG, see event_log.py) write their Checkr events to a
+# file or stream them to a unix socket.  The checker replays them into Checkrs of its own that
+# load the same assertion modules as Checkr.load_spec, so heavy temporal properties can be checked
+# on another core or machine without slowing down serving.
+#
+#   - offline: replay a log file and exit
+#   - live: follow a log file as it grows (--follow), or listen on a unix socket for agents
+#
+# Event payloads (event_payload.py) are rebuilt from their JSON, so the assertions see the records
+# they see in the serving process.
+#
+# By default all events are replayed into one Checkr, on the wall clock of the log, as the
+# process-wide Checkr sees them.  With --per-source each source (the Checkr of one agent scope)
+# is replayed into a Checkr of its own, on its own clock, as with scoped Checkrs.
+#
+# Usage:
+#    $ python -m checkr_agents.agents.event_checker --spec checkr_agents.assertions.assertion1:mainfn events.ndjson
+#    $ python -m checkr_agents.agents.event_checker --spec checkr_agents.assertions.assertion1:mainfn --follow events.ndjson
+#    $ python -m checkr_agents.agents.event_checker --spec checkr_agents.assertions.assertion1:mainfn unix:///tmp/checkr-events.sock
+#
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import time
+from typing import Optional
+from urllib.parse import urlparse
+
+from checkr_agents import logger, log_to_console
+from .checkr import Checkr, add_scoped_spec
+from .event_log import LIFECYCLE_EVENTS
+from .event_payload import payload_from_dict
+
+# seconds between checks of a followed file for new lines
+POLL_INTERVAL = 0.2
+
+
+class EventReplayer:
+
+    def __init__(self, specs: list[str], per_source: bool = False):
+        """
+        Args:
+          specs: the assertion specs, ex: ["checkr_agents.assertions.assertion1:mainfn"]
+          per_source: replay each source into a Checkr of its own
+        """
+
+        self.per_source = per_source
+        self.checkrs: dict[str, Checkr] = { }
+
+        # the wall clock of the log, for replaying into one Checkr
+        self.ts0: Optional[float] = None
+        self.last_t = 0.0
+
+        # counters
+        self.replayed = 0
+        self.malformed = 0
+
+        if per_source:
+            for modspec in specs:
+                add_scoped_spec(modspec)
+            self.checkr = None
+        else:
+            self.checkr = self.new_checkr(scoped=False)
+            for modspec in specs:
+                self.checkr.load_spec(modspec)
+
+    def new_checkr(self, scoped: bool) -> Checkr:
+        checkr = Checkr(scoped=scoped)
+
+        # the checker does not write the events it replays
+        checkr.set_event_log(None)
+
+        for name in LIFECYCLE_EVENTS:
+            checkr.define_observer_event(name)
+        checkr.load_scoped_specs()
+        return checkr
+
+    def checkr_for(self, source: str) -> Checkr:
+        if not self.per_source:
+            return self.checkr
+
+        checkr = self.checkrs.get(source, None)
+        if checkr is None:
+            checkr = self.new_checkr(scoped=True)
+            self.checkrs[source] = checkr
+            logger.info(f"EventReplayer: new source {source}")
+        return checkr
+
+    def replay_line(self, line: str):
+        line = line.strip()
+        if not line:
+            return
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError:
+            self.malformed += 1
+            logger.warning(f"EventReplayer: malformed line: {line[:80]}")
+            return
+        self.replay(record)
+
+    def replay(self, record: dict):
+        checkr = self.checkr_for(record.get("source", "process"))
+
+        if self.per_source:
+            t = record["t"]
+        else:
+            if self.ts0 is None:
+                self.ts0 = record["ts"]
+            t = max(self.last_t, record["ts"] - self.ts0)
+            self.last_t = t
+
+        if "event" in record:
+            evt = checkr.define_observer_event(record["event"])
+            args = [payload_from_dict(arg) for arg in record.get("args", [ ])]
+            checkr.post_and_run(t, evt, *args)
+        elif "flag" in record:
+            if record.get("val"):
+                checkr.set_flag(record["flag"])
+            else:
+                checkr.clear_flag(record["flag"])
+        elif record.get("clear_flags"):
+            checkr.clear_all_flags()
+
+        self.replayed += 1
+
+
+#
+# Replay a log file; with follow, keep reading the lines appended to it
+#
+
+def replay_file(replayer: EventReplayer, path: str, follow: bool = False):
+    with open(path) as f:
+        partial = ""
+        while True:
+            line = f.readline()
+            if line.endswith("\n"):
+                replayer.replay_line(partial + line)
+                partial = ""
+            elif line:
+                # the writer has not finished this line yet
+                partial += line
+            elif follow:
+                time.sleep(POLL_INTERVAL)
+            else:
+                break
+
+        if partial:
+            replayer.replay_line(partial)
+
+
+#
+# Listen on a unix socket for agents streaming their events
+#
+
+async def serve_socket(replayer: EventReplayer, path: str):
+
+    async def handle_connection(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        logger.info(f"EventChecker: agent connected")
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                replayer.replay_line(line.decode())
+        finally:
+            writer.close()
+            logger.info(f"EventChecker: agent disconnected ({replayer.replayed} records replayed)")
+
+    if os.path.exists(path):
+        os.remove(path)
+
+    server = await asyncio.start_unix_server(handle_connection, path=path)
+    logger.info(f"EventChecker: listening on {path}")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def main():
+    parser = argparse.ArgumentParser("Check assertions over the events of a Checkr event log")
+    parser.add_argument("source", type=str, help="an NDJSON event log file, or unix:///path to listen on")
+    parser.add_argument("--spec", type=str, action="append", required=True, help="an assertion spec module:mainfn (repeatable)")
+    parser.add_argument("--follow", action="store_true", help="keep following the file as it grows")
+    parser.add_argument("--per-source", action="store_true", help="replay each source into a Checkr of its own")
+    args = parser.parse_args()
+
+    log_to_console(logging.INFO)
+
+    replayer = EventReplayer(args.spec, per_source=args.per_source)
+
+    u = urlparse(args.source)
+    try:
+        if u.scheme == "unix":
+            asyncio.run(serve_socket(replayer, u.path))
+        else:
+            replay_file(replayer, u.path, follow=args.follow)
+    except KeyboardInterrupt:
+        pass
+
+    logger.info(f"EventChecker: replayed {replayer.replayed} records ({replayer.malformed} malformed)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,231 @@
+#
+# An Event Log carries the events of a Checkr out of the serving process.
+#
+# Each posted event (and each flag change) becomes one line of newline-delimited JSON, so that
+# the assertions can be checked by a separate process - on another core or another machine - with
+# the event_checker, live or from a file afterwards.
+#
+#   {"ts": 1760000000.25, "t": 3.5, "source": "a1b2c3d4", "event": "on_query_received", "args": ["Hi"]}
+#   {"ts": 1760000000.50, "t": 3.75, "source": "a1b2c3d4", "flag": "get_forecast", "val": 1}
+#   {"ts": 1760000001.00, "t": 4.25, "source": "a1b2c3d4", "clear_flags": true}
+#
+# "ts" is the wall-clock time, "t" the time on the clock of the posting Checkr and "source" names
+# that Checkr (one per scope, see checkr.py).  Arguments that are not JSON are converted with
+# their to_dict() (event payloads), model_dump() (pydantic objects), or else str().
+#
+# The log is selected with a URL, for example in the CHECKR_EVENT_LOG environment variable:
+#
+#    /path/to/events.ndjson or file:///path/to/events.ndjson - append to a file
+#    unix:///tmp/checkr-events.sock                            - stream to a listening event_checker
+#
+
+import json
+import os
+import queue
+import socket
+import threading
+import time
+from typing import Any, Optional
+from urllib.parse import urlparse
+
+from checkr_agents import logger
+
+EVENT_LOG_ENV = "CHECKR_EVENT_LOG"
+
+# the events of a CheckrAgent, defined by the checker before any are received
+LIFECYCLE_EVENTS = (
+    "on_add_tool",
+    "on_add_instruction",
+    "on_query_received",
+    "on_query_analyzed",
+    "on_one_tool_called",
+    "on_all_tools_called",
+    "on_tool_calls_analyzed",
+    "on_query_handled",
+)
+
+# defaults
+SEND_TIMEOUT = 0.1         # seconds a send may block the writer thread before the line is dropped
+RECONNECT_INTERVAL = 5.0   # seconds between attempts to reach the checker
+QUEUE_SIZE = 10000         # lines waiting for the writer thread before new ones are dropped
+CLOSE_TIMEOUT = 1.0        # seconds close() waits for the writer thread to send what is queued
+
+
+def jsonable(value: Any) -> Any:
+    if hasattr(value, "to_dict"):
+        return value.to_dict()
+    if hasattr(value, "model_dump"):
+        return value.model_dump()
+    return str(value)
+
+
+def encode(record: dict) -> bytes:
+    return (json.dumps(record, default=jsonable, separators=(",", ":")) + "\n").encode()
+
+
+class EventLog:
+
+    def __init__(self):
+        self.lock = threading.Lock()
+
+        # counters
+        self.written = 0
+        self.dropped = 0
+
+    def emit(self, record: dict):
+        line = encode(record)
+        with self.lock:
+            if self.write(line):
+                self.written += 1
+            else:
+                self.dropped += 1
+
+    def write(self, line: bytes) -> bool:
+        raise NotImplementedError("Subclasses must implement this method")
+
+    def close(self):
+        pass
+
+    def metrics(self) -> dict:
+        return {
+            "written": self.written,
+            "dropped": self.dropped,
+        }
+
+
+#
+# Append to a file.  Each line is one write() to a file opened with O_APPEND, so the workers of a
+# pool can share one log.
+#
+
+class FileEventLog(EventLog):
+
+    def __init__(self, path: str):
+        super().__init__()
+        self.path = path
+        self.fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        logger.info(f"FileEventLog: appending events to {path}")
+
+    def write(self, line: bytes) -> bool:
+        if self.fd is None:
+            return False
+        os.write(self.fd, line)
+        return True
+
+    def close(self):
+        with self.lock:
+            if self.fd is not None:
+                os.close(self.fd)
+                self.fd = None
+
+
+#
+# Stream to an event_checker listening on a unix socket.  The agent is never held up: emit() puts
+# the line on a bounded queue, and a writer thread sends it.  While the checker is not reachable
+# (or too slow to keep the queue from filling up) lines are dropped and counted.
+#
+
+class SocketEventLog(EventLog):
+
+    def __init__(self, path: str, queue_size: int = QUEUE_SIZE):
+        super().__init__()
+        self.path = path
+        self.sock: Optional[socket.socket] = None
+        self.retry_at = 0.0
+
+        # lines waiting for the writer thread (started with the first line); None stops it
+        self.queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self.writer: Optional[threading.Thread] = None
+
+    def emit(self, record: dict):
+        line = encode(record)
+        if self.writer is None:
+            self.start()
+        try:
+            self.queue.put_nowait(line)
+        except queue.Full:
+            with self.lock:
+                self.dropped += 1
+
+    def start(self):
+        with self.lock:
+            if self.writer is None:
+                self.writer = threading.Thread(target=self.run, name="SocketEventLog", daemon=True)
+                self.writer.start()
+
+    def run(self):
+        while True:
+            line = self.queue.get()
+            if line is None:
+                return
+            # only this thread writes; the lock is held for the counters, never during a send
+            sent = self.write(line)
+            with self.lock:
+                if sent:
+                    self.written += 1
+                else:
+                    self.dropped += 1
+
+    def connect(self) -> bool:
+        if time.monotonic() < self.retry_at:
+            return False
+        try:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(SEND_TIMEOUT)
+            sock.connect(self.path)
+        except OSError as e:
+            self.retry_at = time.monotonic() + RECONNECT_INTERVAL
+            logger.debug(f"SocketEventLog: cannot reach the checker at {self.path}: {e}")
+            return False
+        self.sock = sock
+        logger.info(f"SocketEventLog: streaming events to {self.path}")
+        return True
+
+    def write(self, line: bytes) -> bool:
+        if self.sock is None and not self.connect():
+            return False
+        try:
+            self.sock.sendall(line)
+            return True
+        except OSError as e:
+            # a partial line cannot be resumed: start over on a new connection
+            logger.warning(f"SocketEventLog: lost the checker at {self.path}: {e}")
+            self.sock.close()
+            self.sock = None
+            self.retry_at = time.monotonic() + RECONNECT_INTERVAL
+            return False
+
+    def close(self):
+        writer = self.writer
+        if writer is not None:
+            try:
+                self.queue.put(None, timeout=CLOSE_TIMEOUT)
+            except queue.Full:
+                pass
+            writer.join(CLOSE_TIMEOUT)
+            self.writer = None
+
+        with self.lock:
+            if self.sock is not None:
+                self.sock.close()
+                self.sock = None
+
+    def metrics(self) -> dict:
+        return {**super().metrics(), "queued": self.queue.qsize()}
+
+
+def event_log_from_url(url: Optional[str]) -> Optional[EventLog]:
+    if not url:
+        return None
+
+    u = urlparse(url)
+    if u.scheme == "unix":
+        return SocketEventLog(u.path)
+    if u.scheme in ("", "file"):
+        return FileEventLog(u.path)
+
+    raise ValueError(f"Unknown event log URL:{url}")
+
+
+def event_log_from_env() -> Optional[EventLog]:
+    return event_log_from_url(os.environ.get(EVENT_LOG_ENV, None))
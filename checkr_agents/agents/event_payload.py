@@ -0,0 +1,139 @@
+#
+# Compact payloads of the Checkr events of an agent.
+#
+# An event value is retained by Oroboro (and by the watchers that keep it), so attaching whole LLM
+# response objects and tool results to events makes memory grow with the size of the traffic.  The
+# payloads here keep what assertions usually look at - the model, token counts, tool names, lengths
+# and content hashes - in __slots__ records.  The full content is attached only for the events an
+# assertion opts in to, with want_content("on_query_analyzed", ...) in its mainfn, or with the
+# CHECKR_EVENT_CONTENT environment variable (a comma-separated list of event names).
+#
+# The event log writes a payload as a dict tagged with its class (to_dict), and the event checker
+# rebuilds it (payload_from_dict), so an assertion sees the same records in and out of process:
+# val.model or val["model"] alike.  The fields of the full content (message) remain JSON there.
+#
+
+import zlib
+from typing import Any, Optional
+
+EVENT_CONTENT_ENV = "CHECKR_EVENT_CONTENT"
+
+
+def content_hash(text: Optional[str]) -> Optional[str]:
+    """A short, stable hash of a text (the same across processes, unlike hash())."""
+    if text is None:
+        return None
+    return f"{zlib.crc32(text.encode()):08x}"
+
+
+#
+# The fields of a payload by attribute or by name, and its dict form for the event log
+#
+
+class EventPayload:
+
+    __slots__ = ( )
+
+    def __getitem__(self, key):
+        if not isinstance(key, str):
+            # assertions written for the (name, args, result) tuples of earlier versions
+            raise TypeError(f"{type(self).__name__} is a record, not a tuple: use its fields {list(self.__slots__)}, "
+                            f"by attribute or by name (see checkr_agents/agents/event_payload.py)")
+        if key not in self.__slots__:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def to_dict(self) -> dict:
+        d = {"payload": type(self).__name__}
+        d.update((name, getattr(self, name)) for name in self.__slots__)
+        return d
+
+    @classmethod
+    def from_dict(cls, d: dict) -> "EventPayload":
+        payload = cls.__new__(cls)
+        for name in cls.__slots__:
+            setattr(payload, name, d.get(name, None))
+        return payload
+
+
+#
+# An LLM response: the payload of on_query_analyzed and on_tool_calls_analyzed
+#
+
+class ResponseEvent(EventPayload):
+
+    __slots__ = ("model", "prompt_tokens", "completion_tokens", "finish_reason",
+                 "tool_names", "content_length", "content_hash", "message")
+
+    def __init__(self, response: Any, message: Any, keep_content: bool = False):
+        usage = getattr(response, "usage", None)
+        choice = response.choices[0] if getattr(response, "choices", None) else None
+        content = message.content
+
+        self.model: Optional[str] = getattr(response, "model", None)
+        self.prompt_tokens: Optional[int] = getattr(usage, "prompt_tokens", None)
+        self.completion_tokens: Optional[int] = getattr(usage, "completion_tokens", None)
+        self.finish_reason: Optional[str] = getattr(choice, "finish_reason", None)
+        self.tool_names: tuple[str, ...] = tuple(tc.function.name for tc in (message.tool_calls or [ ]))
+        self.content_length: int = len(content) if content else 0
+        self.content_hash: Optional[str] = content_hash(content)
+
+        # the full response message, for assertions that opted in
+        self.message: Any = message if keep_content else None
+
+    def to_dict(self) -> dict:
+        d = super().to_dict()
+        if self.message is None:
+            del d["message"]
+        elif hasattr(self.message, "model_dump"):
+            d["message"] = self.message.model_dump()
+        return d
+
+    @classmethod
+    def from_dict(cls, d: dict) -> "ResponseEvent":
+        payload = super().from_dict(d)
+        payload.tool_names = tuple(payload.tool_names or ( ))
+        return payload
+
+    def __repr__(self):
+        return (f"ResponseEvent(model={self.model}, tokens={self.prompt_tokens}/{self.completion_tokens}, "
+                f"tools={list(self.tool_names)}, content={self.content_length} chars #{self.content_hash})")
+
+
+#
+# A tool call and its result: the payload of on_one_tool_called
+#
+
+class ToolCallEvent(EventPayload):
+
+    __slots__ = ("name", "args", "result_length", "result_hash", "result")
+
+    def __init__(self, name: str, args: dict, result: str, keep_content: bool = False):
+        self.name: str = name
+        self.args: dict = args
+        self.result_length: int = len(result)
+        self.result_hash: Optional[str] = content_hash(result)
+
+        # the full result, for assertions that opted in
+        self.result: Optional[str] = result if keep_content else None
+
+    def to_dict(self) -> dict:
+        d = super().to_dict()
+        if self.result is None:
+            del d["result"]
+        return d
+
+    def __repr__(self):
+        return f"ToolCallEvent(name={self.name}, args={self.args}, result={self.result_length} chars #{self.result_hash})"
+
+
+#
+# Rebuild a payload written to the event log; other values are returned as they are
+#
+
+PAYLOAD_TYPES = {cls.__name__: cls for cls in (ResponseEvent, ToolCallEvent)}
+
+def payload_from_dict(value: Any) -> Any:
+    if isinstance(value, dict) and value.get("payload") in PAYLOAD_TYPES:
+        return PAYLOAD_TYPES[value["payload"]].from_dict(value)
+    return value
@@ -0,0 +1,233 @@
+#
+# A History Manager keeps the conversation of a CheckrAgent within a token budget.
+#
+# The whole conversation is sent to the LLM on every completion() call, so without a budget the
+# latency and cost of a turn grow with the age of the session until the context limit is hit.
+# Before each new query the history is compacted:
+#
+#   - system instructions are always kept
+#   - large tool results of earlier turns are truncated
+#   - the oldest turns are dropped until the history fits the budget, and are replaced
+#     by a compact summary note (a system message)
+#
+# Compaction only removes whole turns (a user query through the final answer), so a tool
+# result is never separated from the tool call that requested it.  A system message later in the
+# conversation belongs to the turn that follows it and keeps its place there.  When that turn is
+# dropped, an instruction moves up to the instructions at the start; a system message marked as
+# context of its turn (TURN_CONTEXT_KEY, see turn_message()) is dropped with it.
+#
+
+from typing import Any, Callable, Optional
+
+from litellm import token_counter
+
+from checkr_agents import logger
+
+# the summary note is a system message that begins with this text
+SUMMARY_PREFIX = "Summary of the earlier conversation:"
+
+# a system message with this key set belongs to its turn only; the key is not sent to the LLM
+TURN_CONTEXT_KEY = "turn_context"
+
+# defaults
+MAX_TOOL_CHARS = 2000       # tool results of earlier turns are truncated to this
+SUMMARY_LINE_CHARS = 200    # each summarized message contributes at most this much
+MAX_SUMMARY_LINES = 50      # the summary keeps only the most recent lines
+KEEP_TURNS = 1              # never drop the most recent turns
+
+
+def as_dict(message: Any) -> dict:
+    """Messages returned by the LLM are pydantic objects; the rest of the history is dicts."""
+    return message.model_dump() if hasattr(message, "model_dump") else message
+
+
+def turn_message(content: str) -> dict:
+    """A system message that is dropped with its turn when the history is compacted."""
+    return {"role": "system", "content": content, TURN_CONTEXT_KEY: True}
+
+def is_turn_context(message: Any) -> bool:
+    return isinstance(message, dict) and bool(message.get(TURN_CONTEXT_KEY))
+
+def is_instruction(message: Any) -> bool:
+    """A system message that compaction always keeps."""
+    m = as_dict(message)
+    return m.get("role") == "system" and not is_turn_context(m) and not str(m.get("content") or "").startswith(SUMMARY_PREFIX)
+
+def prompt_messages(messages: list[Any]) -> list[Any]:
+    """The messages as sent to the LLM: without the turn context markers."""
+    if not any(is_turn_context(m) for m in messages):
+        return messages
+    return [{k: v for k, v in m.items() if k != TURN_CONTEXT_KEY} if is_turn_context(m) else m for m in messages]
+
+
+#
+# A default summarizer.  It does not call an LLM: each user query and final answer of a dropped
+# turn becomes one shortened line.  Tool traffic is left out.
+#
+
+def extractive_summary(turn: list[dict]) -> list[str]:
+    lines = [ ]
+    for m in turn:
+        if m.get("role") not in ("user", "assistant") or not m.get("content"):
+            continue
+        if m.get("tool_calls"):
+            continue
+        text = " ".join(str(m["content"]).split())
+        if len(text) > SUMMARY_LINE_CHARS:
+            text = text[:SUMMARY_LINE_CHARS] + "..."
+        lines.append(f"- {m['role']}: {text}")
+    return lines
+
+
+class HistoryManager:
+
+    def __init__(self,
+                 token_budget: int,
+                 max_tool_chars: Optional[int] = MAX_TOOL_CHARS,
+                 keep_turns: int = KEEP_TURNS,
+                 summarize: Optional[Callable[[list[dict]], list[str]]] = extractive_summary
+                 ):
+        """
+        Args:
+          token_budget: the target number of prompt tokens of the history before a new query
+          max_tool_chars: truncate tool results of earlier turns to this many characters (None: never)
+          keep_turns: the number of most recent turns that are never dropped
+          summarize: turns a dropped turn into lines of the summary note (None: drop without a note)
+        """
+
+        self.token_budget = token_budget
+        self.max_tool_chars = max_tool_chars
+        self.keep_turns = keep_turns
+        self.summarize = summarize
+
+        # counters
+        self.compactions = 0
+        self.turns_dropped = 0
+        self.tool_results_truncated = 0
+        self.last_tokens_saved = 0
+        self.total_tokens_saved = 0
+
+    def metrics(self) -> dict:
+        return {
+            "compactions": self.compactions,
+            "turns_dropped": self.turns_dropped,
+            "tool_results_truncated": self.tool_results_truncated,
+            "last_tokens_saved": self.last_tokens_saved,
+            "total_tokens_saved": self.total_tokens_saved,
+        }
+
+    #
+    # Split the history into the leading instructions, the existing summary lines and turns.
+    # A turn starts with a user message that follows a final answer (an assistant message without
+    # tool calls), together with the system messages just before it.
+    #
+
+    def _split(self, messages: list[dict]):
+        system = [ ]
+        summary = [ ]
+        turns = [ ]
+        pending = [ ]     # system messages after the leading ones, waiting for their turn
+        previous = None
+
+        for m in messages:
+            role = m.get("role")
+
+            if role == "system":
+                content = m.get("content") or ""
+                if content.startswith(SUMMARY_PREFIX):
+                    summary = content[len(SUMMARY_PREFIX):].strip().splitlines()
+                elif not turns and not is_turn_context(m):
+                    system.append(m)
+                else:
+                    pending.append(m)
+                continue
+
+            turn_start = role == "user" and (
+                previous is None or (previous.get("role") == "assistant" and not previous.get("tool_calls"))
+            )
+
+            if turn_start or not turns:
+                turns.append([ ])
+            turns[-1].extend(pending)
+            turns[-1].append(m)
+            pending = [ ]
+            previous = m
+
+        if pending:
+            turns[-1].extend(pending)
+
+        return system, summary, turns
+
+    def _truncate_tool_results(self, turns: list[list[dict]]) -> list[list[dict]]:
+        if self.max_tool_chars is None:
+            return turns
+
+        result = [ ]
+        for turn in turns:
+            new_turn = [ ]
+            for m in turn:
+                content = m.get("content")
+                if m.get("role") == "tool" and isinstance(content, str) and len(content) > self.max_tool_chars:
+                    m = dict(m)
+                    m["content"] = content[:self.max_tool_chars] + f"... [truncated {len(content) - self.max_tool_chars} characters]"
+                    self.tool_results_truncated += 1
+                new_turn.append(m)
+            result.append(new_turn)
+        return result
+
+    def _count(self, model: str, messages: list[dict]) -> int:
+        return token_counter(model=model, messages=messages) if messages else 0
+
+    def _assemble(self, system: list[dict], summary: list[str], turns: list[list[dict]]) -> list[dict]:
+        messages = list(system)
+        if summary:
+            messages.append({"role": "system", "content": SUMMARY_PREFIX + "\n" + "\n".join(summary)})
+        for turn in turns:
+            messages.extend(turn)
+        return messages
+
+    #
+    # Compact the history to fit the budget.  Called at a turn boundary (before a new query).
+    #
+
+    def compact(self, messages: list[Any], model: str) -> list[dict]:
+
+        messages = [as_dict(m) for m in messages]
+        tokens_before = token_counter(model=model, messages=messages)
+
+        if tokens_before <= self.token_budget:
+            self.last_tokens_saved = 0
+            return messages
+
+        system, summary, turns = self._split(messages)
+        turns = self._truncate_tool_results(turns)
+
+        compacted = self._assemble(system, summary, turns)
+        tokens = token_counter(model=model, messages=compacted)
+
+        # the tokens each turn would give back if dropped (its instructions stay), counted once
+        if tokens > self.token_budget:
+            turn_tokens = [self._count(model, [m for m in turn if not is_instruction(m)]) for turn in turns]
+            summary_tokens = self._count(model, self._assemble([ ], summary, [ ]))
+
+        while tokens > self.token_budget and len(turns) > self.keep_turns:
+            dropped = turns.pop(0)
+            tokens -= turn_tokens.pop(0)
+            self.turns_dropped += 1
+
+            system.extend(m for m in dropped if is_instruction(m))
+
+            if self.summarize:
+                summary = (summary + self.summarize(dropped))[-MAX_SUMMARY_LINES:]
+                new_summary_tokens = self._count(model, self._assemble([ ], summary, [ ]))
+                tokens += new_summary_tokens - summary_tokens
+                summary_tokens = new_summary_tokens
+
+        compacted = self._assemble(system, summary, turns)
+
+        self.compactions += 1
+        self.last_tokens_saved = tokens_before - tokens
+        self.total_tokens_saved += self.last_tokens_saved
+
+        logger.info(f"HistoryManager: compacted {tokens_before} -> {tokens} prompt tokens")
+        return compacted
@@ -39,10 +39,11 @@ class NlipAgent(CheckrAgent):
                  name: str,
                  model: str = MODEL,
                  instruction: str = None,
-                 tools: list[Callable] = [ ]
+                 tools: list[Callable] = [ ],
+                 **kwargs
                  ):
 
-        super().__init__(name, model, NLIP_INSTRUCTION, tools)
+        super().__init__(name, model, NLIP_INSTRUCTION, tools, **kwargs)
 
         # any additional instructions
         if instruction:
@@ -0,0 +1,140 @@
+#
+# Projections of NLIP responses into tool results.
+#
+# The result of a coordinator tool becomes part of the coordinator's conversation and is resent
+# to the LLM on every later call of the session.  The repr of a whole NLIP message, with the
+# format/subformat envelope of every submessage, costs many prompt tokens for little content.
+# A projection keeps only what the LLM needs, within a size limit:
+#
+#   text      the text parts, joined; other parts become a short [format/subformat] note
+#   json      compact JSON of the parts, with the default envelope (text/english) left out; the
+#             content of the largest parts is shortened to fit the limit, so the result still parses
+#   summary   the text, truncated to the limit with a note of what was left out
+#
+# The mode is chosen per coordinator, or for the process with CHECKR_NLIP_PROJECTION=mode[:max_chars]
+#
+
+import json
+import os
+from typing import Any, Optional
+
+NLIP_PROJECTION_ENV = "CHECKR_NLIP_PROJECTION"
+
+PROJECTION_MODES = ("text", "json", "summary")
+
+# defaults
+PROJECTION_MODE = "text"
+MAX_CHARS = 4000            # None: no limit
+
+
+def message_parts(msg: Any) -> list[dict]:
+    """The message and its submessages as a flat list of {format, subformat, content, label} dicts."""
+    d = msg.model_dump() if hasattr(msg, "model_dump") else dict(msg)
+    parts = [d] + list(d.get("submessages") or [ ])
+    return [p for p in parts if p.get("content") not in (None, "")]
+
+
+def is_text(part: dict) -> bool:
+    return str(part.get("format", "text")).lower() == "text"
+
+
+def content_text(content: Any) -> str:
+    return content if isinstance(content, str) else json.dumps(content, separators=(",", ":"), default=str)
+
+
+def truncate_content(content: Any, max_chars: Optional[int]) -> Any:
+    """The content, or its text cut to max_chars with a note of what was left out."""
+    if max_chars is None:
+        return content
+    text = content_text(content)
+    if len(text) <= max_chars:
+        return content
+    return text[:max_chars] + f"... [truncated {len(text) - max_chars} characters]"
+
+
+class NlipProjection:
+
+    def __init__(self, mode: str = PROJECTION_MODE, max_chars: Optional[int] = MAX_CHARS):
+        """
+        Args:
+          mode: one of "text", "json" or "summary"
+          max_chars: the maximum size of a projected result (None: no limit)
+        """
+
+        if mode not in PROJECTION_MODES:
+            raise ValueError(f"Unknown NLIP projection mode: {mode} (expected one of {PROJECTION_MODES})")
+
+        self.mode = mode
+        self.max_chars = max_chars
+
+    @classmethod
+    def from_string(cls, value: str) -> "NlipProjection":
+        """Parse "mode" or "mode:max_chars" (max_chars 0: no limit)."""
+        mode, _, limit = value.partition(":")
+        if not limit:
+            return cls(mode.strip() or PROJECTION_MODE)
+        return cls(mode.strip() or PROJECTION_MODE, int(limit) or None)
+
+    def _text(self, parts: list[dict]) -> str:
+        lines = [ ]
+        for p in parts:
+            if is_text(p):
+                lines.append(str(p["content"]))
+            else:
+                lines.append(f"[{p.get('format')}/{p.get('subformat')}: {len(str(p['content']))} characters]")
+        return "\n".join(lines)
+
+    def _json(self, parts: list[dict], content_chars: Optional[int] = None) -> str:
+        compact = [ ]
+        for p in parts:
+            item = {"content": truncate_content(p["content"], content_chars)}
+            if not is_text(p) or str(p.get("subformat", "english")).lower() != "english":
+                item["format"] = p.get("format")
+                item["subformat"] = p.get("subformat")
+            if p.get("label"):
+                item["label"] = p["label"]
+            compact.append(item)
+        return json.dumps(compact, separators=(",", ":"), default=str)
+
+    def _limit(self, result: str, note: str = "") -> str:
+        if self.max_chars is None or len(result) <= self.max_chars:
+            return result
+        return result[:self.max_chars] + f"... [truncated {len(result) - self.max_chars} characters{note}]"
+
+    #
+    # The largest number of characters of each part's content for which the JSON fits the limit
+    # (parts shorter than that are kept whole).  If even empty contents do not fit, the result
+    # is over the limit but still valid JSON.
+    #
+
+    def _fit_json(self, parts: list[dict]) -> str:
+        result = self._json(parts)
+        if self.max_chars is None or len(result) <= self.max_chars:
+            return result
+
+        low, high = 0, max(len(content_text(p["content"])) for p in parts)
+        while low < high:
+            middle = (low + high + 1) // 2
+            if len(self._json(parts, middle)) <= self.max_chars:
+                low = middle
+            else:
+                high = middle - 1
+        return self._json(parts, low)
+
+    def project(self, msg: Any) -> str:
+        parts = message_parts(msg)
+
+        if self.mode == "json":
+            return self._fit_json(parts)
+
+        text = self._text(parts)
+        if self.mode == "summary":
+            formats = sorted({f"{p.get('format')}/{p.get('subformat')}" for p in parts})
+            return self._limit(text, f" of {len(text)} in {len(parts)} parts: {', '.join(formats)}")
+        return self._limit(text)
+
+    __call__ = project
+
+
+# the projection of coordinators that do not choose one
+NLIP_PROJECTION = NlipProjection.from_string(os.environ.get(NLIP_PROJECTION_ENV, PROJECTION_MODE))
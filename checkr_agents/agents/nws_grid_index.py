@@ -0,0 +1,122 @@
+#
+# An index from locations to NWS forecast grids.
+#
+# The NWS forecast of a location takes two requests: /points/{lat},{lon} returns the forecast
+# office and grid cell of the location (and the forecast URL), then the forecast itself.  The
+# mapping from a location to its grid is essentially static, so it is kept in this index and
+# the common case needs only the forecast request.
+#
+# The index is keyed on the coordinates rounded to the NWS precision (4 decimal places).  It can
+# be preloaded from a JSON file, and new entries are written back to that file.
+#
+#   {
+#     "41.8781,-87.6298": {"forecast": "https://api.weather.gov/gridpoints/LOT/76,73/forecast",
+#                          "office": "LOT", "gridX": 76, "gridY": 73},
+#     ...
+#   }
+#
+
+import asyncio
+import json
+import os
+import threading
+from typing import Optional
+
+from checkr_agents import logger
+
+GRID_INDEX_ENV = "CHECKR_NWS_GRID_INDEX"
+
+# NWS accepts at most 4 decimal places in coordinates
+COORD_PRECISION = 4
+
+
+class GridIndex:
+
+    def __init__(self, path: Optional[str] = None):
+        """
+        Args:
+          path: a JSON file to preload from and persist to (None: memory only)
+        """
+
+        self.path = path
+        self.grids: dict[str, dict] = { }
+        self.lock = threading.Lock()
+
+        # snapshots are numbered, so that an older one is never written over a newer one
+        self.generation = 0
+        self.saved_generation = 0
+
+        # counters
+        self.hits = 0
+        self.misses = 0
+
+        if path and os.path.exists(path):
+            self.load(path)
+
+    def key(self, latitude: float, longitude: float) -> str:
+        return f"{round(float(latitude), COORD_PRECISION)},{round(float(longitude), COORD_PRECISION)}"
+
+    def load(self, path: str):
+        """Preload (or merge) entries from a JSON file."""
+        with open(path) as f:
+            self.grids.update(json.load(f))
+        logger.info(f"GridIndex: loaded {len(self.grids)} grid locations from {path}")
+
+    def get(self, latitude: float, longitude: float) -> Optional[dict]:
+        grid = self.grids.get(self.key(latitude, longitude), None)
+        if grid is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return grid
+
+    async def put_from_points(self, latitude: float, longitude: float, properties: dict) -> dict:
+        """Record the grid of a location from the properties of a /points response."""
+
+        grid = {
+            "forecast": properties["forecast"],
+            "office": properties.get("gridId"),
+            "gridX": properties.get("gridX"),
+            "gridY": properties.get("gridY"),
+        }
+        self.grids[self.key(latitude, longitude)] = grid
+
+        if self.path:
+            await asyncio.to_thread(self.save, self.snapshot())
+
+        return grid
+
+    def remove(self, latitude: float, longitude: float):
+        self.grids.pop(self.key(latitude, longitude), None)
+
+    #
+    # The index is changed on the event loop and written in a thread: the thread writes a copy
+    # taken on the loop, never the live dict.
+    #
+
+    def snapshot(self) -> tuple[int, dict]:
+        self.generation += 1
+        return self.generation, {key: dict(entry) for key, entry in self.grids.items()}
+
+    def save(self, snapshot: Optional[tuple[int, dict]] = None):
+        """Write a snapshot of the index (default: the index now) to its file atomically."""
+        generation, grids = snapshot if snapshot is not None else self.snapshot()
+        with self.lock:
+            if generation <= self.saved_generation:
+                return    # a newer snapshot has been written already
+            tmp = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp, "w") as f:
+                json.dump(grids, f, indent=1)
+            os.replace(tmp, self.path)
+            self.saved_generation = generation
+
+    def metrics(self) -> dict:
+        return {
+            "locations": len(self.grids),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+# the index shared by the weather tools of this process
+GRID_INDEX = GridIndex(path=os.environ.get(GRID_INDEX_ENV, None))
@@ -6,10 +6,12 @@ import logging
 import asyncio
 from importlib import resources
 import os
+import weakref
+from typing import Optional
 
 from .nlip_agent import NlipAgent
 from .checkr_agent import MODEL
-from ..rag.milvus_context_generator import MilvusContextGenerator
+from ..rag.context_generator_pool import CONTEXT_GENERATORS
 
 # use the default logger
 from checkr_agents import logger
@@ -25,6 +27,23 @@ EMBEDDING_MODEL = 'ollama/granite-embedding:30m'
 EMBEDDING_LENGTH = 384
 COLLECTION_NAME = 'pages'
 
+#
+# How retrieved context is given to the LLM
+#
+#   "ephemeral"  - the Q&A instruction is installed once, and the context is attached to the
+#                  current turn only.  The history keeps just the question.
+#   "persistent" - the original behavior: the instruction is added again on every query and
+#                  the context is embedded in the user message, so both stay in the history.
+#
+
+CONTEXT_MODE = "ephemeral"
+
+QA_INSTRUCTION = (
+    "You are an expert Q&A assistant. Use the provided context "
+    "to answer the user's question. If the answer is not in the context, "
+    "state that you cannot find the answer in the provided documents."
+)
+
 #
 # A helper function to locate a milvus file in checker_agents/resources/foo
 # and turn it into a relative path.
@@ -45,42 +64,65 @@ class RagNlipAgent(NlipAgent):
                  name: str,
                  model: str = MODEL,
                  instruction: str = None,
+                 context_mode: str = CONTEXT_MODE,
+                 **kwargs
                  ):
 
-        super().__init__(name, model=model)
+        if context_mode not in ("ephemeral", "persistent"):
+            raise ValueError(f"Unknown context_mode:{context_mode}")
+
+        super().__init__(name, model=model, **kwargs)
 
-        # initialize the vector database context generator
+        self.context_mode = context_mode
+
+        # the vector database context generator is shared by all sessions in the process.
+        # Its reference is released by cleanup(), or when the agent is garbage collected.
         URI = find_db_path_in_resources(DB)
-        self.mcg = MilvusContextGenerator(URI, EMBEDDING_MODEL, EMBEDDING_LENGTH, COLLECTION_NAME)
+        self.mcg = CONTEXT_GENERATORS.acquire(URI, EMBEDDING_MODEL, EMBEDDING_LENGTH, COLLECTION_NAME)
+        self._release_mcg = weakref.finalize(self, CONTEXT_GENERATORS.release, URI, EMBEDDING_MODEL, COLLECTION_NAME)
 
         self.add_instruction(NLIP_INSTRUCTION)
 
         if instruction:
             self.add_instruction(instruction)
 
+        if self.context_mode == "ephemeral":
+            self.add_instruction(QA_INSTRUCTION)
+
+    async def cleanup(self):
+        self._release_mcg()
+        await super().cleanup()
+
     #
-    # Override the query function to provide context from Milvus database
+    # Override the query function to provide context from Milvus database.
+    # (process_query() is implemented in terms of process_query_stream(), so both get the context.)
     #
 
-    async def process_query(self, query: str) -> list[str]:
+    async def process_query_stream(self, query: str, stream: bool = True, context: Optional[str] = None):
 
-        chunks = self.mcg.retrieve_context_from_milvus(query)
+        # concurrent lookups from other sessions are coalesced into one batched retrieval
+        chunks = await self.mcg.batcher.retrieve(query)
 
         context_str = "\n---\n".join(chunks)
 
-        system_prompt = (
-            "You are an expert Q&A assistant. Use the provided context "
-            "to answer the user's question. If the answer is not in the context, "
-            "state that you cannot find the answer in the provided documents."
-        )
+        if self.context_mode == "ephemeral":
+            turn_context = f"Context: {context_str}"
+            if context:
+                turn_context = f"{context}\n\n{turn_context}"
+
+            async for event in super().process_query_stream(query, stream=stream, context=turn_context):
+                yield event
+            return
 
         user_prompt = (
             f"Context: {context_str}\n\n"
             f"Question: {query}"
         )
 
-        self.add_instruction(system_prompt)
-        return await super().process_query(user_prompt)
+        self.add_instruction(QA_INSTRUCTION, turn=True)
+
+        async for event in super().process_query_stream(user_prompt, stream=stream, context=context):
+            yield event
         
     
 
@@ -0,0 +1,90 @@
+#
+# Single-flight execution of tool calls.
+#
+# When many sessions ask the same question at the same moment (the alerts of one state, the same
+# Wikipedia page), each would make its own upstream request.  A tool marked with @coalesce is
+# instead run once per (tool, canonical arguments) while a call is in flight: later identical
+# calls wait for the first one and share its result (or its exception).
+#
+# Only mark tools whose result depends on nothing but their arguments and that have no side
+# effects a caller relies on.
+#
+# Calls are identified by their arguments as the LLM wrote them.  A tool that normalizes its
+# arguments gives the same normalization as its key, so that equivalent calls ("ca" and "CA")
+# are coalesced too:
+#
+#    @coalesce(key=lambda state: {"state": normalize_state(state)})
+#    async def get_alerts(state: str) -> str: ...
+#
+
+import asyncio
+import json
+from typing import Any, Awaitable, Callable, Hashable, Optional
+
+
+def coalesce(fn: Optional[Callable] = None, *, key: Optional[Callable[..., dict]] = None) -> Callable:
+    """Mark a tool so that identical concurrent calls share one execution.
+    key: maps the arguments of a call to the normalized arguments that identify it."""
+
+    def mark(fn: Callable) -> Callable:
+        fn.coalesce = True
+        fn.coalesce_key = key
+        return fn
+
+    return mark(fn) if fn is not None else mark
+
+
+def canonical_args(args: dict) -> str:
+    return json.dumps(args, sort_keys=True, separators=(",", ":"), default=str)
+
+
+def call_key(fn: Callable, args: dict) -> tuple:
+    """The key of a call of a coalesced tool."""
+    key = getattr(fn, "coalesce_key", None)
+    if key is not None:
+        try:
+            args = key(**args)
+        except Exception:
+            pass    # arguments the tool itself will reject: keyed as they are
+    return (fn.__module__, fn.__qualname__, canonical_args(args))
+
+
+class SingleFlight:
+
+    def __init__(self):
+        # key -> the task of the call in flight
+        self.inflight: dict[Hashable, asyncio.Task] = { }
+
+        # counters
+        self.calls = 0        # executions started
+        self.coalesced = 0    # calls that joined an execution in flight
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        task = self.inflight.get(key, None)
+
+        if task is None:
+            self.calls += 1
+            task = asyncio.ensure_future(fn())
+            self.inflight[key] = task
+
+            def done(t, key=key):
+                if self.inflight.get(key, None) is t:
+                    del self.inflight[key]
+
+            task.add_done_callback(done)
+        else:
+            self.coalesced += 1
+
+        # a cancelled waiter must not cancel the call the others are waiting for
+        return await asyncio.shield(task)
+
+    def metrics(self) -> dict:
+        return {
+            "inflight": len(self.inflight),
+            "calls": self.calls,
+            "coalesced": self.coalesced,
+        }
+
+
+# tool calls of every agent in this process
+TOOL_CALLS = SingleFlight()
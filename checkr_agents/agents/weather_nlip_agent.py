@@ -6,10 +6,15 @@ import logging
 
 import asyncio
 from .nlip_agent import NlipAgent
+from .checkr_agent import PARALLEL_TOOL_CONCURRENCY
+from .single_flight import coalesce
 
 from typing import Any
 import httpx
 
+from checkr_agents.http_client.response_cache import RESPONSE_CACHE
+from .nws_grid_index import GRID_INDEX, COORD_PRECISION
+
 # Constants
 NWS_API_BASE = "https://api.weather.gov"
 USER_AGENT = "weather-app/1.0"
@@ -17,19 +22,39 @@ USER_AGENT = "weather-app/1.0"
 #MODEL = 'ollama_chat/llama3.2:latest'
 MODEL = "anthropic/claude-3-7-sonnet-20250219"
 
+# Lifetimes (seconds) of cached upstream responses per tool.  None follows the upstream Cache-Control.
+ALERTS_CACHE_TTL = None
+POINTS_CACHE_TTL = 86400.0     # the points -> forecast grid mapping is essentially static (see GRID_INDEX)
+FORECAST_CACHE_TTL = None
+
+# A forecast endpoint that answers with one of these no longer exists: the grid was reassigned
+GRID_GONE_STATUS = (404, 410)
+
+NWS_HEADERS = {"User-Agent": USER_AGENT, "Accept": "application/geo+json"}
+
 # Use the NLIP logger in this package
 logger = logging.getLogger("NLIP")
 
-async def make_nws_request(url: str) -> dict[str, Any] | None:
-    """Make a request to the NWS API with proper error handling."""
-    headers = {"User-Agent": USER_AGENT, "Accept": "application/geo+json"}
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.get(url, headers=headers, timeout=30.0)
-            response.raise_for_status()
-            return response.json()
-        except Exception:
-            return None
+async def make_nws_request(url: str, ttl: float | None = None) -> dict[str, Any] | None:
+    """Make a request to the NWS API with proper error handling.
+    Responses are cached (and revalidated) as the NWS Cache-Control headers allow, or for ttl seconds.
+    """
+    try:
+        return await RESPONSE_CACHE.get_json(url, headers=NWS_HEADERS, ttl=ttl)
+    except Exception:
+        return None
+
+
+async def fetch_forecast(url: str) -> tuple[dict[str, Any] | None, bool]:
+    """Fetch the forecast of a grid.  Return (data, gone): data is None on any error, and gone
+    is True if the grid endpoint no longer exists (rather than failed for now).
+    """
+    try:
+        return await RESPONSE_CACHE.get_json(url, headers=NWS_HEADERS, ttl=FORECAST_CACHE_TTL), False
+    except httpx.HTTPStatusError as e:
+        return None, e.response.status_code in GRID_GONE_STATUS
+    except Exception:
+        return None, False
 
 
 def format_alert(feature: dict) -> str:
@@ -43,15 +68,30 @@ Description: {props.get('description', 'No description available')}
 Instructions: {props.get('instruction', 'No specific instructions provided')}
 """
 
+# normalize the arguments so that equivalent requests share cache entries and calls in flight
+
+def normalize_state(state: str) -> str:
+    return state.strip().upper()
+
+def normalize_location(latitude: float, longitude: float) -> tuple[float, float]:
+    return round(float(latitude), COORD_PRECISION), round(float(longitude), COORD_PRECISION)
+
+def location_key(latitude: float, longitude: float) -> dict:
+    latitude, longitude = normalize_location(latitude, longitude)
+    return {"latitude": latitude, "longitude": longitude}
+
+
 # TOOL definition
+@coalesce(key=lambda state: {"state": normalize_state(state)})
 async def get_alerts(state: str) -> str:
     """Get weather alerts for a US state.
 
     Args:
         state: Two-letter US state code (e.g. CA, NY)
     """
+    state = normalize_state(state)
     url = f"{NWS_API_BASE}/alerts/active/area/{state}"
-    data = await make_nws_request(url)
+    data = await make_nws_request(url, ttl=ALERTS_CACHE_TTL)
 
     if not data or "features" not in data:
         return "Unable to fetch alerts or no alerts found."
@@ -64,6 +104,7 @@ async def get_alerts(state: str) -> str:
 
 
 # TOOL definition
+@coalesce(key=location_key)
 async def get_forecast(latitude: float, longitude: float) -> str:
     """Get weather forecast for a location.
 
@@ -71,16 +112,34 @@ async def get_forecast(latitude: float, longitude: float) -> str:
         latitude: Latitude of the location
         longitude: Longitude of the location
     """
-    # First get the forecast grid endpoint
+    latitude, longitude = normalize_location(latitude, longitude)
     points_url = f"{NWS_API_BASE}/points/{latitude},{longitude}"
-    points_data = await make_nws_request(points_url)
 
-    if not points_data:
-        return "Unable to fetch forecast data for this location."
+    # The forecast grid of a known location comes from the index, saving the /points request
+    grid = GRID_INDEX.get(latitude, longitude)
+
+    if grid is not None:
+        forecast_data, gone = await fetch_forecast(grid["forecast"])
+
+        if gone:
+            # the grid was reassigned; look it up again below, past the cached /points response
+            GRID_INDEX.remove(latitude, longitude)
+            await RESPONSE_CACHE.invalidate(points_url)
+            grid = None
+
+        elif not forecast_data:
+            return "Unable to fetch detailed forecast."
+
+    if grid is None:
+        # First get the forecast grid endpoint
+        points_data = await make_nws_request(points_url, ttl=POINTS_CACHE_TTL)
+
+        if not points_data:
+            return "Unable to fetch forecast data for this location."
 
-    # Get the forecast URL from the points response
-    forecast_url = points_data["properties"]["forecast"]
-    forecast_data = await make_nws_request(forecast_url)
+        # Get the forecast URL from the points response and remember the grid
+        grid = await GRID_INDEX.put_from_points(latitude, longitude, points_data["properties"])
+        forecast_data, _ = await fetch_forecast(grid["forecast"])
 
     if not forecast_data:
         return "Unable to fetch detailed forecast."
@@ -107,10 +166,12 @@ class WeatherNlipAgent(NlipAgent):
                  name: str,
                  model: str = MODEL,
                  instruction: str = None,
-                 tools = [get_forecast, get_alerts]
+                 tools = [get_forecast, get_alerts],
+                 tool_concurrency: int = PARALLEL_TOOL_CONCURRENCY,
+                 **kwargs
                  ):
 
-        super().__init__(name, model=model, tools=tools)
+        super().__init__(name, model=model, tools=tools, tool_concurrency=tool_concurrency, **kwargs)
 
         self.add_instruction("You are an agent with tools for querying about the weather by location")
 
@@ -6,39 +6,54 @@ from checkr_agents import logger
 
 import asyncio
 from .nlip_agent import NlipAgent
+from .checkr_agent import PARALLEL_TOOL_CONCURRENCY
+from .single_flight import coalesce
 
 from typing import Any
 import httpx
 
+from urllib.parse import quote
+
+from checkr_agents.http_client.response_cache import RESPONSE_CACHE
+
 # Constants
 WIKIPEDIA_API_BASE = "https://en.wikipedia.org/api/rest_v1/page/summary/{title}"
 USER_AGENT = "wikipedia-app/1.0"
 
+# Lifetime (seconds) of cached page summaries.  None follows the upstream Cache-Control.
+SUMMARY_CACHE_TTL = None
+
 
 #MODEL = 'ollama_chat/llama3.2:latest'
 MODEL = "anthropic/claude-3-7-sonnet-20250219"
 
-async def make_wikipedia_request(url: str) -> dict[str, Any] | None:
-    """Make a request to the Wikipedia API with proper error handling."""
+async def make_wikipedia_request(url: str, ttl: float | None = None) -> dict[str, Any] | None:
+    """Make a request to the Wikipedia API with proper error handling.
+    Responses are cached (and revalidated) as the Cache-Control headers allow, or for ttl seconds.
+    """
     headers = {"User-Agent": USER_AGENT, "Accept": "application/json"}
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.get(url, headers=headers, timeout=30.0)
-            response.raise_for_status()
-            return response.json()
-        except Exception:
-            return None
+    try:
+        return await RESPONSE_CACHE.get_json(url, headers=headers, ttl=ttl)
+    except Exception:
+        return None
+
+
+def normalize_title(title: str) -> str:
+    """Wikipedia titles use underscores for spaces and are case-insensitive in the first letter only."""
+    title = "_".join(title.split())
+    return title[:1].upper() + title[1:]
 
 
 # TOOL definition
+@coalesce(key=lambda title: {"title": normalize_title(title)})
 async def get_wikipedia_page_by_title(title: str) -> Any:
     """ Get wikipedia page summary given the page title
 
     Args:
         title: The title of the Wikipedia article
     """
-    url = WIKIPEDIA_API_BASE.format(title=title)
-    data = await make_wikipedia_request(url)
+    url = WIKIPEDIA_API_BASE.format(title=quote(normalize_title(title), safe=""))
+    data = await make_wikipedia_request(url, ttl=SUMMARY_CACHE_TTL)
 
     return data
 
@@ -49,10 +64,12 @@ class WikipediaNlipAgent(NlipAgent):
                  name: str,
                  model: str = MODEL,
                  instruction: str = None,
-                 tools = [get_wikipedia_page_by_title]
+                 tools = [get_wikipedia_page_by_title],
+                 tool_concurrency: int = PARALLEL_TOOL_CONCURRENCY,
+                 **kwargs
                  ):
 
-        super().__init__(name, model=model, tools=tools)
+        super().__init__(name, model=model, tools=tools, tool_concurrency=tool_concurrency, **kwargs)
 
         self.add_instruction("You are an agent with tools for retrieving page summaries from Wikipedia given a page title."
                              "Use wikipedia as a helpful encyclopedia with many kinds of knowledge."
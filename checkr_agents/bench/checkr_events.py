@@ -0,0 +1,102 @@
+#
+# Benchmark: the cost of the Checkr events of an agent with zero, one or many assertion modules
+# loaded.
+#
+# Each variant runs queries through process_query of an agent with its own ("agent" scoped)
+# Checkr, with the LLM replaced by a stub that answers at once, so that the time measured is that
+# of the agent and its events.  It also times post_and_run alone on one event.  With no assertion
+# loaded the events are not subscribed to and post_and_run returns at once.
+#
+# Usage:
+#    $ python -m checkr_agents.bench.checkr_events --queries 200 --modules 10
+#
+
+import argparse
+import asyncio
+import logging
+import statistics
+import time
+
+import litellm
+
+from checkr_agents.agents import checkr_agent
+from checkr_agents.agents.checkr_agent import CheckrAgent
+
+# the stub answers every query with this text
+MOCK_RESPONSE = "The answer is 42."
+
+# the assertion loaded once per module of a variant
+SPEC = "checkr_agents.assertions.assertion1:mainfn"
+
+
+#
+# Stub LLM calls.  litellm builds a real ModelResponse from mock_response without a network call.
+#
+
+def stub_completion(**kwargs):
+    return litellm.completion(mock_response=MOCK_RESPONSE, **kwargs)
+
+async def stub_acompletion(**kwargs):
+    return litellm.completion(mock_response=MOCK_RESPONSE, **kwargs)
+
+
+def new_agent(nmodules: int) -> CheckrAgent:
+    agent = CheckrAgent(f"Bench{nmodules}", checkr_scope="agent")
+    for _ in range(nmodules):
+        agent.checkr.load_spec(SPEC)
+
+    # each copy of the module sets up its logger again; its logging would dominate the timings
+    logging.getLogger("assertion1").setLevel(logging.WARNING)
+    return agent
+
+
+async def measure_queries(nmodules: int, nqueries: int) -> list[float]:
+    agent = new_agent(nmodules)
+
+    latencies = [ ]
+    for _ in range(nqueries):
+        t0 = time.perf_counter()
+        await agent.process_query("What is the answer?")
+        latencies.append((time.perf_counter() - t0) * 1000.0)
+
+    await agent.checkr.flush()
+    return latencies
+
+
+def measure_post(nmodules: int, nposts: int) -> float:
+    agent = new_agent(nmodules)
+    checkr = agent.checkr
+    evt = agent.on_query_received
+
+    t0 = time.perf_counter()
+    for i in range(nposts):
+        checkr.post_and_run(checkr.trel(), evt, "What is the answer?")
+    return (time.perf_counter() - t0) / nposts * 1e6
+
+
+async def main(args):
+    checkr_agent.completion = stub_completion
+    checkr_agent.acompletion = stub_acompletion
+
+    print(f"queries:{args.queries} posts:{args.posts}")
+    for nmodules in (0, 1, args.modules):
+        latencies = await measure_queries(nmodules, args.queries)
+        per_post = measure_post(nmodules, args.posts)
+        print(f"  {nmodules:>3} modules: query mean {statistics.mean(latencies):.4f} ms  "
+              f"median {statistics.median(latencies):.4f} ms  "
+              f"post_and_run {per_post:.3f} us")
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser("Measure the overhead of Checkr events with zero, one or many assertion modules")
+    parser.add_argument("--queries", type=int, default=200, help="number of sequential queries per variant")
+    parser.add_argument("--posts", type=int, default=10000, help="number of events posted directly per variant")
+    parser.add_argument("--modules", type=int, default=10, help="number of assertion modules of the largest variant")
+    args = parser.parse_args()
+
+    # litellm debug logging is turned on by checkr_agent; it would dominate the timings
+    logging.getLogger("LiteLLM").setLevel(logging.WARNING)
+    logging.getLogger("checkr").setLevel(logging.WARNING)
+
+    asyncio.run(main(args))
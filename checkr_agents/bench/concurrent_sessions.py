@@ -0,0 +1,73 @@
+#
+# Benchmark: N agent sessions in one event loop, each processing one query.
+#
+# The LLM is replaced with a stub that takes DELAY seconds to answer.  With the blocking
+# "sync" completion mode the sessions are serialized (about N * DELAY); with the "async"
+# and "thread" modes they overlap and finish in roughly the time of one session.
+#
+# Usage:
+#    $ python -m checkr_agents.bench.concurrent_sessions --sessions 10 --delay 0.5
+#
+
+import argparse
+import asyncio
+import logging
+import time
+
+import litellm
+
+from checkr_agents.agents import checkr_agent
+from checkr_agents.agents.checkr_agent import CheckrAgent
+
+# the stub answers every query with this text
+MOCK_RESPONSE = "The answer is 42."
+
+
+#
+# Stub LLM calls.  litellm builds a real ModelResponse from mock_response without a network call.
+#
+
+def make_stubs(delay: float):
+
+    def stub_completion(**kwargs):
+        time.sleep(delay)
+        return litellm.completion(mock_response=MOCK_RESPONSE, **kwargs)
+
+    async def stub_acompletion(**kwargs):
+        await asyncio.sleep(delay)
+        return litellm.completion(mock_response=MOCK_RESPONSE, **kwargs)
+
+    return stub_completion, stub_acompletion
+
+
+async def run_sessions(mode: str, nsessions: int) -> float:
+    agents = [CheckrAgent(f"Agent{i}", completion_mode=mode) for i in range(nsessions)]
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*[agent.process_query("What is the answer?") for agent in agents])
+    return time.perf_counter() - t0
+
+
+async def main(args):
+    stub_completion, stub_acompletion = make_stubs(args.delay)
+    checkr_agent.completion = stub_completion
+    checkr_agent.acompletion = stub_acompletion
+
+    print(f"sessions:{args.sessions} llm delay:{args.delay:.3f}s")
+    for mode in ("sync", "thread", "async"):
+        elapsed = await run_sessions(mode, args.sessions)
+        print(f"  {mode:>6}: {elapsed:.3f}s  ({elapsed / args.delay:.1f}x one call)")
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser("Measure overlap of concurrent agent sessions in one process")
+    parser.add_argument("--sessions", type=int, default=10, help="number of concurrent sessions")
+    parser.add_argument("--delay", type=float, default=0.5, help="simulated LLM latency in seconds")
+    args = parser.parse_args()
+
+    # litellm debug logging is turned on by checkr_agent; it would dominate the timings
+    logging.getLogger("LiteLLM").setLevel(logging.WARNING)
+    logging.getLogger("checkr").setLevel(logging.WARNING)
+
+    asyncio.run(main(args))
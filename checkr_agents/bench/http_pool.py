@@ -0,0 +1,95 @@
+#
+# Benchmark: per-call latency of a tool HTTP request with a fresh httpx.AsyncClient per call
+# (the original make_nws_request) versus a client from the shared HttpClientPool.
+#
+# A small keep-alive HTTP/1.1 stub server runs on localhost, so the difference measured is the
+# TCP connection setup.  Against a real https upstream the TLS handshake makes it larger.
+#
+# Usage:
+#    $ python -m checkr_agents.bench.http_pool --calls 200
+#
+
+import argparse
+import asyncio
+import json
+import statistics
+import time
+
+import httpx
+
+from checkr_agents.http_client.http_client_pool import HttpClientPool
+
+BODY = json.dumps({"properties": {"forecast": "stub"}}).encode()
+
+
+#
+# A minimal HTTP/1.1 server that answers every GET with BODY and keeps the connection open
+#
+
+async def handle_connection(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    try:
+        while True:
+            request = await reader.readuntil(b"\r\n\r\n")
+            if not request:
+                break
+            writer.write(
+                b"HTTP/1.1 200 OK\r\n"
+                b"Content-Type: application/json\r\n"
+                + f"Content-Length: {len(BODY)}\r\n".encode()
+                + b"Connection: keep-alive\r\n\r\n"
+                + BODY
+            )
+            await writer.drain()
+    except (asyncio.IncompleteReadError, ConnectionResetError):
+        pass
+    finally:
+        writer.close()
+
+
+async def fresh_client_call(url: str):
+    async with httpx.AsyncClient() as client:
+        response = await client.get(url, timeout=30.0)
+        return response.json()
+
+
+async def pooled_call(pool: HttpClientPool, url: str):
+    client = pool.client_for(url)
+    response = await client.get(url, timeout=30.0)
+    return response.json()
+
+
+async def measure(name: str, call, ncalls: int):
+    latencies = [ ]
+    for _ in range(ncalls):
+        t0 = time.perf_counter()
+        await call()
+        latencies.append((time.perf_counter() - t0) * 1000.0)
+
+    print(f"  {name:>12}: mean {statistics.mean(latencies):.3f} ms  "
+          f"median {statistics.median(latencies):.3f} ms  "
+          f"p95 {sorted(latencies)[int(0.95 * (len(latencies) - 1))]:.3f} ms")
+
+
+async def main(args):
+    server = await asyncio.start_server(handle_connection, "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    url = f"http://127.0.0.1:{port}/points/38.9,-77.0"
+
+    pool = HttpClientPool(http2=False)
+
+    print(f"calls:{args.calls} stub server:{url}")
+    async with server:
+        await measure("fresh client", lambda: fresh_client_call(url), args.calls)
+        await measure("pooled", lambda: pooled_call(pool, url), args.calls)
+        await pool.aclose()
+
+    print(f"  pool: {pool.metrics()}")
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser("Compare per-call latency of fresh and pooled HTTP clients")
+    parser.add_argument("--calls", type=int, default=200, help="number of sequential calls per variant")
+    args = parser.parse_args()
+
+    asyncio.run(main(args))
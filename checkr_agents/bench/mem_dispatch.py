@@ -0,0 +1,72 @@
+#
+# Benchmark: per-message latency of a mem:// agent reached through httpx.ASGITransport
+# (NlipAsyncClient) versus direct in-process dispatch (NlipDirectClient).
+#
+# The agent is an NlipSessionServer whose SessionManager echoes the message, so the difference
+# measured is the HTTP framing, JSON serialization and FastAPI request handling of the ASGI path.
+#
+# Usage:
+#    $ python -m checkr_agents.bench.mem_dispatch --calls 1000 --size 1000
+#
+
+import argparse
+import asyncio
+import statistics
+import time
+
+from nlip_sdk.nlip import NLIP_Factory, NLIP_Message
+
+from checkr_agents import MEM_APP_TBL
+from checkr_agents.http_client.nlip_async_client import NlipAsyncClient
+from checkr_agents.http_client.nlip_direct_client import NlipDirectClient
+from checkr_agents.http_server.nlip_session_server import NlipSessionServer, SessionManager
+
+
+class EchoManager(SessionManager):
+
+    async def process_nlip(self, msg: NLIP_Message) -> NLIP_Message:
+        return NLIP_Factory.create_text(msg.extract_text(language=None))
+
+
+async def measure(name: str, client, msg: NLIP_Message, ncalls: int):
+    # the first call creates the session
+    await client.async_send(msg)
+
+    latencies = [ ]
+    for _ in range(ncalls):
+        t0 = time.perf_counter()
+        await client.async_send(msg)
+        latencies.append((time.perf_counter() - t0) * 1000.0)
+
+    print(f"  {name:>6}: mean {statistics.mean(latencies):.4f} ms  "
+          f"median {statistics.median(latencies):.4f} ms  "
+          f"p95 {sorted(latencies)[int(0.95 * (len(latencies) - 1))]:.4f} ms")
+
+
+async def main(args):
+    app = NlipSessionServer("EchoCookie", EchoManager)
+    MEM_APP_TBL["echo"] = app
+
+    msg = NLIP_Factory.create_text("x" * args.size)
+
+    asgi_client = NlipAsyncClient("mem://echo/nlip/")
+    direct_client = NlipDirectClient("mem://echo/nlip/")
+
+    print(f"calls:{args.calls} message size:{args.size}")
+    await measure("asgi", asgi_client, msg, args.calls)
+    await measure("direct", direct_client, msg, args.calls)
+
+    await asgi_client.aclose()
+    await direct_client.aclose()
+
+    print(f"  sessions: {app.sessions.metrics()}")
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser("Compare mem:// latency through ASGI and direct dispatch")
+    parser.add_argument("--calls", type=int, default=1000, help="number of sequential messages per variant")
+    parser.add_argument("--size", type=int, default=1000, help="number of characters in each message")
+    args = parser.parse_args()
+
+    asyncio.run(main(args))
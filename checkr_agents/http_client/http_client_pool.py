@@ -0,0 +1,109 @@
+#
+# A shared pool of HTTP clients for agent tools.
+#
+# A tool that builds a new httpx.AsyncClient per call pays for a new TCP (and TLS) connection
+# every time.  The pool keeps one long-lived client per host (scheme://host:port) so that
+# connections are kept alive and reused, with a per-host limit on connections.  HTTP/2 is
+# used when the optional "h2" package is installed.
+#
+# Tools do not hold a reference to their agent, so the agent makes its pool current while one
+# of its tools runs, and the tool asks for a client with:
+#
+#     client = http_client(url)
+#
+# Clients are closed with the pool (from the server lifespan).  A closed pool re-opens on demand.
+#
+
+import httpx
+from contextvars import ContextVar
+from typing import Optional
+from urllib.parse import urlparse
+
+from checkr_agents import logger
+
+try:
+    import h2
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+# defaults
+MAX_CONNECTIONS_PER_HOST = 10
+MAX_KEEPALIVE_PER_HOST = 10
+KEEPALIVE_EXPIRY = 30.0   # seconds an idle connection is kept open
+TIMEOUT = 30.0
+
+
+class HttpClientPool:
+
+    def __init__(self,
+                 max_connections_per_host: int = MAX_CONNECTIONS_PER_HOST,
+                 max_keepalive_per_host: int = MAX_KEEPALIVE_PER_HOST,
+                 keepalive_expiry: float = KEEPALIVE_EXPIRY,
+                 timeout: float = TIMEOUT,
+                 http2: bool = HTTP2_AVAILABLE):
+
+        self.limits = httpx.Limits(
+            max_connections=max_connections_per_host,
+            max_keepalive_connections=max_keepalive_per_host,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self.timeout = timeout
+        self.http2 = http2
+
+        # "scheme://netloc" -> client
+        self.clients: dict[str, httpx.AsyncClient] = { }
+
+        # counters
+        self.requests = 0
+        self.clients_created = 0
+
+    def client_for(self, url: str) -> httpx.AsyncClient:
+        u = urlparse(url)
+        key = f"{u.scheme}://{u.netloc}"
+
+        client = self.clients.get(key, None)
+        if client is None or client.is_closed:
+            client = httpx.AsyncClient(limits=self.limits, timeout=self.timeout, http2=self.http2)
+            self.clients[key] = client
+            self.clients_created += 1
+            logger.debug(f"HttpClientPool: new client for {key} http2:{self.http2}")
+
+        self.requests += 1
+        return client
+
+    async def aclose(self):
+        clients = list(self.clients.values())
+        self.clients.clear()
+        for client in clients:
+            await client.aclose()
+
+    def metrics(self) -> dict:
+        return {
+            "hosts": len(self.clients),
+            "clients_created": self.clients_created,
+            "requests": self.requests,
+            "http2": self.http2,
+        }
+
+
+# the pool used by tools when no agent has made another one current
+HTTP_CLIENTS = HttpClientPool()
+
+# the pool of the agent whose tool is running
+_current_pool: ContextVar[Optional[HttpClientPool]] = ContextVar("checkr_http_client_pool", default=None)
+
+
+def set_current_pool(pool: HttpClientPool):
+    """Make the pool current in this context.  Returns a token for reset_current_pool()."""
+    return _current_pool.set(pool)
+
+
+def reset_current_pool(token):
+    _current_pool.reset(token)
+
+
+def http_client(url: str) -> httpx.AsyncClient:
+    """Return a pooled client for the host of the url."""
+    pool = _current_pool.get() or HTTP_CLIENTS
+    return pool.client_for(url)
@@ -2,53 +2,131 @@
 # A simple Async NLIP Client based on HTTPX
 #
 
+import asyncio
 import httpx
+import json
+from typing import AsyncIterator, Optional
 from urllib.parse import urlparse
 
 from nlip_sdk.nlip import NLIP_Message
 
 from checkr_agents import MEM_APP_TBL # global table of in-memory registered apps
 
-class NlipAsyncClient:
+# how long connect waits for a server to report healthy
+READY_TIMEOUT = 10.0
+
+def unix_path(name):
+    return f"/tmp/agent-{name}.sock"
+
+#
+# Map an agent URL to the http URL used in requests, and to a transport that reaches it:
+#
+#    http://host:port/nlip/  -> a network transport
+#    unix://name/nlip/       -> a transport on the socket /tmp/agent-{name}.sock
+#    mem://name/nlip/        -> an ASGI transport calling the app registered as "name"
+#
+
+def request_url(base_url: str) -> str:
+    u = urlparse(base_url)
+    if u.scheme in ("unix", "mem"):
+        # need to adjust requests to use the url with unix->http
+        return u._replace(scheme="http").geturl()
+    return base_url
+
+def make_transport(base_url: str, limits: Optional[httpx.Limits] = None) -> httpx.AsyncBaseTransport:
+    u = urlparse(base_url)
+    kwargs = { } if limits is None else {"limits": limits}
+
+    if u.scheme == "unix":
+        return httpx.AsyncHTTPTransport(uds=unix_path(u.hostname), **kwargs)
+
+    elif u.scheme == "mem":
+        app = MEM_APP_TBL.get(u.hostname, None)
+        if app == None:
+            raise Exception(f"App named {u.hostname} in {base_url} not found")
+
+        return httpx.ASGITransport(app=app)
 
-    def __init__(self, base_url: str):
-        u = urlparse(base_url)
-        
-        if u.scheme == "unix":
-            # need to adjust requests to use the url with unix->http
-            new_url = u._replace(scheme="http").geturl()
-            self.base_url = new_url
+    else:
+        return httpx.AsyncHTTPTransport(**kwargs)
 
-            transport = httpx.AsyncHTTPTransport(uds=self.unix_path(u.hostname))
-            self.client = httpx.AsyncClient(transport=transport)
 
-        elif u.scheme == "mem":
-            
-            new_url = u._replace(scheme="http").geturl()
-            self.base_url = new_url
+class NlipAsyncClient:
+
+    def __init__(self, base_url: str, transport: Optional[httpx.AsyncBaseTransport] = None):
+        """
+        Args:
+          base_url: the NLIP endpoint, ex: "mem://weather/nlip/"
+          transport: a transport to use instead of a new one (see NlipClientPool)
+        """
 
-            app = MEM_APP_TBL.get(u.hostname, None)
-            if app == None:
-                raise Exception(f"App named {u.hostname} in {base_url} not found")
+        self.base_url = request_url(base_url)
 
-            transport = httpx.ASGITransport(app=app)
-            self.client = httpx.AsyncClient(transport=transport)
+        if transport is None:
+            transport = make_transport(base_url)
 
-        else:
-            self.base_url = base_url
-            self.client = httpx.AsyncClient()
+        # the client keeps the cookies (the NLIP session) of this connection
+        self.client = httpx.AsyncClient(transport=transport)
 
     def unix_path(self, name):
-        return f"/tmp/agent-{name}.sock"
+        return unix_path(name)
                                                  
 
     @classmethod
     def create_from_url(cls, base_url:str):
         return NlipAsyncClient(base_url)
 
+    #
+    # Readiness probe: poll the server's /health route until it answers, or give up after timeout.
+    #
+
+    async def wait_ready(self, timeout: float = READY_TIMEOUT) -> bool:
+        u = urlparse(self.base_url)
+        health_url = f"{u.scheme}://{u.netloc}/health"
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        delay = 0.05
+
+        while True:
+            try:
+                response = await self.client.get(health_url, timeout=timeout)
+                if response.status_code == 200:
+                    return True
+            except httpx.TransportError:
+                pass
+
+            if loop.time() + delay > deadline:
+                return False
+
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 1.0)
+
+    async def aclose(self):
+        await self.client.aclose()
+
     async def async_send(self, msg:NLIP_Message) -> NLIP_Message:
         response = await self.client.post(self.base_url, json=msg.to_dict(), timeout=120.0, follow_redirects=True)
         data = response.raise_for_status().json()
         nlip_msg = NLIP_Message(**data)
         return nlip_msg
-        
+
+    #
+    # Send a message to the streaming endpoint (/nlip/stream) and yield the progress events as
+    # they arrive.  The message of the final "done" event is converted to an NLIP_Message.
+    #
+    # Note: httpx.ASGITransport buffers the whole response, so mem:// servers deliver all
+    # events at once.
+    #
+
+    async def async_send_stream(self, msg:NLIP_Message) -> AsyncIterator[dict]:
+        stream_url = self.base_url.rstrip("/") + "/stream"
+        async with self.client.stream("POST", stream_url, json=msg.to_dict(), timeout=120.0, follow_redirects=True) as response:
+            response.raise_for_status()
+            async for line in response.aiter_lines():
+                if not line:
+                    continue
+                event = json.loads(line)
+                if event.get("type") == "done":
+                    event["message"] = NLIP_Message(**event["message"])
+                yield event
@@ -0,0 +1,103 @@
+#
+# A pool of NLIP client transports shared by coordinator sessions.
+#
+# Each coordinator session needs its own NLIP session with a remote agent (its own cookie), but
+# not its own connections.  The pool keeps one transport (connection pool) per remote base URL;
+# the NlipAsyncClient of each session has its own cookie jar and sends its requests through the
+# shared transport.  Closing a session's client leaves the shared transport open; the pool
+# closes the transports when the server shuts down.
+#
+# Agents registered in this process (mem://) are called directly, without a transport, by an
+# NlipDirectClient (unless direct_mem is False).
+#
+
+import httpx
+from urllib.parse import urlparse
+
+from checkr_agents import logger
+from .nlip_async_client import NlipAsyncClient, make_transport
+from .nlip_direct_client import NlipDirectClient, supports_direct
+
+# defaults
+MAX_CONNECTIONS = 20
+MAX_KEEPALIVE = 10
+KEEPALIVE_EXPIRY = 30.0
+DIRECT_MEM = True
+
+
+#
+# A transport whose aclose() does not close the underlying shared transport
+#
+
+class SharedTransport(httpx.AsyncBaseTransport):
+
+    def __init__(self, transport: httpx.AsyncBaseTransport):
+        self.transport = transport
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        return await self.transport.handle_async_request(request)
+
+    async def aclose(self):
+        pass
+
+
+class NlipClientPool:
+
+    def __init__(self,
+                 max_connections: int = MAX_CONNECTIONS,
+                 max_keepalive: int = MAX_KEEPALIVE,
+                 keepalive_expiry: float = KEEPALIVE_EXPIRY,
+                 direct_mem: bool = DIRECT_MEM):
+
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive,
+            keepalive_expiry=keepalive_expiry,
+        )
+
+        self.direct_mem = direct_mem
+
+        # "scheme://netloc" -> transport
+        self.transports: dict[str, httpx.AsyncBaseTransport] = { }
+
+        # counters
+        self.clients_created = 0
+        self.direct_clients_created = 0
+
+    def key(self, base_url: str) -> str:
+        u = urlparse(base_url)
+        return f"{u.scheme}://{u.netloc}"
+
+    def create_client(self, base_url: str) -> NlipAsyncClient | NlipDirectClient:
+        """A new client (a new NLIP session) for base_url over the shared transport."""
+
+        if self.direct_mem and supports_direct(base_url):
+            self.direct_clients_created += 1
+            return NlipDirectClient(base_url)
+
+        key = self.key(base_url)
+        transport = self.transports.get(key, None)
+        if transport is None:
+            transport = make_transport(base_url, self.limits)
+            self.transports[key] = transport
+            logger.debug(f"NlipClientPool: new transport for {key}")
+
+        self.clients_created += 1
+        return NlipAsyncClient(base_url, transport=SharedTransport(transport))
+
+    async def aclose(self):
+        transports = list(self.transports.values())
+        self.transports.clear()
+        for transport in transports:
+            await transport.aclose()
+
+    def metrics(self) -> dict:
+        return {
+            "transports": len(self.transports),
+            "clients_created": self.clients_created,
+            "direct_clients_created": self.direct_clients_created,
+        }
+
+
+# the pool shared by the coordinator sessions of this process
+NLIP_CLIENTS = NlipClientPool()
@@ -0,0 +1,72 @@
+#
+# A direct NLIP client for mem:// agents in the same process.
+#
+# An NlipAsyncClient reaches a mem:// agent through httpx.ASGITransport: the message is
+# serialized to JSON, runs through the FastAPI request pipeline and validation, and the response
+# is parsed again on the way back.  An NlipDirectClient hands the NLIP_Message object to the
+# target NlipSessionServer's dispatch() instead, and the response object is returned as is.
+#
+# The client keeps the session_id of its NLIP session in place of the cookie, so each client
+# stays with its own SessionManager (and agent) at the target, as over HTTP.
+#
+# Messages are not copied: neither side should modify a message after it has been sent.
+#
+
+from typing import AsyncIterator, Optional
+from urllib.parse import urlparse
+
+from nlip_sdk.nlip import NLIP_Message
+
+from checkr_agents import MEM_APP_TBL # global table of in-memory registered apps
+
+
+#
+# Is the mem:// app at base_url one that can be called directly?
+#
+
+def supports_direct(base_url: str) -> bool:
+    u = urlparse(base_url)
+    if u.scheme != "mem":
+        return False
+    app = MEM_APP_TBL.get(u.hostname, None)
+    return hasattr(app, "dispatch") and hasattr(app, "dispatch_stream")
+
+
+class NlipDirectClient:
+
+    def __init__(self, base_url: str):
+        """
+        Args:
+          base_url: the NLIP endpoint of an agent registered in MEM_APP_TBL, ex: "mem://weather/nlip/"
+        """
+
+        u = urlparse(base_url)
+        app = MEM_APP_TBL.get(u.hostname, None)
+        if app == None:
+            raise Exception(f"App named {u.hostname} in {base_url} not found")
+
+        self.base_url = base_url
+        self.app = app
+
+        # the NLIP session of this client at the app
+        self.session_id: Optional[str] = None
+
+    async def wait_ready(self, timeout: float = None) -> bool:
+        # the app is in this process: it is ready as soon as it is registered
+        return True
+
+    async def aclose(self):
+        self.session_id = None
+
+    async def async_send(self, msg: NLIP_Message) -> NLIP_Message:
+        response, self.session_id = await self.app.dispatch(msg, self.session_id)
+        return response
+
+    async def async_send_stream(self, msg: NLIP_Message) -> AsyncIterator[dict]:
+        manager = await self.app.session_manager_for(self.session_id)
+        self.session_id = manager.session_id
+
+        async for event in self.app.dispatch_stream(msg, manager):
+            if event.get("type") == "done" and isinstance(event.get("message"), dict):
+                event = dict(event, message=NLIP_Message(**event["message"]))
+            yield event
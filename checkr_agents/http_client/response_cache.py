@@ -0,0 +1,244 @@
+#
+# A cache of JSON responses for agent tools that call HTTP APIs, with HTTP revalidation.
+#
+# Upstream APIs say how long a response stays fresh (Cache-Control: max-age, Expires) and how to
+# check it cheaply afterwards (ETag, Last-Modified).  The cache honors both:
+#
+#   - a fresh entry is returned without a request
+#   - a stale entry with validators is revalidated with a conditional request
+#     (If-None-Match / If-Modified-Since); a 304 answer renews it without a body
+#   - "Cache-Control: no-store" responses are never stored
+#
+# A tool can override the lifetime (ttl) of its responses.  Entries are kept in an in-memory
+# LRU and, optionally, in a SQLite file so they survive restarts (see CHECKR_RESPONSE_CACHE).
+#
+# The cache key is the URL, so tools normalize their arguments before building it.
+#
+
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from email.utils import parsedate_to_datetime
+from typing import Any, Optional
+
+from checkr_agents import logger
+from .http_client_pool import http_client
+
+RESPONSE_CACHE_ENV = "CHECKR_RESPONSE_CACHE"
+
+# defaults
+MAX_ENTRIES = 1024
+DEFAULT_TTL = 0.0    # seconds, when the response does not say (0: always revalidate)
+TIMEOUT = 30.0
+
+
+class CacheEntry:
+
+    __slots__ = ("data", "etag", "last_modified", "expires_at")
+
+    def __init__(self, data: Any, etag: Optional[str], last_modified: Optional[str], expires_at: float):
+        self.data = data
+        self.etag = etag
+        self.last_modified = last_modified
+        self.expires_at = expires_at
+
+
+#
+# Parse "Cache-Control: max-age=60, public" into {"max-age": "60", "public": None}
+#
+
+def parse_cache_control(value: Optional[str]) -> dict[str, Optional[str]]:
+    directives = { }
+    for part in (value or "").split(","):
+        part = part.strip()
+        if not part:
+            continue
+        name, _, arg = part.partition("=")
+        directives[name.strip().lower()] = arg.strip().strip('"') or None
+    return directives
+
+
+class ResponseCache:
+
+    def __init__(self, maxsize: int = MAX_ENTRIES, path: Optional[str] = None, default_ttl: float = DEFAULT_TTL):
+        """
+        Args:
+          maxsize: the maximum number of entries kept in memory
+          path: a SQLite file in which entries persist (None: memory only)
+          default_ttl: lifetime of responses without freshness information
+        """
+
+        self.maxsize = maxsize
+        self.path = path
+        self.default_ttl = default_ttl
+
+        self.entries: OrderedDict[str, CacheEntry] = OrderedDict()
+
+        self.db = None
+        self.lock = threading.Lock()
+        if path:
+            self.db = sqlite3.connect(path, check_same_thread=False)
+            self.db.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                " url TEXT PRIMARY KEY, data TEXT NOT NULL,"
+                " etag TEXT, last_modified TEXT, expires_at REAL NOT NULL)"
+            )
+            self.db.commit()
+            logger.info(f"ResponseCache: persisted in {path}")
+
+        # counters
+        self.hits = 0          # fresh, no request
+        self.revalidated = 0   # stale, renewed by a 304
+        self.misses = 0        # full response fetched
+
+    #
+    # The lifetime of a response in seconds, or None if it must not be stored
+    #
+
+    def lifetime(self, headers, ttl: Optional[float]) -> Optional[float]:
+        cc = parse_cache_control(headers.get("cache-control"))
+
+        if "no-store" in cc:
+            return None
+        if ttl is not None:
+            return ttl
+        if "no-cache" in cc:
+            return 0.0
+        if cc.get("max-age"):
+            try:
+                return max(0.0, float(cc["max-age"]))
+            except ValueError:
+                pass
+        if headers.get("expires"):
+            try:
+                expires = parsedate_to_datetime(headers["expires"]).timestamp()
+                return max(0.0, expires - time.time())
+            except (TypeError, ValueError):
+                pass
+        return self.default_ttl
+
+    #
+    # Memory and disk storage
+    #
+
+    def _db_execute(self, sql: str, params: tuple = ( )):
+        with self.lock:
+            rows = self.db.execute(sql, params).fetchall()
+            self.db.commit()
+            return rows
+
+    async def _lookup(self, url: str) -> Optional[CacheEntry]:
+        entry = self.entries.get(url, None)
+        if entry is not None:
+            self.entries.move_to_end(url)
+            return entry
+
+        if self.db is None:
+            return None
+
+        rows = await asyncio.to_thread(
+            self._db_execute,
+            "SELECT data, etag, last_modified, expires_at FROM responses WHERE url = ?", (url,)
+        )
+        if not rows:
+            return None
+
+        data, etag, last_modified, expires_at = rows[0]
+        entry = CacheEntry(json.loads(data), etag, last_modified, expires_at)
+        self._remember(url, entry)
+        return entry
+
+    def _remember(self, url: str, entry: CacheEntry):
+        self.entries[url] = entry
+        self.entries.move_to_end(url)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+    async def _store(self, url: str, entry: CacheEntry):
+        self._remember(url, entry)
+
+        if self.db is not None:
+            await asyncio.to_thread(
+                self._db_execute,
+                "INSERT OR REPLACE INTO responses (url, data, etag, last_modified, expires_at) VALUES (?, ?, ?, ?, ?)",
+                (url, json.dumps(entry.data), entry.etag, entry.last_modified, entry.expires_at)
+            )
+
+    #
+    # GET a JSON document through the cache.  HTTP errors raise, as with httpx.
+    #
+
+    async def get_json(self, url: str, headers: Optional[dict] = None, ttl: Optional[float] = None) -> Any:
+
+        entry = await self._lookup(url)
+        now = time.time()
+
+        if entry is not None and now < entry.expires_at:
+            self.hits += 1
+            return entry.data
+
+        request_headers = dict(headers or { })
+        if entry is not None:
+            if entry.etag:
+                request_headers["If-None-Match"] = entry.etag
+            if entry.last_modified:
+                request_headers["If-Modified-Since"] = entry.last_modified
+
+        client = http_client(url)
+        response = await client.get(url, headers=request_headers, timeout=TIMEOUT, follow_redirects=True)
+
+        if entry is not None and response.status_code == 304:
+            self.revalidated += 1
+            lifetime = self.lifetime(response.headers, ttl)
+            entry.expires_at = now + (lifetime or 0.0)
+            await self._store(url, entry)
+            return entry.data
+
+        response.raise_for_status()
+        data = response.json()
+        self.misses += 1
+
+        lifetime = self.lifetime(response.headers, ttl)
+        etag = response.headers.get("etag")
+        last_modified = response.headers.get("last-modified")
+
+        # worth keeping if it is fresh for a while or can be revalidated
+        if lifetime is not None and (lifetime > 0 or etag or last_modified):
+            await self._store(url, CacheEntry(data, etag, last_modified, now + lifetime))
+
+        return data
+
+    async def invalidate(self, url: str):
+        """Forget the entry of a URL, so that the next request fetches it in full."""
+        self.entries.pop(url, None)
+        if self.db is not None:
+            await asyncio.to_thread(self._db_execute, "DELETE FROM responses WHERE url = ?", (url,))
+
+    def clear(self):
+        self.entries.clear()
+        if self.db is not None:
+            self._db_execute("DELETE FROM responses")
+
+    async def aclose(self):
+        if self.db is not None:
+            with self.lock:
+                self.db.close()
+            self.db = None
+
+    def metrics(self) -> dict:
+        total = self.hits + self.revalidated + self.misses
+        return {
+            "entries": len(self.entries),
+            "hits": self.hits,
+            "revalidated": self.revalidated,
+            "misses": self.misses,
+            "hit_rate": (self.hits + self.revalidated) / total if total else 0.0,
+        }
+
+
+# the cache shared by the tools of this process
+RESPONSE_CACHE = ResponseCache(path=os.environ.get(RESPONSE_CACHE_ENV, None))
@@ -4,30 +4,40 @@
 
 import asyncio
 from fastapi import FastAPI, Body, Request, Response, Depends, HTTPException
-from typing import Dict, Annotated
+from fastapi.responses import StreamingResponse
+from typing import Dict, Annotated, AsyncIterator, Optional
 from uuid import uuid4
 import traceback
 import sys
+import json
 from contextlib import asynccontextmanager
 
-from nlip_sdk.nlip import NLIP_Message
+from nlip_sdk.nlip import NLIP_Message, NLIP_Factory
 
 from checkr_agents import logger
+from .session_store import SessionStore, MAX_SESSIONS, SESSION_TTL, REAP_INTERVAL
+from .session_backend import SessionBackend, session_backend_from_env
 
 #
 # The Lifespan context manager allows us to catch the CancelledError (generated by ^C)
-# and shutdown cleanly
+# and shutdown cleanly.  An NlipSessionServer also starts its background tasks here and
+# releases its resources on the way out.
 #
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     logger.debug(f"LIFESPAN-Start: {app}")
+
+    if isinstance(app, NlipSessionServer):
+        await app.startup()
+
     try:
         yield
     except asyncio.CancelledError:
         logger.debug(f"LIFESPAN-Cancelled:{app}")
     finally:
-        pass
+        if isinstance(app, NlipSessionServer):
+            await app.shutdown()
 
     logger.debug(f"LIFESPAN-End:{app}")
 
@@ -37,14 +47,152 @@ async def lifespan(app: FastAPI):
 
 class SessionManager:
 
+    # the session this manager serves, and the version of its state in the session backend
+    session_id: Optional[str] = None
+    state_version: int = 0
+
+    # requests on the session still running, and whether it was removed from the store meanwhile
+    # (it is closed when the last of them finishes)
+    active_requests: int = 0
+    close_pending: bool = False
+
     async def process_nlip(self, msg: NLIP_Message) -> NLIP_Message:
         raise NotImplementedError("Subclasses must implement this method")
-    
+
+    #
+    # Stream progress events (dicts with a "type") while processing the message.  The last event
+    # is {"type": "done", "message": <NLIP message as a dict>}.  Subclasses with an agent that
+    # can stream override this; the default has no partial progress.
+    #
+
+    async def process_nlip_stream(self, msg: NLIP_Message) -> AsyncIterator[dict]:
+        response = await self.process_nlip(msg)
+        yield {"type": "done", "message": response.to_dict()}
+
+    #
+    # Persistence hooks for an external session backend.  A manager whose session can be
+    # rehydrated by another worker returns a JSON-serializable state.
+    #
+
+    def get_state(self) -> Optional[dict]:
+        return None
+
+    def set_state(self, state: dict):
+        pass
+
+    #
+    # Release the resources of the session when it is evicted, expires or the server shuts down
+    #
+
+    async def aclose(self):
+        pass
+
+    #
+    # Called once by the server of this manager class, to register what its sessions share
+    # (shutdown callbacks, metrics)
+    #
+
+    @classmethod
+    def configure_server(cls, app: "NlipSessionServer"):
+        pass
+
+
+#
+# The text results of an agent's query as one NLIP message, one text part each.  An agent
+# that produced no text answers with an empty text.
+#
+
+def results_message(results: list[str]) -> NLIP_Message:
+    if not results:
+        return NLIP_Factory.create_text("")
+
+    msg = NLIP_Factory.create_text(results[0])
+    for res in results[1:]:
+        msg.add_text(res)
+    return msg
+
+#
+# A SessionManager with an agent of its own (a CheckrAgent in self.myAgent) for each session.
+# Subclasses create the agent; the queries, streaming and state of the session are the agent's.
+#
+
+class AgentSessionManager(SessionManager):
+
+    myAgent = None
+
+    # the text of the query in a message
+    def query_text(self, msg: NLIP_Message) -> str:
+        # concatenate all of the "text" parts
+        return msg.extract_text(language=None)
+
+    async def process_nlip(self, msg: NLIP_Message) -> NLIP_Message:
+
+        text = self.query_text(msg)
+
+        try:
+            results = await self.myAgent.process_query(text)
+            logger.info(f"{type(self).__name__} results: {results}")
+            return results_message(results)
+        except Exception as e:
+            logger.error(f"Exception: {e}")
+            error_message = f"Exception: {e}"
+            return NLIP_Factory.create_text(error_message)
+
+    async def process_nlip_stream(self, msg: NLIP_Message) -> AsyncIterator[dict]:
+
+        text = self.query_text(msg)
+
+        async for event in self.myAgent.process_query_stream(text):
+            if event["type"] == "done":
+                event = {"type": "done", "message": results_message(event["results"]).to_dict()}
+            yield event
+
+    def get_state(self) -> dict:
+        return self.myAgent.get_state()
+
+    def set_state(self, state: dict):
+        self.myAgent.set_state(state)
+
+    async def aclose(self):
+        await self.myAgent.cleanup()
+
+    #
+    # The events of the agents still queued for deferred assertion checking are evaluated when
+    # the last app of the process shuts down.  /metrics reports the Checkrs of all the agents.
+    #
+
+    @classmethod
+    def configure_server(cls, app: "NlipSessionServer"):
+        from checkr_agents.agents.checkr import flush_checkrs, checkr_metrics
+
+        app.add_shared_shutdown_callback(flush_checkrs)
+        app.add_metrics("checkr", checkr_metrics)
+
+#
+# Resources shared by the apps of a process (the process-wide pools and caches) are closed by the
+# last app holding them to shut down, not the first: callback -> the number of started apps
+# holding it.
 #
-# A fast api server with two predefined routes
+
+_shared_holders: dict = { }
+
+#
+# A fast api server with predefined routes
+#
+#   max_sessions: the most sessions kept at once; the least recently used is evicted beyond that
+#   session_ttl: seconds a session may be idle before it expires (None: never)
+#   reap_interval: seconds between runs of the background task that removes expired sessions
+#   session_backend: an external store of session states shared by workers
+#                    (default: from the CHECKR_SESSION_BACKEND environment variable, if set)
+#
+
 class NlipSessionServer(FastAPI):
 
-    def __init__(self, suffix:str, session_manager_class):
+    def __init__(self, suffix:str, session_manager_class,
+                 max_sessions: int = MAX_SESSIONS,
+                 session_ttl: float = SESSION_TTL,
+                 reap_interval: float = REAP_INTERVAL,
+                 session_backend: Optional[SessionBackend] = None):
 
         super().__init__(lifespan=lifespan)
 
@@ -52,7 +200,28 @@ class NlipSessionServer(FastAPI):
         self.session_manager_class = session_manager_class
 
         self.session_cookie_name = f"session_id_{suffix}"
-        self.sessions: Dict[str, SessionManager] = { }
+        self.sessions = SessionStore(max_sessions=max_sessions, idle_ttl=session_ttl,
+                                     is_busy=lambda manager: manager.active_requests > 0)
+
+        self.reap_interval = reap_interval
+        self.reaper_task = None
+        self.started = False
+
+        if session_backend is None:
+            session_backend = session_backend_from_env()
+        self.session_backend = session_backend
+
+        # async callables to run when the server shuts down, and when the last server holding
+        # a shared resource shuts down
+        self.shutdown_callbacks = [ ]
+        self.shared_shutdown_callbacks = [ ]
+
+        # name -> callable returning a dict, reported by /metrics
+        self.metrics_providers = { }
+
+        # saves to the session backend, and those refused because another worker saved first
+        self.saves = 0
+        self.save_conflicts = 0
 
         app = self
 
@@ -62,7 +231,9 @@ class NlipSessionServer(FastAPI):
                 manager: SessionManager = Depends(self.get_session_manager)
         ):
             try:
-                response = await manager.process_nlip(message)
+                async with self.serving(manager):
+                    response = await manager.process_nlip(message)
+                    await self.save_session(manager)
                 return response
             except Exception as e:
                 logger.error(f"NlipSessionServer:{e}")
@@ -70,34 +241,266 @@ class NlipSessionServer(FastAPI):
                 raise HTTPException(status_code=400, detail=str(e))
 
 
+        #
+        # The streaming route returns newline-delimited JSON (one event per line) so that
+        # the client sees tokens and tool progress as soon as they are produced.
+        #
+
+        @app.post("/nlip/stream")
+        async def process_nlip_stream_request(
+                message: Annotated[NLIP_Message, Body(examples=examples)],
+                response: Response,
+                manager: SessionManager = Depends(self.get_session_manager)
+        ):
+            async def ndjson():
+                try:
+                    async with self.serving(manager):
+                        async for event in manager.process_nlip_stream(message):
+                            yield json.dumps(event) + "\n"
+                        await self.save_session(manager)
+                except Exception as e:
+                    logger.error(f"NlipSessionServer:{e}")
+                    traceback.print_exc(file=sys.stdout)
+                    yield json.dumps({"type": "error", "detail": str(e)}) + "\n"
+
+            streaming_response = StreamingResponse(ndjson(), media_type="application/x-ndjson")
+
+            # a new session sets its cookie on the dependency's response; carry it over
+            for cookie in response.headers.getlist("set-cookie"):
+                streaming_response.headers.append("set-cookie", cookie)
+
+            return streaming_response
+
         @app.get("/health")
         async def health_check():
             return {"status": "healthy"}
-        
+
+        @app.get("/metrics")
+        async def metrics():
+            result = {"sessions": self.sessions.metrics()}
+            for name, provider in self.metrics_providers.items():
+                result[name] = provider()
+            return result
+
+        if self.session_backend:
+            self.add_shutdown_callback(self.session_backend.close)
+            self.add_metrics("session_backend", lambda: {"saves": self.saves, "save_conflicts": self.save_conflicts})
+
+        session_manager_class.configure_server(self)
+
+    #
+    # Called from the lifespan.  A mem:// app has no lifespan: MountSpec starts and shuts it down,
+    # and it starts with its first session otherwise.  Both may be called more than once.
+    #
+
+    async def startup(self):
+        if self.started:
+            return
+        self.started = True
+        self.reaper_task = asyncio.create_task(self.run_reaper())
+
+        for callback in self.shared_shutdown_callbacks:
+            _shared_holders[callback] = _shared_holders.get(callback, 0) + 1
+
+    async def shutdown(self):
+        if not self.started:
+            return
+        self.started = False
+
+        if self.reaper_task:
+            self.reaper_task.cancel()
+            self.reaper_task = None
+
+        # the sessions still live release their resources before the shared ones are closed
+        await self.close_sessions(self.sessions.clear())
+
+        callbacks = list(self.shutdown_callbacks)
+        for callback in self.shared_shutdown_callbacks:
+            holders = _shared_holders.pop(callback, 1) - 1
+            if holders > 0:
+                _shared_holders[callback] = holders
+            else:
+                callbacks.append(callback)
+
+        for callback in callbacks:
+            try:
+                await callback()
+            except Exception as e:
+                logger.error(f"NlipSessionServer: shutdown callback {callback}: {e}")
+
+    def add_shutdown_callback(self, callback):
+        """Register an async callable that releases a resource when the server shuts down."""
+        self.shutdown_callbacks.append(callback)
+
+    def add_shared_shutdown_callback(self, callback):
+        """Register an async callable that releases a resource shared by the apps of the process,
+        when the last started app that registered it shuts down."""
+        self.shared_shutdown_callbacks.append(callback)
+
+    def add_metrics(self, name: str, provider):
+        """Report the dict returned by provider() under name in /metrics."""
+        self.metrics_providers[name] = provider
+
+    #
+    # Periodically remove expired sessions from the store and the backend
+    #
+
+    async def run_reaper(self):
+        while True:
+            await asyncio.sleep(self.reap_interval)
+
+            expired = self.sessions.reap()
+            if expired:
+                logger.debug(f"NlipSessionServer: reaped {len(expired)} expired sessions, {len(self.sessions)} live")
+                await self.close_sessions(expired)
+
+            if self.session_backend and self.sessions.idle_ttl is not None:
+                try:
+                    await self.session_backend.purge(self.sessions.idle_ttl)
+                except Exception as e:
+                    logger.error(f"NlipSessionServer: purging session backend: {e}")
+
+    #
+    # Close the managers of sessions removed from the store.  A manager with a request still
+    # running is closed when that request finishes (see serving()).
+    #
+
+    async def close_sessions(self, managers: list[SessionManager]):
+        for manager in managers:
+            if manager.active_requests > 0:
+                manager.close_pending = True
+                continue
+            try:
+                await manager.aclose()
+            except Exception as e:
+                logger.error(f"NlipSessionServer: closing session_id: {manager.session_id}: {e}")
+
+    #
+    # Count a request on a session while it runs, so that the session is not evicted, reaped or
+    # closed under it.
+    #
+
+    @asynccontextmanager
+    async def serving(self, manager: SessionManager):
+        manager.active_requests += 1
+        try:
+            yield manager
+        finally:
+            manager.active_requests -= 1
+            if manager.active_requests == 0 and manager.close_pending:
+                manager.close_pending = False
+                await self.close_sessions([manager])
+
+    #
+    # Session backend: rehydrate a session that was saved by another worker (or before a restart),
+    # or refresh a local one if another worker has saved a newer version of it.
+    #
+    # A save that conflicts with one by another worker (both held the same version) is not
+    # written: the session is reloaded from the backend, and the turn of this worker is lost from
+    # its history rather than the other worker's.
+    #
+
+    async def load_session(self, session_id: str, manager: Optional[SessionManager]) -> Optional[SessionManager]:
+        newer_than = manager.state_version if manager else -1
+        loaded = await self.session_backend.load(session_id, newer_than)
+        if loaded is None:
+            return manager
+
+        version, state = loaded
+
+        if manager is None:
+            manager = self.session_manager_class()
+            manager.session_id = session_id
+            await self.close_sessions(self.sessions.put(session_id, manager))
+            logger.debug(f"Rehydrated session_id: {session_id} version: {version}")
+
+        manager.set_state(state)
+        manager.state_version = version
+        return manager
+
+    async def save_session(self, manager: SessionManager):
+        if self.session_backend is None:
+            return
+
+        state = manager.get_state()
+        if state is None:
+            return
+
+        version = manager.state_version + 1
+        if await self.session_backend.save(manager.session_id, version, state):
+            manager.state_version = version
+            self.saves += 1
+            return
+
+        self.save_conflicts += 1
+        logger.warning(f"NlipSessionServer: session_id: {manager.session_id} version: {version} was saved by another worker; reloading it")
+        await self.load_session(manager.session_id, manager)
+
+    #
+    # The manager of a session: held by this process, rehydrated from the session backend, or
+    # (if session_id is None or unknown) a new session with a new session_id.
+    #
+
+    async def session_manager_for(self, session_id: Optional[str]) -> SessionManager:
+
+        await self.startup()
+
+        manager = self.sessions.get(session_id) if session_id else None
+
+        if session_id and self.session_backend:
+            manager = await self.load_session(session_id, manager)
+
+        if manager is None:
+            # Create a new session and manager
+            session_id = str(uuid4())
+            manager = self.session_manager_class()
+            manager.session_id = session_id
+            await self.close_sessions(self.sessions.put(session_id, manager))
+            logger.debug(f"Created new session and agent for session_id: {session_id}")
+
+        return manager
+
     # A dependency function to get or create a session
-    def get_session_manager(self, request: Request, response: Response) -> SessionManager:
+    async def get_session_manager(self, request: Request, response: Response) -> SessionManager:
         """
         Retrieves the Session manager instance associated with the current session.
+        A session not held by this process is rehydrated from the session backend, if any.
         A new session and manager are created if not exists.
         """
 
         session_id = request.cookies.get(self.session_cookie_name)
+        manager = await self.session_manager_for(session_id)
 
-        if not session_id or session_id not in self.sessions:
-            # Create a new session and manager
-            session_id = str(uuid4())
-            self.sessions[session_id] = self.session_manager_class()
-
+        if manager.session_id != session_id:
             # Set cookie to remember this session
             response.set_cookie(
                 key=self.session_cookie_name,
-                value=session_id,
+                value=manager.session_id,
                 httponly=True,
                 samesite="lax",
             )
-            logger.debug(f"Created new session and agent for session_id: {session_id}")
 
-        return self.sessions[session_id]
+        return manager
+
+    #
+    # In-process dispatch for clients in the same process (mem:// agents, see NlipDirectClient).
+    # The session handling is that of the routes, but the NLIP_Message objects are handed over
+    # directly, without HTTP framing or JSON.  The caller keeps the returned session_id in place
+    # of the cookie.
+    #
+
+    async def dispatch(self, message: NLIP_Message, session_id: Optional[str] = None) -> tuple[NLIP_Message, str]:
+        manager = await self.session_manager_for(session_id)
+        async with self.serving(manager):
+            response = await manager.process_nlip(message)
+            await self.save_session(manager)
+        return response, manager.session_id
+
+    async def dispatch_stream(self, message: NLIP_Message, manager: SessionManager) -> AsyncIterator[dict]:
+        async with self.serving(manager):
+            async for event in manager.process_nlip_stream(message):
+                yield event
+            await self.save_session(manager)
 
 # Provide examples of simple NLIP messages that are displayed in the docs UI
 examples = [
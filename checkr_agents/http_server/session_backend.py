@@ -0,0 +1,185 @@
+#
+# External session backends for the NlipSessionServer.
+#
+# The SessionStore keeps live SessionManagers in the memory of one process.  A backend keeps a
+# serialized copy of each session's state outside of it, so that a session can be rehydrated by
+# any worker (or after a restart) from its cookie alone.
+#
+# Each saved state carries a version number.  A worker that already holds a session only
+# reloads it when another worker has saved a newer version.  A save is a compare-and-set: version
+# N+1 replaces version N only, so of two workers that both hold version N the second to save
+# is told of the conflict instead of overwriting the first.
+#
+# Backends are selected with a URL, for example in the CHECKR_SESSION_BACKEND environment variable:
+#
+#    memory://                     - in this process only (useful for testing)
+#    sqlite:///path/to/sessions.db - a SQLite file shared by the workers on one host
+#
+
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional
+from urllib.parse import urlparse
+
+from checkr_agents import logger
+
+SESSION_BACKEND_ENV = "CHECKR_SESSION_BACKEND"
+
+
+class SessionBackend:
+
+    async def load(self, session_id: str, newer_than: int = -1) -> Optional[tuple[int, dict]]:
+        """Return (version, state) if the session exists with a version greater than newer_than."""
+        raise NotImplementedError("Subclasses must implement this method")
+
+    async def save(self, session_id: str, version: int, state: dict) -> bool:
+        """Store state as version if the stored version is version - 1 or the session is not stored.
+        Return False if another version was saved meanwhile."""
+        raise NotImplementedError("Subclasses must implement this method")
+
+    async def delete(self, session_id: str):
+        raise NotImplementedError("Subclasses must implement this method")
+
+    async def purge(self, idle_ttl: float) -> int:
+        """Remove sessions not saved in the last idle_ttl seconds.  Return how many were removed."""
+        return 0
+
+    async def close(self):
+        pass
+
+
+#
+# Keeps serialized states in a dict.  Sessions survive eviction from the SessionStore,
+# but not a restart.
+#
+
+class MemorySessionBackend(SessionBackend):
+
+    def __init__(self):
+        # session_id -> (version, saved_at, json string)
+        self.states: dict[str, tuple[int, float, str]] = { }
+
+    async def load(self, session_id: str, newer_than: int = -1) -> Optional[tuple[int, dict]]:
+        entry = self.states.get(session_id, None)
+        if entry is None or entry[0] <= newer_than:
+            return None
+        return (entry[0], json.loads(entry[2]))
+
+    async def save(self, session_id: str, version: int, state: dict) -> bool:
+        entry = self.states.get(session_id, None)
+        if entry is not None and entry[0] != version - 1:
+            return False
+        self.states[session_id] = (version, time.time(), json.dumps(state))
+        return True
+
+    async def delete(self, session_id: str):
+        self.states.pop(session_id, None)
+
+    async def purge(self, idle_ttl: float) -> int:
+        cutoff = time.time() - idle_ttl
+        expired = [sid for sid, entry in self.states.items() if entry[1] < cutoff]
+        for sid in expired:
+            del self.states[sid]
+        return len(expired)
+
+
+#
+# Keeps serialized states in a SQLite file.  The database calls run in a thread so that they
+# do not block the event loop.  WAL mode lets several worker processes share the file.
+#
+
+class SqliteSessionBackend(SessionBackend):
+
+    def __init__(self, path: str):
+        self.path = path
+        self.lock = threading.Lock()
+
+        self.conn = sqlite3.connect(path, check_same_thread=False, timeout=30.0)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            " session_id TEXT PRIMARY KEY,"
+            " version INTEGER NOT NULL,"
+            " saved_at REAL NOT NULL,"
+            " state TEXT NOT NULL)"
+        )
+        self.conn.commit()
+
+        logger.info(f"SqliteSessionBackend: sessions stored in {path}")
+
+    def _execute(self, sql: str, params: tuple = ( )):
+        with self.lock:
+            cursor = self.conn.execute(sql, params)
+            rows = cursor.fetchall()
+            self.conn.commit()
+            return rows, cursor.rowcount
+
+    async def load(self, session_id: str, newer_than: int = -1) -> Optional[tuple[int, dict]]:
+        rows, _ = await asyncio.to_thread(
+            self._execute,
+            "SELECT version, state FROM sessions WHERE session_id = ? AND version > ?",
+            (session_id, newer_than)
+        )
+        if not rows:
+            return None
+        version, state = rows[0]
+        return (version, json.loads(state))
+
+    async def save(self, session_id: str, version: int, state: dict) -> bool:
+        state = json.dumps(state)
+
+        _, count = await asyncio.to_thread(
+            self._execute,
+            "UPDATE sessions SET version = ?, saved_at = ?, state = ? WHERE session_id = ? AND version = ?",
+            (version, time.time(), state, session_id, version - 1)
+        )
+        if count == 0:
+            # a new session (or one purged meanwhile); fails if another worker has stored it since
+            _, count = await asyncio.to_thread(
+                self._execute,
+                "INSERT OR IGNORE INTO sessions (session_id, version, saved_at, state) VALUES (?, ?, ?, ?)",
+                (session_id, version, time.time(), state)
+            )
+        return count == 1
+
+    async def delete(self, session_id: str):
+        await asyncio.to_thread(self._execute, "DELETE FROM sessions WHERE session_id = ?", (session_id,))
+
+    async def purge(self, idle_ttl: float) -> int:
+        _, count = await asyncio.to_thread(
+            self._execute, "DELETE FROM sessions WHERE saved_at < ?", (time.time() - idle_ttl,)
+        )
+        return count
+
+    async def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+#
+# Create a backend from a URL.  Return None for an empty URL.
+#
+
+def session_backend_from_url(url: Optional[str]) -> Optional[SessionBackend]:
+    if not url:
+        return None
+
+    u = urlparse(url)
+
+    if u.scheme == "memory":
+        return MemorySessionBackend()
+
+    elif u.scheme == "sqlite":
+        # sqlite:///relative.db or sqlite:////absolute/path.db
+        return SqliteSessionBackend(u.path[1:] if u.path.startswith("/") else u.path)
+
+    else:
+        raise Exception(f"Unrecognized session backend scheme:{u.scheme}")
+
+
+def session_backend_from_env() -> Optional[SessionBackend]:
+    return session_backend_from_url(os.environ.get(SESSION_BACKEND_ENV, None))
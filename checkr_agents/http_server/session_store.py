@@ -0,0 +1,158 @@
+#
+# A bounded in-memory store of sessions for the NlipSessionServer.
+#
+# Every session holds a SessionManager (and with it an Agent and its conversation history),
+# so the store limits how many may exist:
+#
+#   - max_sessions: when full, the least recently used session is evicted
+#   - idle_ttl: a session that has not been used for this many seconds expires
+#
+# Sessions are kept in least-recently-used order, so expired sessions are always at the front
+# and reaping them does not scan the live ones.
+#
+# The store does not release the resources of a manager.  put(), reap() and clear() return the
+# managers they removed, for the server to close them.  An expired session is removed by the
+# next put() or reap(), not by get().
+#
+# A session with a request still running (is_busy) is neither evicted nor reaped: it counts as
+# used now.  The store may then hold more than max_sessions until those requests finish.
+#
+
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Optional
+
+from checkr_agents import logger
+
+# defaults
+MAX_SESSIONS = 1000
+SESSION_TTL = 3600.0     # seconds of idleness before a session expires
+REAP_INTERVAL = 60.0     # seconds between runs of the background reaper
+
+
+class SessionStore:
+
+    def __init__(self, max_sessions: int = MAX_SESSIONS, idle_ttl: Optional[float] = SESSION_TTL,
+                 is_busy: Optional[Callable[[Any], bool]] = None):
+        """
+        Args:
+          max_sessions: the maximum number of live sessions
+          idle_ttl: seconds a session may be idle before it expires (None: never)
+          is_busy: true for a manager with a request still running (None: never busy)
+        """
+
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self.is_busy = is_busy
+
+        # session_id -> [last_used, manager] in least-recently-used order
+        self._sessions: OrderedDict[str, list] = OrderedDict()
+
+        # counters
+        self.created = 0
+        self.evicted = 0
+        self.expired = 0
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def __contains__(self, session_id: str):
+        entry = self._sessions.get(session_id, None)
+        return entry is not None and not self._is_expired(entry, time.monotonic())
+
+    def _is_expired(self, entry: list, now: float) -> bool:
+        return self.idle_ttl is not None and now - entry[0] > self.idle_ttl
+
+    # a busy session at the front is marked as used now; returns True if it was
+    def _renew_if_busy(self, session_id: str, entry: list, now: float) -> bool:
+        if self.is_busy is None or not self.is_busy(entry[1]):
+            return False
+        entry[0] = now
+        self._sessions.move_to_end(session_id)
+        return True
+
+    def get(self, session_id: str) -> Optional[Any]:
+        """Return the manager of a live session and mark it as recently used."""
+
+        entry = self._sessions.get(session_id, None)
+        if entry is None:
+            return None
+
+        now = time.monotonic()
+        if self._is_expired(entry, now):
+            return None
+
+        entry[0] = now
+        self._sessions.move_to_end(session_id)
+        return entry[1]
+
+    def put(self, session_id: str, manager: Any) -> list:
+        """
+        Add a session, evicting the least recently used ones if the store is full.
+        Returns the managers removed: expired, evicted, or replaced by this one.
+        """
+
+        removed = self.reap()
+
+        replaced = self._sessions.pop(session_id, None)
+        if replaced is not None and replaced[1] is not manager:
+            removed.append(replaced[1])
+
+        now = time.monotonic()
+        candidates = len(self._sessions)
+        while len(self._sessions) >= self.max_sessions and candidates > 0:
+            candidates -= 1
+            evicted_id, entry = next(iter(self._sessions.items()))
+            if self._renew_if_busy(evicted_id, entry, now):
+                continue
+            del self._sessions[evicted_id]
+            removed.append(entry[1])
+            self.evicted += 1
+            logger.debug(f"SessionStore: evicted session_id: {evicted_id}")
+
+        self._sessions[session_id] = [now, manager]
+        self.created += 1
+        return removed
+
+    def remove(self, session_id: str) -> Optional[Any]:
+        entry = self._sessions.pop(session_id, None)
+        return entry[1] if entry is not None else None
+
+    def reap(self) -> list:
+        """Remove expired sessions and return their managers."""
+
+        if self.idle_ttl is None:
+            return [ ]
+
+        now = time.monotonic()
+        removed = [ ]
+        candidates = len(self._sessions)
+        while candidates > 0:
+            candidates -= 1
+            session_id, entry = next(iter(self._sessions.items()))
+            if not self._is_expired(entry, now):
+                break
+            if self._renew_if_busy(session_id, entry, now):
+                continue
+            del self._sessions[session_id]
+            removed.append(entry[1])
+
+        self.expired += len(removed)
+        return removed
+
+    def clear(self) -> list:
+        """Remove all sessions and return their managers."""
+
+        removed = [entry[1] for entry in self._sessions.values()]
+        self._sessions.clear()
+        return removed
+
+    def metrics(self) -> dict:
+        return {
+            "live": len(self._sessions),
+            "created": self.created,
+            "evicted": self.evicted,
+            "expired": self.expired,
+            "max_sessions": self.max_sessions,
+            "idle_ttl": self.idle_ttl,
+        }
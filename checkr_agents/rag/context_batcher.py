@@ -0,0 +1,97 @@
+#
+# A micro-batcher for RAG lookups.
+#
+# When many sessions ask questions at once, each would make its own embedding request and its
+# own Milvus search.  The ContextBatcher holds each lookup for a few milliseconds, collects the
+# lookups that arrive in that window and retrieves them all with one batched call to the
+# MilvusContextGenerator.  A batch is sent early once it reaches max_batch queries.
+#
+
+import asyncio
+from typing import Any
+
+from checkr_agents import logger
+
+# defaults
+BATCH_WINDOW = 0.005   # seconds
+MAX_BATCH = 32
+
+
+class ContextBatcher:
+
+    def __init__(self, mcg: Any, window: float = BATCH_WINDOW, max_batch: int = MAX_BATCH):
+        """
+        Args:
+          mcg: the MilvusContextGenerator that performs the batched retrieval
+          window: seconds to wait for more lookups after the first one of a batch
+          max_batch: send the batch as soon as it has this many lookups
+        """
+
+        self.mcg = mcg
+        self.window = window
+        self.max_batch = max_batch
+
+        # (query, top_k, future) waiting for the next batch
+        self.pending: list[tuple[str, int, asyncio.Future]] = [ ]
+        self.timer = None
+
+        # keep references to running batches
+        self.tasks = set()
+
+        # counters
+        self.batches = 0
+        self.queries = 0
+
+    async def retrieve(self, query: str, top_k: int = 3) -> list[str]:
+        """Retrieve the context chunks of one query as part of a batch."""
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self.pending.append((query, top_k, future))
+
+        if len(self.pending) >= self.max_batch:
+            self._flush()
+        elif self.timer is None:
+            self.timer = loop.call_later(self.window, self._flush)
+
+        return await future
+
+    def _flush(self):
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+
+        batch, self.pending = self.pending, [ ]
+        if not batch:
+            return
+
+        task = asyncio.get_running_loop().create_task(self._run(batch))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    async def _run(self, batch: list[tuple[str, int, asyncio.Future]]):
+        self.batches += 1
+        self.queries += len(batch)
+
+        # search for the largest top_k of the batch and give each lookup its own share
+        top_k = max(k for (_, k, _) in batch)
+
+        try:
+            results = await self.mcg.aretrieve_context_batch([q for (q, _, _) in batch], top_k)
+        except Exception as e:
+            logger.error(f"ContextBatcher: batch of {len(batch)} failed: {e}")
+            for (_, _, future) in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, k, future), chunks in zip(batch, results):
+            if not future.done():
+                future.set_result(chunks[:k])
+
+    def metrics(self) -> dict:
+        return {
+            "batches": self.batches,
+            "queries": self.queries,
+            "mean_batch_size": self.queries / self.batches if self.batches else 0.0,
+        }
@@ -0,0 +1,71 @@
+#
+# A process-wide pool of MilvusContextGenerators.
+#
+# Every RAG session needs a context generator, but opening a milvus-lite database per session is
+# slow and multiplies file handles and memory.  Sessions instead acquire a shared generator keyed
+# by (uri, collection, embedding model).  The pool counts references; generators stay open while
+# unreferenced so the next session starts warm, and are closed when the pool is closed (from the
+# server lifespan).
+#
+# Sharing the generator also shares its embedding cache and its batcher across sessions.
+#
+
+from checkr_agents import logger
+
+from .milvus_context_generator import MilvusContextGenerator
+
+
+class ContextGeneratorPool:
+
+    def __init__(self):
+        # key -> [generator, refcount]
+        self.entries: dict[tuple[str, str, str], list] = { }
+
+    def key(self, uri: str, collection: str, embedding_model: str) -> tuple[str, str, str]:
+        return (uri, collection, embedding_model)
+
+    def acquire(self, uri: str, embedding_model: str, dim: int, collection: str) -> MilvusContextGenerator:
+        """Return the shared generator for the database, creating it if needed."""
+
+        key = self.key(uri, collection, embedding_model)
+        entry = self.entries.get(key, None)
+
+        if entry is None:
+            logger.info(f"ContextGeneratorPool: creating generator for {key}")
+            entry = [MilvusContextGenerator(uri, embedding_model, dim, collection), 0]
+            self.entries[key] = entry
+
+        entry[1] += 1
+        return entry[0]
+
+    def release(self, uri: str, embedding_model: str, collection: str):
+        entry = self.entries.get(self.key(uri, collection, embedding_model), None)
+        if entry is not None and entry[1] > 0:
+            entry[1] -= 1
+
+    def refcount(self, uri: str, embedding_model: str, collection: str) -> int:
+        entry = self.entries.get(self.key(uri, collection, embedding_model), None)
+        return entry[1] if entry is not None else 0
+
+    def close(self):
+        for key, (generator, refcount) in self.entries.items():
+            logger.info(f"ContextGeneratorPool: closing {key} with {refcount} references")
+            generator.close()
+        self.entries.clear()
+
+    async def aclose(self):
+        self.close()
+
+    def metrics(self) -> dict:
+        return {
+            f"{collection}@{uri}": {
+                "refcount": refcount,
+                "embedding_cache": generator.embedding_cache.metrics(),
+                "batcher": generator.batcher.metrics(),
+            }
+            for (uri, collection, model), (generator, refcount) in self.entries.items()
+        }
+
+
+# the pool shared by every agent in this process
+CONTEXT_GENERATORS = ContextGeneratorPool()
@@ -0,0 +1,84 @@
+#
+# An LRU cache of query embeddings with a time-to-live.
+#
+# Queries are normalized before lookup (case, whitespace and surrounding punctuation) so that
+# near-duplicate questions such as "What is RTP-MIDI?" and "what is rtp-midi" share an entry.
+#
+
+import re
+import time
+from collections import OrderedDict
+from typing import Optional
+
+# defaults
+CACHE_SIZE = 1024
+CACHE_TTL = 3600.0   # seconds
+
+_WHITESPACE = re.compile(r"\s+")
+_PUNCTUATION = " \t\n.,;:!?\"'"
+
+
+def normalize_query(query: str) -> str:
+    return _WHITESPACE.sub(" ", query.casefold()).strip(_PUNCTUATION)
+
+
+class EmbeddingCache:
+
+    def __init__(self, maxsize: int = CACHE_SIZE, ttl: Optional[float] = CACHE_TTL):
+        """
+        Args:
+          maxsize: the maximum number of embeddings kept
+          ttl: seconds an embedding stays valid (None: forever)
+        """
+
+        self.maxsize = maxsize
+        self.ttl = ttl
+
+        # (model, normalized query) -> (stored_at, vector)
+        self._entries: OrderedDict[tuple[str, str], tuple[float, list[float]]] = OrderedDict()
+
+        # counters
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def key(self, model: str, query: str) -> tuple[str, str]:
+        return (model, normalize_query(query))
+
+    def get(self, model: str, query: str) -> Optional[list[float]]:
+        key = self.key(model, query)
+        entry = self._entries.get(key, None)
+
+        if entry is not None and self.ttl is not None and time.monotonic() - entry[0] > self.ttl:
+            del self._entries[key]
+            entry = None
+
+        if entry is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self._entries.move_to_end(key)
+        return entry[1]
+
+    def put(self, model: str, query: str, vector: list[float]):
+        key = self.key(model, query)
+        self._entries[key] = (time.monotonic(), vector)
+        self._entries.move_to_end(key)
+
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+
+    def metrics(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
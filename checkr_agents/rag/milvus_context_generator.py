@@ -6,9 +6,15 @@
 
 import os
 import json
-from litellm import embedding, completion
+import asyncio
+import threading
+from typing import Optional
+from litellm import embedding, aembedding, completion
 from pymilvus import MilvusClient
 
+from .embedding_cache import EmbeddingCache
+from .context_batcher import ContextBatcher
+
 # Configure Logging for LiteLLM
 import litellm
 # litellm._turn_on_debug()
@@ -20,13 +26,15 @@ load_dotenv()
 
 class MilvusContextGenerator:
 
-    def __init__(self, uri: str, embedding_model: str, dim: int, collection: str):
+    def __init__(self, uri: str, embedding_model: str, dim: int, collection: str,
+                 embedding_cache: Optional[EmbeddingCache] = None):
         """
         Args:
           uri: the uri of the milvus database
           embedding_model: the embedding model
           dim: the embedding dimension
           collection: the milvus collection name
+          embedding_cache: cache of query embeddings (default: a new EmbeddingCache)
         """
 
         self.uri = uri
@@ -34,64 +42,169 @@ class MilvusContextGenerator:
         self.dim = dim
         self.collection = collection
 
-        # Initialize milvus client
-        self.milvus_client = MilvusClient(uri=self.uri)
-
-        # For Debugging - observe that the collection is found
-        # print(f"MC:{self.milvus_client.describe_collection(collection_name='pages')}")
-
+        # repeated queries skip the embedding model
+        self.embedding_cache = embedding_cache if embedding_cache is not None else EmbeddingCache()
+
+        # coalesces concurrent lookups into batched calls
+        self.batcher = ContextBatcher(self)
+
+        # the milvus client is opened on first use (searches run in threads, hence the lock)
+        self._milvus_client = None
+        self._milvus_lock = threading.Lock()
+
+    @property
+    def milvus_client(self) -> MilvusClient:
+        with self._milvus_lock:
+            if self._milvus_client is None:
+                # Initialize milvus client
+                self._milvus_client = MilvusClient(uri=self.uri)
+
+                # For Debugging - observe that the collection is found
+                # print(f"MC:{self._milvus_client.describe_collection(collection_name='pages')}")
+
+            return self._milvus_client
+
+    def close(self):
+        with self._milvus_lock:
+            if self._milvus_client is not None:
+                self._milvus_client.close()
+                self._milvus_client = None
+
+    #
+    # Embedding queries, with the cache in front of the embedding model.  The queries that
+    # miss the cache are embedded together in one request (each distinct query once).
+    #
+
+    def _plan_embedding(self, queries: list[str]):
+        vectors = [self.embedding_cache.get(self.embedding_model, q) for q in queries]
+
+        # cache key -> indices of the queries that need it
+        missing: dict[tuple[str, str], list[int]] = { }
+        for i, vector in enumerate(vectors):
+            if vector is None:
+                missing.setdefault(self.embedding_cache.key(self.embedding_model, queries[i]), [ ]).append(i)
+
+        return vectors, list(missing.values())
+
+    def _fill_embedding(self, queries: list[str], vectors: list, missing: list[list[int]], embed_response):
+        for indices, item in zip(missing, embed_response.data):
+            vector = item['embedding']
+            self.embedding_cache.put(self.embedding_model, queries[indices[0]], vector)
+            for i in indices:
+                vectors[i] = vector
+        return vectors
+
+    def embed_queries(self, queries: list[str]) -> list[list[float]]:
+        vectors, missing = self._plan_embedding(queries)
+        if missing:
+            embed_response = embedding(
+                model=self.embedding_model,
+                input=[ queries[indices[0]] for indices in missing ],
+            )
+            self._fill_embedding(queries, vectors, missing, embed_response)
+        return vectors
+
+    async def aembed_queries(self, queries: list[str]) -> list[list[float]]:
+        vectors, missing = self._plan_embedding(queries)
+        if missing:
+            embed_response = await aembedding(
+                model=self.embedding_model,
+                input=[ queries[indices[0]] for indices in missing ],
+            )
+            self._fill_embedding(queries, vectors, missing, embed_response)
+        return vectors
+
+    def embed_query(self, query: str) -> list[float]:
+        return self.embed_queries([ query ])[0]
+
+    async def aembed_query(self, query: str) -> list[float]:
+        return (await self.aembed_queries([ query ]))[0]
+
+    #
+    # Searching Milvus
+    #
+    # The milvus vector database was created by llama_index MilvusVectorStore.  We need
+    # to understand how it inserted the data so we can get out the documents, and
+    # the field to search on (anns_field).
+    #
+    # Key Points (from Claude)
+    # - The default collection name is "llamalection" in older versions or
+    # "llamacollection" in newer versions LlamaIndex
+    # - The default similarity metric is "IP" (Inner Product) LlamaIndex
+    # - LlamaIndex stores additional metadata fields that you can include in
+    # output_fields like _node_content, _node_type, and any custom metadata you added
+    #
+    # You can inspect your collection's schema first using
+    # client.describe_collection(collection_name="your_collection") to see all available fields.
+    #
+
+    def search_batch(self, query_vectors: list[list[float]], top_k: int = 3) -> list[list[str]]:
+
+        # one search request for all of the vectors
+        search_results = self.milvus_client.search(
+            collection_name=self.collection,
+            data=query_vectors,
+            limit=top_k,
+            anns_field="embedding", # the vector field name (LlamaIndex default)
+            output_fields=["text", "doc_id", "_node_content"],
+            search_params={"metric_type": "IP", "params":{}}
+        )
 
+        # Extract and return the text chunks of each query
+        results = [ ]
+        for hits in search_results:
+            context_chunks = []
+            for hit in hits:
+                # The node_content from llama_index is a json structure stored as a string
+                #   Note: there are other interesting attributes and metadata in the node_content.
+                node_content = json.loads(hit["entity"]["_node_content"])
+                context_chunks.append(node_content["text"])
+            results.append(context_chunks)
+        
+        return results
 
+    def search(self, query_vector: list[float], top_k: int = 3) -> list[str]:
+        return self.search_batch([ query_vector ], top_k)[0]
 
     def retrieve_context_from_milvus(self, query: str, top_k: int = 3) -> list[str]:
         """
-        1. Embeds the query using LiteLLM.
+        1. Embeds the query using LiteLLM (or finds it in the cache).
         2. Searches Milvus for the top_k relevant documents.
         3. Returns the text of the relevant documents.
         """
 
-        # 1. Embed the query using LiteLLM
-        embed_response = embedding(
-            model=self.embedding_model,
-            input=[ query ],
-        )
+        query_vector = self.embed_query(query)
+        return self.search(query_vector, top_k)
 
-        query_vector = embed_response.data[0]['embedding']
-
-        # 2. Search Milvus
-        #
-        # The milvus vector database was created by llama_index MilvusVectorStore.  We need
-        # to understand how it inserted the data so we can get out the documents, and
-        # the field to search on (anns_field).
-        #
-        # Key Points (from Claude)
-        # - The default collection name is "llamalection" in older versions or
-        # "llamacollection" in newer versions LlamaIndex
-        # - The default similarity metric is "IP" (Inner Product) LlamaIndex
-        # - LlamaIndex stores additional metadata fields that you can include in
-        # output_fields like _node_content, _node_type, and any custom metadata you added
-        #
-        # You can inspect your collection's schema first using
-        # client.describe_collection(collection_name="your_collection") to see all available fields.
+    def retrieve_context_batch(self, queries: list[str], top_k: int = 3) -> list[list[str]]:
+        """
+        Retrieve the context of many queries with one embedding request and one Milvus search.
+        Returns the list of text chunks of each query, in order.
+        """
 
-        search_results = self.milvus_client.search(
-            collection_name=self.collection,
-            data=[query_vector],
-            limit=top_k,
-            anns_field="embedding", # the vector field name (LlamaIndex default)
-            output_fields=["text", "doc_id", "_node_content"],
-            search_params={"metric_type": "IP", "params":{}}
-        )
+        if not queries:
+            return [ ]
 
-        # 3. Extract and return the text chunks
-        context_chunks = []
-        for hit in search_results[0]:
-            # The node_content from llama_index is a json structure stored as a string
-            #   Note: there are other interesting attributes and metadata in the node_content.
-            node_content = json.loads(hit["entity"]["_node_content"])
-            context_chunks.append(node_content["text"])
-        
-        return context_chunks
+        query_vectors = self.embed_queries(queries)
+        return self.search_batch(query_vectors, top_k)
+
+    async def aretrieve_context_batch(self, queries: list[str], top_k: int = 3) -> list[list[str]]:
+        """The same as retrieve_context_batch() without blocking the event loop."""
+
+        if not queries:
+            return [ ]
+
+        query_vectors = await self.aembed_queries(queries)
+        return await asyncio.to_thread(self.search_batch, query_vectors, top_k)
+
+    async def aretrieve_context_from_milvus(self, query: str, top_k: int = 3) -> list[str]:
+        """
+        The same as retrieve_context_from_milvus() without blocking the event loop: the
+        embedding is awaited and the (synchronous) Milvus search runs in a thread.
+        """
+
+        query_vector = await self.aembed_query(query)
+        return await asyncio.to_thread(self.search, query_vector, top_k)
 
 #
 # Standalone simple test program
@@ -114,3 +227,7 @@ if __name__ == '__main__':
 
     res = mcg.retrieve_context_from_milvus("What is RTP-MIDI?")
     print(f"RES:{res}")
+
+    # the second (near-duplicate) query is answered from the embedding cache
+    res = asyncio.run(mcg.aretrieve_context_from_milvus("what is rtp-midi"))
+    print(f"CACHE:{mcg.embedding_cache.metrics()}")
@@ -5,13 +5,10 @@
 import os
 import argparse
 
-from nlip_sdk.nlip import NLIP_Message
-from nlip_sdk.nlip import NLIP_Factory
-
 from checkr_agents.agents.checkr_agent import CheckrAgent
 
 from checkr_agents.http_server.nlip_session_server import NlipSessionServer
-from checkr_agents.http_server.nlip_session_server import SessionManager
+from checkr_agents.http_server.nlip_session_server import AgentSessionManager
 
 from checkr_agents import logger
 import uvicorn
@@ -21,7 +18,7 @@ import uvicorn
 # Define a session manager that launches a new CheckrAgent for each session
 #
 
-class BasicManager(SessionManager):
+class BasicManager(AgentSessionManager):
 
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
@@ -30,22 +27,6 @@ class BasicManager(SessionManager):
             "CheckrAgent"
         )
 
-    async def process_nlip(self, msg: NLIP_Message) -> NLIP_Message:
-
-        # concatenate all of the "text" parts
-        text = msg.extract_text(language=None)
-
-        try:
-            results = await self.myAgent.process_query(text)
-            logger.info(f"BasicServerResults: {results}")
-            msg = NLIP_Factory.create_text(results[0])
-            for res in results[1:]:
-               msg.add_text(res)
-            return msg
-        except Exception as e:
-            logger.error(f"Exception: {e}")
-            error_message = f"Exception: {e}"
-            return NLIP_Factory.create_text(error_message)
         
         
 #
@@ -6,13 +6,12 @@ import os
 import argparse
 import logging
 
-from nlip_sdk.nlip import NLIP_Message
-from nlip_sdk.nlip import NLIP_Factory
-
 from checkr_agents.agents.coordinator_nlip_agent import CoordinatorNlipAgent
+from checkr_agents.agents.capability_registry import CAPABILITIES
+from checkr_agents.http_client.nlip_client_pool import NLIP_CLIENTS
 
 from checkr_agents.http_server.nlip_session_server import NlipSessionServer
-from checkr_agents.http_server.nlip_session_server import SessionManager
+from checkr_agents.http_server.nlip_session_server import AgentSessionManager
 
 from checkr_agents import logger, log_to_console
 import uvicorn
@@ -22,7 +21,7 @@ import uvicorn
 # Define a session manager that launches a new BasicAgent for each session
 #
 
-class NlipManager(SessionManager):
+class NlipManager(AgentSessionManager):
 
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
@@ -31,22 +30,6 @@ class NlipManager(SessionManager):
             "Margaret"
         )
 
-    async def process_nlip(self, msg: NLIP_Message) -> NLIP_Message:
-
-        # concatenate all of the "text" parts
-        text = msg.extract_text(language=None)
-
-        try:
-            results = await self.myAgent.process_query(text)
-            logger.info(f"CoordinatorServerResults: {results}")
-            msg = NLIP_Factory.create_text(results[0])
-            for res in results[1:]:
-               msg.add_text(res)
-            return msg
-        except Exception as e:
-            logger.error(f"Exception: {e}")
-            error_message = f"Exception: {e}"
-            return NLIP_Factory.create_text(error_message)
         
         
 #
@@ -55,6 +38,12 @@ class NlipManager(SessionManager):
 
 app = NlipSessionServer("NlipCoordinatorCookie", NlipManager)
 
+# the connections to remote agents are shared by the apps of the process, and closed when the
+# last of them shuts down
+app.add_shared_shutdown_callback(NLIP_CLIENTS.aclose)
+app.add_metrics("nlip_clients", NLIP_CLIENTS.metrics)
+app.add_metrics("capabilities", CAPABILITIES.metrics)
+
 
 if __name__ == "__main__":
 
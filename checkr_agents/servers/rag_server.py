@@ -6,13 +6,11 @@ import os
 import argparse
 import logging
 
-from nlip_sdk.nlip import NLIP_Message
-from nlip_sdk.nlip import NLIP_Factory
-
 from checkr_agents.agents.rag_nlip_agent import RagNlipAgent
+from checkr_agents.rag.context_generator_pool import CONTEXT_GENERATORS
 
 from checkr_agents.http_server.nlip_session_server import NlipSessionServer
-from checkr_agents.http_server.nlip_session_server import SessionManager
+from checkr_agents.http_server.nlip_session_server import AgentSessionManager
 
 from checkr_agents import logger
 from checkr_agents import log_to_console
@@ -23,7 +21,7 @@ import uvicorn
 # Define a session manager that launches a new RagAgent for each session
 #
 
-class RagManager(SessionManager):
+class RagManager(AgentSessionManager):
 
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
@@ -32,22 +30,6 @@ class RagManager(SessionManager):
             "McLarenLabs"
         )
 
-    async def process_nlip(self, msg: NLIP_Message) -> NLIP_Message:
-
-        # concatenate all of the "text" parts
-        text = msg.extract_text(language=None)
-
-        try:
-            results = await self.myAgent.process_query(text)
-            logger.info(f"RagServerResults : {results}")
-            msg = NLIP_Factory.create_text(results[0])
-            for res in results[1:]:
-               msg.add_text(res)
-            return msg
-        except Exception as e:
-            logger.error(f"Exception: {e}")
-            error_message = f"Exception: {e}"
-            return NLIP_Factory.create_text(error_message)
         
 #
 # Now configure the server
@@ -56,6 +38,13 @@ class RagManager(SessionManager):
 # app = server.app
 app = NlipSessionServer("RagCookie", RagManager)
 
+# the Milvus databases are shared by the apps of the process, and closed when the last of them
+# shuts down
+app.add_shared_shutdown_callback(CONTEXT_GENERATORS.aclose)
+
+# the references, embedding cache and batching of each shared context generator
+app.add_metrics("context_generators", CONTEXT_GENERATORS.metrics)
+
 if __name__ == "__main__":
 
     parser = argparse.ArgumentParser("Run the RagServer on a specified port (default 8022)")
@@ -6,13 +6,14 @@ import os
 import argparse
 import logging
 
-from nlip_sdk.nlip import NLIP_Message
-from nlip_sdk.nlip import NLIP_Factory
-
 from checkr_agents.agents.weather_nlip_agent import WeatherNlipAgent
+from checkr_agents.agents.nws_grid_index import GRID_INDEX
 
+from checkr_agents.http_client.http_client_pool import HTTP_CLIENTS
+from checkr_agents.http_client.response_cache import RESPONSE_CACHE
+from checkr_agents.agents.single_flight import TOOL_CALLS
 from checkr_agents.http_server.nlip_session_server import NlipSessionServer
-from checkr_agents.http_server.nlip_session_server import SessionManager
+from checkr_agents.http_server.nlip_session_server import AgentSessionManager
 
 from checkr_agents import logger
 from checkr_agents import log_to_console
@@ -23,7 +24,7 @@ import uvicorn
 # Define a session manager that launches a new BasicAgent for each session
 #
 
-class WeatherManager(SessionManager):
+class WeatherManager(AgentSessionManager):
 
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
@@ -32,22 +33,6 @@ class WeatherManager(SessionManager):
             "Weather"
         )
 
-    async def process_nlip(self, msg: NLIP_Message) -> NLIP_Message:
-
-        # concatenate all of the "text" parts
-        text = msg.extract_text(language=None)
-
-        try:
-            results = await self.myAgent.process_query(text)
-            logger.info(f"WeatherServerResults : {results}")
-            msg = NLIP_Factory.create_text(results[0])
-            for res in results[1:]:
-               msg.add_text(res)
-            return msg
-        except Exception as e:
-            logger.error(f"Exception: {e}")
-            error_message = f"Exception: {e}"
-            return NLIP_Factory.create_text(error_message)
         
         
 #
@@ -57,6 +42,16 @@ class WeatherManager(SessionManager):
 # app = server.app
 app = NlipSessionServer("WeatherCookie", WeatherManager)
 
+# the pooled HTTP connections and the response cache of the tools are shared by the apps of the
+# process, and closed when the last of them shuts down
+app.add_shared_shutdown_callback(HTTP_CLIENTS.aclose)
+app.add_shared_shutdown_callback(RESPONSE_CACHE.aclose)
+
+app.add_metrics("http_clients", HTTP_CLIENTS.metrics)
+app.add_metrics("response_cache", RESPONSE_CACHE.metrics)
+app.add_metrics("tool_calls", TOOL_CALLS.metrics)
+app.add_metrics("nws_grid_index", GRID_INDEX.metrics)
+
 if __name__ == "__main__":
 
     parser = argparse.ArgumentParser("Run the WeatherServer on a specified port (default 8022)")
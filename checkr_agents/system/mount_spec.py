@@ -10,6 +10,11 @@
 #
 # The second two are local to the host computer.
 #
+# A unix:// or http:// app can also be run in worker processes of its own, supervised by this
+# process, by adding options to its entry (see worker_pool.py):
+#
+#    (app, "unix://name/...", {"processes": 2})
+#
 # The strings of the mount spec will also be understandable to Agent client applications, like Mach2.  It
 # will be possible to "connect to unix://foo" in an Agent conversation.
 #
@@ -25,6 +30,7 @@ from urllib.parse import urlparse
 import logging
 
 from checkr_agents import MEM_APP_TBL # global table of in-memory registered apps
+from .worker_pool import WorkerPool
 
 logger = logging.getLogger('checkr.mount_spec')
 
@@ -44,6 +50,11 @@ class MountSpec:
         logger.info(f"MountSpec: CREATE_WEBSERVER:{spec}")
         app = spec[0]
         u = urlparse(spec[1])
+        options = spec[2] if len(spec) > 2 else { }
+
+        if options.get("processes"):
+            pool = WorkerPool(app, spec[1], self.unix_path, **options)
+            return await pool.supervise()
 
         logger.debug(f"MountSpec: SCHEME:{u.scheme}")
 
@@ -65,6 +76,10 @@ class MountSpec:
 
         elif u.scheme == "mem":
             MEM_APP_TBL[u.hostname] = app # the in-memory app table
+
+            # there is no lifespan for a mem:// app: start its background tasks here
+            if hasattr(app, "startup"):
+                await app.startup()
             return None
 
         else:
@@ -94,6 +109,7 @@ class MountSpec:
             done, pending = await asyncio.wait(servers, return_when=asyncio.FIRST_COMPLETED)
         except asyncio.CancelledError:
             logger.debug(f"MountSpec: ASYNCIO.WAIT was cancelled")
+            done, pending = set(), set(servers)
 
         #
         # ToDo: ^C shuts everything down, and the pending tasks receive asyncio.exception.CancelledError,
@@ -113,4 +129,12 @@ class MountSpec:
         for pending_task in pending:
             pending_task.cancel("Another service died, server is shutting down")
 
+        # let the worker pools stop their processes
+        await asyncio.gather(*pending, return_exceptions=True)
+
+        # and shut down the mem:// apps, which have no lifespan
+        for spec in self.mount_spec:
+            if spec[1].startswith("mem:") and hasattr(spec[0], "shutdown"):
+                await spec[0].shutdown()
+
         
@@ -0,0 +1,242 @@
+#
+# A Worker Pool runs one app of a Mount Specification in separate worker processes.
+#
+# All of the apps of a MountSpec normally share one asyncio loop in one process, so a CPU-heavy
+# agent slows down the others and the whole system is limited to one core.  An app mounted with
+# a process option runs in its own processes instead:
+#
+#    (rag,   "unix://rag/",            {"processes": 1})
+#    (weath, "http://0.0.0.0:8022/",   {"processes": 4, "session_backend": "sqlite:///tmp/weather.db"})
+#
+# The parent binds the socket of the address (the unix socket /tmp/agent-{name}.sock or the TCP
+# port) and the workers all accept on it, so clients use the same unix:// and http:// URLs as
+# before.  The parent supervises the workers:
+#
+#   - a worker that crashes (exits with an error) is restarted, unless it crashes too often
+#   - a worker that exits cleanly is not restarted; the pool ends when all have exited
+#   - when the pool is cancelled (^C, or another server of the MountSpec died) the workers are
+#     asked to shut down gracefully (SIGTERM), and are killed if they do not in time
+#
+# Workers are started with the "spawn" method and import the app by its "module:attribute" name.
+# An app object is accepted if it is a module global of an importable module.
+#
+# Sessions live in the memory of a worker.  With more than one worker, give the pool a session
+# backend so that any worker can serve any session.
+#
+# Checkr assertions loaded in the parent do not see the events of the workers.
+#
+
+import asyncio
+import contextlib
+import logging
+import multiprocessing
+import os
+import socket
+import sys
+import time
+from typing import Any, Optional
+from urllib.parse import urlparse
+
+import uvicorn
+
+from checkr_agents.http_server.session_backend import SESSION_BACKEND_ENV
+
+logger = logging.getLogger('checkr.worker_pool')
+
+# defaults
+SUPERVISE_INTERVAL = 0.5     # seconds between checks of the workers
+RESTART_DELAY = 1.0          # seconds before a crashed worker is restarted
+MAX_RESTARTS = 5             # give up on a pool whose workers crash this often ...
+RESTART_WINDOW = 60.0        # ... within this many seconds
+SHUTDOWN_TIMEOUT = 10.0      # seconds a worker has to shut down gracefully
+BACKLOG = 2048
+
+
+#
+# The "module:attribute" name of an app, for importing it in a worker
+#
+
+def app_import_string(app: Any) -> str:
+    if isinstance(app, str):
+        return app
+
+    for name, module in list(sys.modules.items()):
+        if name == "__main__" or module is None:
+            continue
+        for attr, value in list(vars(module).items()):
+            if value is app:
+                return f"{name}:{attr}"
+
+    raise Exception(f"WorkerPool: {app} is not a global of an importable module; give it as 'module:attribute'")
+
+
+#
+# Bind the listening socket of an address in the parent
+#
+
+def bind_socket(url: str, unix_path) -> socket.socket:
+    u = urlparse(url)
+
+    if u.scheme == "unix":
+        path = unix_path(u.hostname)
+        if os.path.exists(path):
+            os.remove(path)
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.bind(path)
+        os.chmod(path, 0o666)
+
+    elif u.scheme == "http":
+        if u.port == None:
+            raise Exception(f"Port must be specified in:{u}")
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind((u.hostname or "0.0.0.0", int(u.port)))
+
+    else:
+        raise Exception(f"WorkerPool: cannot run {u.scheme}:// apps in worker processes")
+
+    sock.listen(BACKLOG)
+    sock.set_inheritable(True)
+    return sock
+
+
+#
+# Set environment variables in this process for the duration of the block.  A spawned worker
+# inherits the environment it is started with, before it imports anything - the app modules
+# read their options (the session backend, ...) from the environment when they are imported.
+#
+
+@contextlib.contextmanager
+def environment(env: dict):
+    saved = {name: os.environ.get(name, None) for name in env}
+    os.environ.update(env)
+    try:
+        yield
+    finally:
+        for name, value in saved.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+
+
+#
+# The body of a worker process
+#
+
+def run_worker(app: str, sock: socket.socket, log_level: str):
+    config = uvicorn.Config(app, log_level=log_level)
+    server = uvicorn.Server(config)
+    server.run(sockets=[sock])
+
+
+class WorkerPool:
+
+    def __init__(self, app: Any, url: str, unix_path,
+                 processes: int = 1,
+                 session_backend: Optional[str] = None,
+                 log_level: str = "info"):
+        """
+        Args:
+          app: the app, or its "module:attribute" name
+          url: the unix:// or http:// address of the app
+          unix_path: maps a unix:// name to its socket path
+          processes: the number of worker processes
+          session_backend: the session backend URL of the workers (see CHECKR_SESSION_BACKEND)
+          log_level: the uvicorn log level of the workers
+        """
+
+        self.app = app_import_string(app)
+        self.url = url
+        self.unix_path = unix_path
+        self.processes = processes
+        self.log_level = log_level
+
+        self.env = { }
+        if session_backend:
+            self.env[SESSION_BACKEND_ENV] = session_backend
+
+        if processes > 1 and not (session_backend or os.environ.get(SESSION_BACKEND_ENV)):
+            logger.warning(f"WorkerPool: {url} has {processes} workers but no session backend; sessions will not follow their cookie across workers")
+
+        self.context = multiprocessing.get_context("spawn")
+        self.sock: Optional[socket.socket] = None
+        self.workers: list = [ ]
+        self.restarts: list[float] = [ ]
+
+    def start_worker(self):
+        worker = self.context.Process(
+            target=run_worker,
+            args=(self.app, self.sock, self.log_level),
+            name=f"worker-{self.url}",
+            daemon=False,
+        )
+        with environment(self.env):
+            worker.start()
+        logger.info(f"WorkerPool: started {worker.name} pid {worker.pid}")
+        return worker
+
+    #
+    # Run the pool: start the workers and restart those that crash.  Returns when all workers have
+    # exited cleanly; raises when they crash too often.  Cancelling it shuts the workers down.
+    #
+
+    async def supervise(self):
+        self.sock = bind_socket(self.url, self.unix_path)
+        logger.info(f"WorkerPool: {self.app} at {self.url} with {self.processes} processes")
+
+        try:
+            self.workers = [self.start_worker() for _ in range(self.processes)]
+
+            while self.workers:
+                await asyncio.sleep(SUPERVISE_INTERVAL)
+
+                for worker in list(self.workers):
+                    if worker.is_alive():
+                        continue
+
+                    worker.join()
+                    if worker.exitcode == 0:
+                        logger.info(f"WorkerPool: {worker.name} pid {worker.pid} exited")
+                        self.workers.remove(worker)
+                        continue
+
+                    logger.error(f"WorkerPool: {worker.name} pid {worker.pid} crashed with exit code {worker.exitcode}")
+
+                    now = time.monotonic()
+                    self.restarts = [t for t in self.restarts if now - t < RESTART_WINDOW] + [now]
+                    if len(self.restarts) > MAX_RESTARTS:
+                        raise Exception(f"WorkerPool: workers of {self.url} crashed {len(self.restarts)} times in {RESTART_WINDOW} seconds")
+
+                    await asyncio.sleep(RESTART_DELAY)
+                    self.workers[self.workers.index(worker)] = self.start_worker()
+
+        finally:
+            await self.stop()
+
+    async def stop(self):
+        workers = self.workers
+        self.workers = [ ]
+
+        for worker in workers:
+            if worker.is_alive():
+                worker.terminate()    # SIGTERM: uvicorn shuts down gracefully
+
+        def join_all():
+            deadline = time.monotonic() + SHUTDOWN_TIMEOUT
+            for worker in workers:
+                worker.join(max(0.0, deadline - time.monotonic()))
+                if worker.is_alive():
+                    logger.warning(f"WorkerPool: killing {worker.name} pid {worker.pid}")
+                    worker.kill()
+                    worker.join()
+
+        try:
+            await asyncio.to_thread(join_all)
+        finally:
+            if self.sock is not None:
+                self.sock.close()
+                self.sock = None
+                u = urlparse(self.url)
+                if u.scheme == "unix" and os.path.exists(self.unix_path(u.hostname)):
+                    os.remove(self.unix_path(u.hostname))
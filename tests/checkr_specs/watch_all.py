@@ -0,0 +1,11 @@
+#
+# An assertion that declares no events: it subscribes to all of them
+#
+
+def watch_on_query_received():
+    while True:
+        yield WaitEvent(on_query_received)
+
+def mainfn(oro):
+    t0 = Task(watch_on_query_received)
+    yield NoReason()
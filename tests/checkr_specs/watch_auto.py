@@ -0,0 +1,29 @@
+#
+# An assertion whose events are found in its code: in a function, a method and a closure
+#
+
+SUBSCRIBE = "auto"
+
+def watch_on_query_received():
+    while True:
+        yield WaitEvent(on_query_received)
+
+class Watcher:
+
+    def watch(self):
+        while True:
+            yield WaitEvent(on_query_handled)
+
+def make_watcher():
+    def watch():
+        while True:
+            yield WaitEvent(on_one_tool_called)
+    return watch
+
+watch_on_one_tool_called = make_watcher()
+
+def mainfn(oro):
+    t0 = Task(watch_on_query_received)
+    t1 = Task(Watcher().watch)
+    t2 = Task(watch_on_one_tool_called)
+    yield NoReason()
@@ -0,0 +1,13 @@
+#
+# An assertion that declares its events
+#
+
+SUBSCRIBE = ["on_query_handled"]
+
+def watch_on_query_handled():
+    while True:
+        yield WaitEvent(on_query_handled)
+
+def mainfn(oro):
+    t0 = Task(watch_on_query_handled)
+    yield NoReason()
@@ -0,0 +1,66 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("fastapi")
+pytest.importorskip("nlip_sdk")
+
+from nlip_sdk.nlip import NLIP_Factory
+
+from checkr_agents.http_server.nlip_session_server import AgentSessionManager, NlipSessionServer, results_message
+
+
+class StubAgent:
+
+    def __init__(self, results):
+        self.results = results
+
+    async def process_query(self, query):
+        return self.results
+
+    async def process_query_stream(self, query):
+        yield {"type": "text", "content": "partial"}
+        yield {"type": "done", "results": self.results}
+
+
+class StubManager(AgentSessionManager):
+
+    def __init__(self, results):
+        self.myAgent = StubAgent(results)
+
+
+def test_results_message_without_results():
+    assert results_message([ ]).extract_text(language=None) == ""
+
+
+def test_results_message_parts():
+    msg = results_message(["one", "two"])
+    assert "one" in msg.extract_text(language=None)
+    assert "two" in msg.extract_text(language=None)
+
+
+def test_process_nlip_without_results():
+    manager = StubManager([ ])
+    response = asyncio.run(manager.process_nlip(NLIP_Factory.create_text("Hi")))
+    assert response.extract_text(language=None) == ""
+
+
+def test_process_nlip_stream_without_results():
+    manager = StubManager([ ])
+
+    async def collect():
+        return [event async for event in manager.process_nlip_stream(NLIP_Factory.create_text("Hi"))]
+
+    events = asyncio.run(collect())
+    assert events[0] == {"type": "text", "content": "partial"}
+    assert events[-1]["type"] == "done"
+
+
+def test_agent_sessions_share_the_checkr_shutdown_and_metrics():
+    pytest.importorskip("oroboro")
+    from checkr_agents.agents.checkr import flush_checkrs, checkr_metrics
+
+    app = NlipSessionServer("Test", StubManager, session_backend=None)
+    assert flush_checkrs in app.shared_shutdown_callbacks
+    assert flush_checkrs not in app.shutdown_callbacks
+    assert app.metrics_providers["checkr"] is checkr_metrics
@@ -0,0 +1,87 @@
+import asyncio
+import json
+
+from checkr_agents.agents.capability_registry import CapabilityRegistry, is_capability_query
+
+
+def read(path) -> dict:
+    with open(path) as f:
+        return json.load(f)
+
+
+def test_is_capability_query():
+    assert is_capability_query("what are your  NLIP capabilities?")
+    assert not is_capability_query("What is the weather?")
+
+
+def test_put_get_and_persist(tmp_path):
+    path = str(tmp_path / "capabilities.json")
+    registry = CapabilityRegistry(path=path)
+
+    asyncio.run(registry.put("mem://weather", "My name is [Weather]"))
+    assert registry.get("mem://weather") == "My name is [Weather]"
+    assert read(path)["mem://weather"]["capabilities"] == "My name is [Weather]"
+
+    # preloaded by a new registry
+    assert CapabilityRegistry(path=path).get("mem://weather") == "My name is [Weather]"
+
+
+def test_expired_entries_are_not_returned(tmp_path):
+    registry = CapabilityRegistry(ttl=0.0)
+    asyncio.run(registry.put("mem://weather", "My name is [Weather]"))
+    assert registry.get("mem://weather") is None
+
+
+def test_invalidate(tmp_path):
+    path = str(tmp_path / "capabilities.json")
+    registry = CapabilityRegistry(path=path)
+
+    async def run():
+        await registry.put("mem://weather", "Weather")
+        await registry.put("mem://rag", "Rag")
+        await registry.invalidate("mem://weather")
+        assert set(read(path)) == {"mem://rag"}
+        await registry.invalidate()
+        assert read(path) == { }
+
+    asyncio.run(run())
+    assert registry.metrics()["invalidations"] == 2
+
+
+def test_save_writes_the_snapshot_not_the_live_dict(tmp_path):
+    path = str(tmp_path / "capabilities.json")
+    registry = CapabilityRegistry(path=path)
+    registry.agents["mem://weather"] = {"capabilities": "Weather", "updated_at": 1.0}
+
+    snapshot = registry.snapshot()
+    registry.agents["mem://rag"] = {"capabilities": "Rag", "updated_at": 1.0}
+    registry.agents["mem://weather"]["capabilities"] = "changed"
+
+    registry.save(snapshot)
+    assert read(path) == {"mem://weather": {"capabilities": "Weather", "updated_at": 1.0}}
+
+
+def test_older_snapshots_are_not_written_over_newer_ones(tmp_path):
+    path = str(tmp_path / "capabilities.json")
+    registry = CapabilityRegistry(path=path)
+
+    registry.agents["mem://weather"] = {"capabilities": "Weather", "updated_at": 1.0}
+    older = registry.snapshot()
+    registry.agents["mem://rag"] = {"capabilities": "Rag", "updated_at": 1.0}
+    newer = registry.snapshot()
+
+    registry.save(newer)
+    registry.save(older)
+    assert set(read(path)) == {"mem://weather", "mem://rag"}
+
+
+def test_concurrent_puts_are_all_saved(tmp_path):
+    path = str(tmp_path / "capabilities.json")
+    registry = CapabilityRegistry(path=path)
+
+    async def run():
+        await asyncio.gather(*[registry.put(f"mem://agent{i}", f"Agent {i}") for i in range(50)])
+
+    asyncio.run(run())
+    assert len(read(path)) == 50
+    assert not [p for p in tmp_path.iterdir() if p.name.endswith(".tmp")]
@@ -0,0 +1,268 @@
+import asyncio
+import gc
+
+import pytest
+
+pytest.importorskip("oroboro")
+
+from checkr_agents.agents.checkr import Checkr, checkr_metrics, referenced_names
+
+
+def new_checkr(*names, **kwargs) -> Checkr:
+    checkr = Checkr(scoped=True, **kwargs)
+    checkr.set_event_log(None)
+    for name in names:
+        checkr.define_observer_event(name)
+    return checkr
+
+
+#
+# Deferred evaluation
+#
+
+def test_deferred_events_wait_for_flush():
+    checkr = new_checkr("on_query_received")
+    checkr.subscribe("on_query_received")
+    checkr.set_evaluation("deferred")
+    evt = checkr.define_observer_event("on_query_received")
+
+    async def run():
+        checkr.post_and_run(1.0, evt, "a")
+        checkr.post_and_run(2.0, evt, "b")
+        assert checkr.metrics()["queued"] == 2
+        assert checkr.metrics()["evaluated"] == 0
+
+        await checkr.flush()
+        assert checkr.metrics()["queued"] == 0
+        assert checkr.metrics()["evaluated"] == 2
+        await checkr.aclose()
+
+    asyncio.run(run())
+
+
+def test_deferred_without_a_loop_evaluates_inline():
+    checkr = new_checkr("on_query_received")
+    checkr.subscribe("on_query_received")
+    checkr.set_evaluation("deferred")
+
+    checkr.post_and_run(1.0, checkr.define_observer_event("on_query_received"), "a")
+    assert checkr.metrics()["evaluated"] == 1
+
+
+@pytest.mark.parametrize("overflow, evaluated, dropped, queued", [
+    ("inline", 2, 0, 1),
+    ("drop_oldest", 0, 1, 2),
+    ("drop_newest", 0, 1, 2),
+])
+def test_overflow_policies(overflow, evaluated, dropped, queued):
+    checkr = new_checkr("on_query_received")
+    checkr.subscribe("on_query_received")
+    checkr.set_evaluation("deferred", queue_size=2, overflow=overflow)
+    evt = checkr.define_observer_event("on_query_received")
+
+    async def run():
+        for i in range(3):
+            checkr.post_and_run(float(i), evt, i)
+
+        metrics = checkr.metrics()
+        assert metrics["overflows"] == 1
+        assert metrics["evaluated"] == evaluated
+        assert metrics["dropped"] == dropped
+        assert metrics["queued"] == queued
+
+        # what is left queued is still evaluated
+        await checkr.aclose()
+        assert checkr.metrics()["evaluated"] == 3 - dropped
+
+    asyncio.run(run())
+
+
+def test_flags_are_ordered_with_events():
+    checkr = new_checkr("on_query_received")
+    checkr.subscribe("on_query_received")
+    checkr.set_evaluation("deferred")
+
+    async def run():
+        checkr.set_flag("get_forecast")
+        assert checkr.get_flag("get_forecast") == 0
+        await checkr.flush()
+        assert checkr.get_flag("get_forecast") == 1
+        await checkr.aclose()
+
+    asyncio.run(run())
+
+
+def test_aclose_ends_the_drain_task():
+    checkr = new_checkr("on_query_received")
+    checkr.subscribe("on_query_received")
+    checkr.set_evaluation("deferred")
+
+    async def run():
+        checkr.post_and_run(1.0, checkr.define_observer_event("on_query_received"))
+        task = checkr.drain_task
+        assert task is not None
+
+        await checkr.aclose()
+        assert checkr.drain_task is None
+        await asyncio.sleep(0)
+        assert task.done()
+
+    asyncio.run(run())
+
+
+def test_metrics_of_all_live_checkrs():
+    gc.collect()    # the Checkrs of earlier tests leave the metrics now, not between the two reads
+    before = checkr_metrics()
+
+    first = new_checkr("on_query_received")
+    second = new_checkr("on_query_received")
+    first.subscribe("on_query_received")
+    second.subscribe("on_query_received")
+    for checkr in (first, first, second):
+        checkr.post_and_run(1.0, checkr.define_observer_event("on_query_received"))
+
+    after = checkr_metrics()
+    assert after["checkrs"] >= before["checkrs"] + 2
+    assert after["scoped"] >= before["scoped"] + 2
+    assert after["posted"] - before["posted"] == 3
+
+
+#
+# Forwarding to the aggregator
+#
+
+def test_forwarded_events_keep_the_time_they_were_posted():
+    aggregator = new_checkr("on_query_received")
+    aggregator.subscribe("on_query_received")
+
+    checkr = new_checkr("on_query_received", aggregator=aggregator)
+    checkr.set_evaluation("deferred")
+    checkr.tstart = aggregator.tstart + 10.0
+
+    async def run():
+        checkr.post_and_run(5.0, checkr.define_observer_event("on_query_received"))
+        assert aggregator.metrics()["posted"] == 0
+
+        # drained later; still posted at the time of the event, on the clock of the aggregator
+        await asyncio.sleep(0.05)
+        await checkr.aclose()
+        assert aggregator.metrics()["posted"] == 1
+        assert aggregator.last_t == pytest.approx(15.0)
+
+    asyncio.run(run())
+
+
+#
+# Subscriptions
+#
+
+EVENTS = ("on_query_received", "on_one_tool_called", "on_query_handled", "on_add_tool")
+
+
+def live_names(checkr: Checkr) -> set[str]:
+    return {name for name in EVENTS if checkr.is_live(checkr.define_observer_event(name))}
+
+
+def test_nothing_is_live_without_assertions():
+    checkr = new_checkr(*EVENTS)
+    assert live_names(checkr) == set()
+
+    checkr.post_and_run(1.0, checkr.define_observer_event("on_query_received"))
+    checkr.set_flag("get_forecast")
+    assert checkr.metrics()["skipped"] == 1
+    assert checkr.metrics()["posted"] == 0
+    assert checkr.get_flag("get_forecast") == 0
+
+
+def test_assertions_subscribe_to_all_events_by_default():
+    checkr = new_checkr(*EVENTS)
+    checkr.load_spec("checkr_specs.watch_all:mainfn")
+    assert live_names(checkr) == set(EVENTS)
+
+    # including the events defined after it was loaded
+    assert checkr.is_live(checkr.define_observer_event("on_query_analyzed"))
+
+
+def test_declared_subscriptions():
+    checkr = new_checkr(*EVENTS)
+    checkr.load_spec("checkr_specs.watch_declared:mainfn")
+    assert live_names(checkr) == {"on_query_handled"}
+
+    checkr.subscribe("on_add_tool")
+    assert live_names(checkr) == {"on_query_handled", "on_add_tool"}
+
+
+def test_auto_subscriptions_find_methods_and_closures():
+    checkr = new_checkr(*EVENTS)
+    checkr.load_spec("checkr_specs.watch_auto:mainfn")
+    assert live_names(checkr) == {"on_query_received", "on_one_tool_called", "on_query_handled"}
+
+
+def test_referenced_names():
+    checkr = new_checkr(*EVENTS)
+    checkr.load_spec("checkr_specs.watch_auto:mainfn")
+
+    names = referenced_names(checkr.mod)
+    assert {"on_query_received", "on_query_handled", "on_one_tool_called", "WaitEvent"} <= names
+    assert "on_add_tool" not in names
+
+
+def test_events_of_the_aggregator_are_forwarded():
+    aggregator = new_checkr()
+    aggregator.load_spec("checkr_specs.watch_declared:mainfn")
+
+    checkr = new_checkr(*EVENTS, aggregator=aggregator)
+    assert live_names(checkr) == {"on_query_handled"}
+
+    checkr.post_and_run(1.0, checkr.define_observer_event("on_query_handled"))
+    assert aggregator.metrics()["posted"] == 1
+    assert checkr.metrics()["posted"] == 0
+
+
+def test_new_events_elsewhere_do_not_invalidate_a_checkr():
+    checkr = new_checkr(*EVENTS)
+    checkr.load_spec("checkr_specs.watch_all:mainfn")
+    checkr.is_live(checkr.define_observer_event("on_query_received"))
+    seen = checkr.subscriptions_seen
+
+    other = new_checkr(*EVENTS)
+    other.define_observer_event("on_query_analyzed")
+
+    assert not checkr._subscriptions_stale()
+    assert checkr.subscriptions_seen == seen
+
+
+def test_event_log_makes_every_event_live(tmp_path):
+    from checkr_agents.agents.event_log import FileEventLog
+
+    checkr = new_checkr(*EVENTS)
+    checkr.set_event_log(FileEventLog(str(tmp_path / "events.ndjson")))
+    assert live_names(checkr) == set(EVENTS)
+    checkr.event_log.close()
+
+
+def test_flags_are_forwarded_to_the_aggregator():
+    aggregator = new_checkr()
+    aggregator.load_spec("checkr_specs.watch_all:mainfn")
+
+    checkr = new_checkr(*EVENTS, aggregator=aggregator)
+    checkr.set_flag("get_forecast")
+    assert checkr.get_flag("get_forecast") == 1
+    assert aggregator.get_flag("get_forecast") == 1
+
+    checkr.clear_flag("get_forecast")
+    assert aggregator.get_flag("get_forecast") == 0
+
+    checkr.set_flag("get_alerts")
+    checkr.clear_all_flags()
+    assert aggregator.flags == { }
+
+
+def test_flags_are_not_forwarded_to_an_idle_aggregator():
+    aggregator = new_checkr()
+    checkr = new_checkr(*EVENTS, aggregator=aggregator)
+    checkr.load_spec("checkr_specs.watch_all:mainfn")
+
+    checkr.set_flag("get_forecast")
+    assert checkr.get_flag("get_forecast") == 1
+    assert aggregator.get_flag("get_forecast") == 0
@@ -0,0 +1,153 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("litellm")
+pytest.importorskip("oroboro")
+
+from checkr_agents.agents import checkr_agent
+from checkr_agents.agents.checkr_agent import CheckrAgent
+
+
+#
+# Stand-ins for the LLM responses
+#
+
+class Message(SimpleNamespace):
+
+    def model_dump(self) -> dict:
+        return {
+            "role": "assistant",
+            "content": self.content,
+            "tool_calls": [{"id": c.id, "type": "function",
+                            "function": {"name": c.function.name, "arguments": c.function.arguments}}
+                           for c in self.tool_calls],
+        }
+
+
+def tool_call(call_id: str, name: str, **args) -> SimpleNamespace:
+    return SimpleNamespace(id=call_id, function=SimpleNamespace(name=name, arguments=json.dumps(args)))
+
+def response(content=None, tool_calls=None) -> SimpleNamespace:
+    return SimpleNamespace(choices=[SimpleNamespace(message=Message(content=content, tool_calls=tool_calls))])
+
+
+def scripted(monkeypatch, *responses):
+    """Answer the agent's completions with responses, in order."""
+    remaining = list(responses)
+
+    async def acompletion(**kwargs):
+        return remaining.pop(0)
+
+    monkeypatch.setattr(checkr_agent, "acompletion", acompletion)
+
+
+async def lookup(city: str) -> str:
+    """Look up a city"""
+    return f"{city}: sunny"
+
+
+def test_an_unfinished_turn_is_rolled_back(monkeypatch):
+    scripted(monkeypatch, response(tool_calls=[tool_call("c1", "lookup", city="Paris")]))
+    agent = CheckrAgent("Test", tools=[lookup], checkr_scope="agent")
+    before = list(agent.messages)
+
+    async def run():
+        events = agent.process_query_stream("Weather in Paris?", stream=False, context="Retrieved text")
+        async for event in events:
+            if event["type"] == "tool_call":
+                break
+        # the client disconnected after the tool call was announced
+        await events.aclose()
+
+    asyncio.run(run())
+    assert agent.messages == before
+    assert agent.turn_context == [ ]
+
+
+def test_a_failed_turn_is_rolled_back(monkeypatch):
+    async def broken(city: str) -> str:
+        """Look up a city"""
+        raise RuntimeError("upstream is down")
+
+    scripted(monkeypatch, response(tool_calls=[tool_call("c1", "broken", city="Paris")]))
+    agent = CheckrAgent("Test", tools=[broken], checkr_scope="agent")
+    before = list(agent.messages)
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(agent.process_query("Weather in Paris?"))
+    assert agent.messages == before
+
+
+def test_stream_chunks_without_choices_are_skipped(monkeypatch):
+    def chunk(text):
+        return SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=text))])
+
+    async def acompletion(**kwargs):
+        async def chunks():
+            yield chunk("Hello")
+            yield SimpleNamespace(choices=[ ])      # a usage or keep-alive chunk
+            yield chunk(" there")
+        return chunks()
+
+    monkeypatch.setattr(checkr_agent, "acompletion", acompletion)
+    agent = CheckrAgent("Test", checkr_scope="agent")
+
+    async def run():
+        chunks = [ ]
+        deltas = [delta async for delta in agent._stream_completion(chunks)]
+        return deltas, chunks
+
+    deltas, chunks = asyncio.run(run())
+    assert deltas == ["Hello", " there"]
+    assert len(chunks) == 3
+
+
+@pytest.mark.parametrize("scope,closed", [("agent", True), ("class", False), ("process", False)])
+def test_cleanup_closes_only_a_checkr_of_its_own(scope, closed):
+    class ScopedAgent(CheckrAgent):
+        pass
+
+    agent = ScopedAgent("Test", checkr_scope=scope)
+    other = ScopedAgent("Other", checkr_scope=scope)
+    checkr = agent.checkr
+    checkr.set_evaluation("deferred")
+    event = checkr.define_observer_event("on_query_handled")
+    checkr.subscribe("on_query_handled")
+
+    async def run():
+        checkr.post_and_run(checkr.trel(), event)
+        await agent.cleanup()
+        assert len(checkr.queue) == 0
+        assert (checkr.drain_task is None) == closed
+        await checkr.aclose()
+
+    asyncio.run(run())
+    checkr.set_evaluation("inline")
+    assert (other.checkr is checkr) == (scope != "agent")
+
+
+def test_concurrent_tool_results_keep_the_call_order(monkeypatch):
+    running = {"now": 0, "most": 0}
+
+    async def slow(n: int) -> str:
+        """Return n, later for smaller n"""
+        running["now"] += 1
+        running["most"] = max(running["most"], running["now"])
+        await asyncio.sleep((5 - n) * 0.01)
+        running["now"] -= 1
+        return f"result {n}"
+
+    calls = [tool_call(f"c{n}", "slow", n=n) for n in range(5)]
+    scripted(monkeypatch, response(tool_calls=calls), response(content="All done"))
+    agent = CheckrAgent("Test", tools=[slow], tool_concurrency=2, checkr_scope="agent")
+
+    results = asyncio.run(agent.process_query("Run them all"))
+
+    tool_messages = [m for m in agent.messages if isinstance(m, dict) and m.get("role") == "tool"]
+    assert [m["tool_call_id"] for m in tool_messages] == [f"c{n}" for n in range(5)]
+    assert [m["content"] for m in tool_messages] == [f"result {n}" for n in range(5)]
+    assert running["most"] == 2
+    assert results[-1] == "All done"
@@ -0,0 +1,83 @@
+import json
+import socket
+import threading
+
+from checkr_agents.agents import event_log
+from checkr_agents.agents.event_log import SocketEventLog, event_log_from_url, FileEventLog
+
+
+def listen(path: str) -> tuple[socket.socket, list]:
+    """A checker that collects the lines it receives."""
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(path)
+    server.listen(1)
+    received = [ ]
+
+    def serve():
+        conn, _ = server.accept()
+        with conn, conn.makefile("rb") as f:
+            for line in f:
+                received.append(json.loads(line))
+
+    thread = threading.Thread(target=serve, daemon=True)
+    thread.start()
+    return thread, received
+
+
+def test_socket_log_streams_events_in_order(tmp_path):
+    path = str(tmp_path / "checker.sock")
+    thread, received = listen(path)
+
+    log = SocketEventLog(path)
+    for i in range(100):
+        log.emit({"event": "on_query_received", "args": [i]})
+    log.close()
+    thread.join(1.0)
+
+    assert [r["args"][0] for r in received] == list(range(100))
+    assert log.metrics() == {"written": 100, "dropped": 0, "queued": 0}
+
+
+def test_socket_log_drops_lines_when_the_writer_is_behind(tmp_path, monkeypatch):
+    entered = threading.Event()
+    release = threading.Event()
+
+    def slow_write(self, line):
+        entered.set()
+        release.wait()
+        return True
+
+    monkeypatch.setattr(SocketEventLog, "write", slow_write)
+    log = SocketEventLog(str(tmp_path / "checker.sock"), queue_size=2)
+
+    log.emit({"event": "first"})
+    assert entered.wait(1.0)
+
+    # the writer is stuck on the first line: two more are queued, the rest dropped at once
+    for i in range(4):
+        log.emit({"event": "next", "args": [i]})
+    assert log.metrics() == {"written": 0, "dropped": 2, "queued": 2}
+
+    release.set()
+    log.close()
+    assert log.metrics()["written"] == 3
+
+
+def test_socket_log_without_a_checker_drops(tmp_path, monkeypatch):
+    monkeypatch.setattr(event_log, "RECONNECT_INTERVAL", 60.0)
+    log = SocketEventLog(str(tmp_path / "nobody.sock"))
+    log.emit({"event": "on_query_received"})
+    log.emit({"event": "on_query_received"})
+    log.close()
+    assert log.metrics() == {"written": 0, "dropped": 2, "queued": 0}
+
+
+def test_event_log_from_url(tmp_path):
+    assert event_log_from_url(None) is None
+    assert isinstance(event_log_from_url("unix:///tmp/checker.sock"), SocketEventLog)
+
+    log = event_log_from_url(f"file://{tmp_path}/events.ndjson")
+    assert isinstance(log, FileEventLog)
+    log.emit({"event": "on_query_received"})
+    log.close()
+    assert json.loads(open(tmp_path / "events.ndjson").read()) == {"event": "on_query_received"}
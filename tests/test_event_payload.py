@@ -0,0 +1,102 @@
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from checkr_agents.agents.event_log import encode
+from checkr_agents.agents.event_payload import (
+    ResponseEvent, ToolCallEvent, content_hash, payload_from_dict
+)
+
+
+def make_response(content="The answer is 42.", tool_names=( )):
+    tool_calls = [SimpleNamespace(function=SimpleNamespace(name=name)) for name in tool_names]
+    message = SimpleNamespace(content=content, tool_calls=tool_calls or None)
+    response = SimpleNamespace(
+        model="gpt-test",
+        usage=SimpleNamespace(prompt_tokens=10, completion_tokens=5),
+        choices=[SimpleNamespace(finish_reason="stop")],
+    )
+    return response, message
+
+
+def through_the_log(payload):
+    """The payload as the event checker sees it, after the event log."""
+    record = json.loads(encode({"event": "on_one_tool_called", "args": [payload]}))
+    return payload_from_dict(record["args"][0])
+
+
+def test_response_event():
+    response, message = make_response(tool_names=("get_forecast",))
+    payload = ResponseEvent(response, message)
+
+    assert payload.model == "gpt-test"
+    assert payload.prompt_tokens == 10 and payload.completion_tokens == 5
+    assert payload.tool_names == ("get_forecast",)
+    assert payload.content_length == len("The answer is 42.")
+    assert payload.content_hash == content_hash("The answer is 42.")
+    assert payload.message is None
+    assert "message" not in payload.to_dict()
+
+
+def test_response_event_round_trip():
+    response, message = make_response(tool_names=("get_forecast", "get_alerts"))
+    payload = ResponseEvent(response, message)
+
+    replayed = through_the_log(payload)
+    assert isinstance(replayed, ResponseEvent)
+    for name in ResponseEvent.__slots__:
+        assert getattr(replayed, name) == getattr(payload, name)
+
+
+def test_tool_call_event_round_trip():
+    payload = ToolCallEvent("get_forecast", {"latitude": 37.8, "longitude": -122.3}, "Sunny", keep_content=True)
+
+    replayed = through_the_log(payload)
+    assert isinstance(replayed, ToolCallEvent)
+    assert replayed.name == "get_forecast"
+    assert replayed.args == {"latitude": 37.8, "longitude": -122.3}
+    assert replayed.result == "Sunny"
+    assert replayed.result_length == 5
+
+    # without the content
+    assert through_the_log(ToolCallEvent("get_forecast", { }, "Sunny")).result is None
+
+
+def test_access_by_name():
+    payload = ToolCallEvent("get_forecast", { }, "Sunny")
+    assert payload["name"] == "get_forecast"
+    assert payload["result_hash"] == content_hash("Sunny")
+    with pytest.raises(KeyError):
+        payload["content"]
+
+
+def test_tuple_access_is_a_clear_error():
+    payload = ToolCallEvent("get_forecast", { }, "Sunny")
+
+    with pytest.raises(TypeError, match="ToolCallEvent is a record, not a tuple"):
+        name, args, result = payload
+
+    with pytest.raises(TypeError, match="'result_length'"):
+        payload[2]
+
+
+def test_other_values_are_left_alone():
+    assert payload_from_dict({"text": "hi"}) == {"text": "hi"}
+    assert payload_from_dict("hi") == "hi"
+
+
+def test_replayer_rebuilds_payloads(monkeypatch):
+    pytest.importorskip("oroboro")
+    from checkr_agents.agents.event_checker import EventReplayer
+
+    replayer = EventReplayer([ ])
+    posted = [ ]
+    monkeypatch.setattr(replayer.checkr, "post_and_run", lambda t, evt, *args: posted.append(args))
+
+    line = encode({"ts": 1.0, "t": 1.0, "source": "process", "event": "on_one_tool_called",
+                   "args": [ToolCallEvent("get_forecast", { }, "Sunny")]})
+    replayer.replay_line(line.decode())
+
+    assert isinstance(posted[0][0], ToolCallEvent)
+    assert posted[0][0].name == "get_forecast"
@@ -0,0 +1,104 @@
+import pytest
+
+pytest.importorskip("litellm")
+
+from checkr_agents.agents.history import HistoryManager, SUMMARY_PREFIX, turn_message, prompt_messages
+
+MODEL = "gpt-3.5-turbo"
+
+
+def system(text):
+    return {"role": "system", "content": text}
+
+def user(text):
+    return {"role": "user", "content": text}
+
+def assistant(text):
+    return {"role": "assistant", "content": text}
+
+
+def conversation() -> list[dict]:
+    return [
+        system("You are a helpful agent."),
+        system("Answer briefly."),
+        user("first question " + "x " * 200),
+        assistant("first answer " + "y " * 200),
+        system("Context: for the second question"),
+        user("second question"),
+        assistant("second answer"),
+    ]
+
+
+def test_split_keeps_later_system_messages_with_their_turn():
+    history = HistoryManager(token_budget=100000)
+    leading, summary, turns = history._split(conversation())
+
+    assert leading == [system("You are a helpful agent."), system("Answer briefly.")]
+    assert summary == [ ]
+    assert len(turns) == 2
+    assert turns[1][0] == system("Context: for the second question")
+    assert turns[1][1] == user("second question")
+
+
+def test_split_reads_the_summary():
+    history = HistoryManager(token_budget=100000)
+    messages = [system("You are a helpful agent."), system(f"{SUMMARY_PREFIX}\n- user: hi")] + conversation()[2:]
+    leading, summary, turns = history._split(messages)
+
+    assert leading == [system("You are a helpful agent.")]
+    assert summary == ["- user: hi"]
+
+
+def test_history_within_budget_is_unchanged():
+    history = HistoryManager(token_budget=100000)
+    assert history.compact(conversation(), MODEL) == conversation()
+
+
+def test_compaction_keeps_context_with_its_turn():
+    history = HistoryManager(token_budget=120)
+    compacted = history.compact(conversation(), MODEL)
+
+    assert compacted[:2] == [system("You are a helpful agent."), system("Answer briefly.")]
+    assert compacted[2]["content"].startswith(SUMMARY_PREFIX)
+    assert compacted[3:] == [system("Context: for the second question"), user("second question"), assistant("second answer")]
+    assert history.metrics()["turns_dropped"] == 1
+
+
+def test_context_of_a_dropped_turn_goes_with_it():
+    messages = conversation() + [turn_message("Context: for the third question"), user("third question"), assistant("third answer")]
+    messages[4] = turn_message("Context: for the second question")
+    history = HistoryManager(token_budget=30, keep_turns=1, summarize=None)
+    compacted = history.compact(messages, MODEL)
+
+    assert compacted == [
+        system("You are a helpful agent."),
+        system("Answer briefly."),
+        turn_message("Context: for the third question"),
+        user("third question"),
+        assistant("third answer"),
+    ]
+
+
+def test_instructions_of_a_dropped_turn_are_kept():
+    messages = conversation() + [user("third question"), assistant("third answer")]
+    history = HistoryManager(token_budget=30, keep_turns=1, summarize=None)
+    compacted = history.compact(messages, MODEL)
+
+    # the instruction added before the second turn moves up with the others
+    assert compacted == [
+        system("You are a helpful agent."),
+        system("Answer briefly."),
+        system("Context: for the second question"),
+        user("third question"),
+        assistant("third answer"),
+    ]
+    assert history.metrics()["turns_dropped"] == 2
+
+
+def test_turn_context_markers_are_not_sent():
+    messages = [system("You are a helpful agent."), turn_message("Context"), user("question")]
+    assert prompt_messages(messages) == [system("You are a helpful agent."), system("Context"), user("question")]
+
+    # a history without markers is sent as it is
+    plain = messages[:1]
+    assert prompt_messages(plain) is plain
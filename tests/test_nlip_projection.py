@@ -0,0 +1,51 @@
+import json
+
+import pytest
+
+from checkr_agents.agents.nlip_projection import NlipProjection
+
+
+def message(content, *submessages) -> dict:
+    return {"format": "text", "subformat": "english", "content": content, "submessages": list(submessages)}
+
+def part(content, format="text", subformat="english", label=None) -> dict:
+    return {"format": format, "subformat": subformat, "content": content, "label": label}
+
+
+def test_text_projection():
+    msg = message("Sunny", part({"t": 50}, "structured", "json"))
+    assert NlipProjection("text").project(msg) == "Sunny\n[structured/json: 9 characters]"
+
+
+def test_json_projection_leaves_out_the_default_envelope():
+    msg = message("Sunny", part("Ensoleillé", subformat="french", label="fr"))
+    assert json.loads(NlipProjection("json").project(msg)) == [
+        {"content": "Sunny"},
+        {"content": "Ensoleillé", "format": "text", "subformat": "french", "label": "fr"},
+    ]
+
+
+def test_summary_projection_notes_what_was_left_out():
+    result = NlipProjection("summary", max_chars=10).project(message("x" * 30, part("y" * 30)))
+    assert result.startswith("x" * 10 + "... [truncated 51 characters of 61 in 2 parts: text/english]")
+
+
+@pytest.mark.parametrize("max_chars", [200, 400, 1000])
+def test_large_json_projection_still_parses(max_chars):
+    msg = message("short", part("x" * 5000), part({"rows": list(range(500))}, "structured", "json"))
+    result = NlipProjection("json", max_chars=max_chars).project(msg)
+
+    assert len(result) <= max_chars
+    short, text, structured = json.loads(result)
+    assert short == {"content": "short"}
+    assert text["content"].startswith("x") and "truncated" in text["content"]
+    assert structured["format"] == "structured" and "truncated" in structured["content"]
+
+
+def test_from_string():
+    projection = NlipProjection.from_string("json:100")
+    assert (projection.mode, projection.max_chars) == ("json", 100)
+    assert NlipProjection.from_string("summary:0").max_chars is None
+
+    with pytest.raises(ValueError):
+        NlipProjection.from_string("xml")
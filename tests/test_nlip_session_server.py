@@ -0,0 +1,196 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("fastapi")
+pytest.importorskip("nlip_sdk")
+
+from nlip_sdk.nlip import NLIP_Factory, NLIP_Message
+
+from checkr_agents.http_server.nlip_session_server import NlipSessionServer, SessionManager
+from checkr_agents.http_server.session_backend import MemorySessionBackend
+
+
+class EchoManager(SessionManager):
+
+    closed = [ ]
+
+    async def process_nlip(self, msg: NLIP_Message) -> NLIP_Message:
+        return NLIP_Factory.create_text(msg.extract_text(language=None))
+
+    async def aclose(self):
+        EchoManager.closed.append(self.session_id)
+
+
+def test_evicted_sessions_are_closed():
+    EchoManager.closed = [ ]
+    app = NlipSessionServer("Test", EchoManager, max_sessions=1, session_backend=None)
+
+    async def run():
+        _, first = await app.dispatch(NLIP_Factory.create_text("Hi"))
+        assert app.started and app.reaper_task is not None
+
+        _, second = await app.dispatch(NLIP_Factory.create_text("Hi"))
+        assert EchoManager.closed == [first]
+
+        await app.shutdown()
+        assert EchoManager.closed == [first, second]
+        assert app.reaper_task is None
+
+    asyncio.run(run())
+
+
+def test_expired_sessions_are_closed_by_the_reaper():
+    EchoManager.closed = [ ]
+    app = NlipSessionServer("Test", EchoManager, session_ttl=0.05, reap_interval=0.05, session_backend=None)
+
+    async def run():
+        _, session_id = await app.dispatch(NLIP_Factory.create_text("Hi"))
+        await asyncio.sleep(0.3)
+        assert EchoManager.closed == [session_id]
+        assert len(app.sessions) == 0
+        await app.shutdown()
+
+    asyncio.run(run())
+
+
+class CountingManager(SessionManager):
+
+    def __init__(self):
+        self.count = 0
+
+    async def process_nlip(self, msg: NLIP_Message) -> NLIP_Message:
+        self.count += 1
+        return NLIP_Factory.create_text(str(self.count))
+
+    def get_state(self) -> dict:
+        return {"count": self.count}
+
+    def set_state(self, state: dict):
+        self.count = state["count"]
+
+
+def test_sessions_move_between_workers_with_the_backend():
+    backend = MemorySessionBackend()
+    first = NlipSessionServer("First", CountingManager, session_backend=backend)
+    second = NlipSessionServer("Second", CountingManager, session_backend=backend)
+
+    async def run():
+        response, session_id = await first.dispatch(NLIP_Factory.create_text("Hi"))
+        assert response.extract_text(language=None) == "1"
+        assert first.sessions.get(session_id).state_version == 1
+
+        # rehydrated by the other worker, which saves a newer version
+        response, _ = await second.dispatch(NLIP_Factory.create_text("Hi"), session_id)
+        assert response.extract_text(language=None) == "2"
+        assert second.sessions.get(session_id).state_version == 2
+
+        # the first worker holds version 1 and reloads the newer one
+        response, _ = await first.dispatch(NLIP_Factory.create_text("Hi"), session_id)
+        assert response.extract_text(language=None) == "3"
+        assert first.sessions.get(session_id).state_version == 3
+
+        # an up to date session is not reloaded
+        manager = first.sessions.get(session_id)
+        assert await first.session_manager_for(session_id) is manager
+        assert manager.count == 3
+
+        await first.shutdown()
+        await second.shutdown()
+
+    asyncio.run(run())
+
+
+def test_concurrent_saves_of_a_session_conflict():
+    backend = MemorySessionBackend()
+    first = NlipSessionServer("First", CountingManager, session_backend=backend)
+    second = NlipSessionServer("Second", CountingManager, session_backend=backend)
+
+    async def run():
+        _, session_id = await first.dispatch(NLIP_Factory.create_text("Hi"))
+        await second.dispatch(NLIP_Factory.create_text("Hi"), session_id)
+
+        # both hold version 2; the first saves version 3, the second reloads it instead of overwriting
+        first_manager = await first.session_manager_for(session_id)
+        second_manager = await second.session_manager_for(session_id)
+        assert first_manager.state_version == second_manager.state_version == 2
+        first_manager.set_state({"count": 10})
+        await first.save_session(first_manager)
+        second_manager.set_state({"count": 20})
+        await second.save_session(second_manager)
+
+        assert await backend.load(session_id) == (3, {"count": 10})
+        assert (second_manager.count, second_manager.state_version) == (10, 3)
+        assert second.save_conflicts == 1 and first.save_conflicts == 0
+
+        await first.shutdown()
+        await second.shutdown()
+
+    asyncio.run(run())
+
+
+def test_shared_resources_are_closed_by_the_last_app():
+    closed = [ ]
+
+    async def close_shared():
+        closed.append("shared")
+
+    first = NlipSessionServer("First", EchoManager, session_backend=None)
+    second = NlipSessionServer("Second", EchoManager, session_backend=None)
+    first.add_shared_shutdown_callback(close_shared)
+    second.add_shared_shutdown_callback(close_shared)
+
+    async def run():
+        await first.startup()
+        await second.startup()
+
+        await first.shutdown()
+        assert closed == [ ]
+
+        await second.shutdown()
+        assert closed == ["shared"]
+
+    asyncio.run(run())
+
+
+class SlowManager(EchoManager):
+
+    release = None
+
+    async def process_nlip(self, msg: NLIP_Message) -> NLIP_Message:
+        await SlowManager.release.wait()
+        return await super().process_nlip(msg)
+
+
+def test_sessions_with_a_running_request_are_not_closed():
+    EchoManager.closed = [ ]
+    app = NlipSessionServer("Test", SlowManager, max_sessions=1, session_backend=None)
+
+    async def run():
+        # a new session does not evict the one with a running request
+        SlowManager.release = asyncio.Event()
+        first = asyncio.create_task(app.dispatch(NLIP_Factory.create_text("Hi")))
+        await asyncio.sleep(0.01)
+        second = asyncio.create_task(app.dispatch(NLIP_Factory.create_text("Hi")))
+        await asyncio.sleep(0.01)
+        assert len(app.sessions) == 2
+        assert EchoManager.closed == [ ]
+
+        SlowManager.release.set()
+        _, first_id = await first
+        await second
+
+        # a session removed while its request runs is closed when the request finishes
+        SlowManager.release = asyncio.Event()
+        third = asyncio.create_task(app.dispatch(NLIP_Factory.create_text("Hi"), first_id))
+        await asyncio.sleep(0.01)
+        await app.close_sessions([app.sessions.remove(first_id)])
+        assert EchoManager.closed == [ ]
+
+        SlowManager.release.set()
+        await third
+        assert EchoManager.closed == [first_id]
+
+        await app.shutdown()
+
+    asyncio.run(run())
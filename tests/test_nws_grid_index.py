@@ -0,0 +1,59 @@
+import asyncio
+import json
+
+from checkr_agents.agents.nws_grid_index import GridIndex
+
+PROPERTIES = {
+    "forecast": "https://api.weather.gov/gridpoints/LOT/76,73/forecast",
+    "gridId": "LOT",
+    "gridX": 76,
+    "gridY": 73,
+}
+
+
+def read(path) -> dict:
+    with open(path) as f:
+        return json.load(f)
+
+
+def test_key_rounds_to_the_nws_precision():
+    index = GridIndex()
+    assert index.key(41.878113, -87.629799) == "41.8781,-87.6298"
+
+
+def test_put_get_and_persist(tmp_path):
+    path = str(tmp_path / "grids.json")
+    index = GridIndex(path=path)
+
+    assert index.get(41.8781, -87.6298) is None
+    grid = asyncio.run(index.put_from_points(41.8781, -87.6298, PROPERTIES))
+    assert grid["office"] == "LOT"
+    assert index.get(41.87811, -87.62979) == grid
+    assert index.metrics()["hits"] == 1 and index.metrics()["misses"] == 1
+
+    assert read(path)["41.8781,-87.6298"] == grid
+    assert GridIndex(path=path).get(41.8781, -87.6298) == grid
+
+
+def test_save_writes_the_snapshot_not_the_live_dict(tmp_path):
+    path = str(tmp_path / "grids.json")
+    index = GridIndex(path=path)
+    asyncio.run(index.put_from_points(41.8781, -87.6298, PROPERTIES))
+
+    snapshot = index.snapshot()
+    index.grids["41.8781,-87.6298"]["office"] = "changed"
+    index.grids["0.0,0.0"] = {"forecast": "x"}
+
+    index.save(snapshot)
+    assert read(path) == {"41.8781,-87.6298": {"forecast": PROPERTIES["forecast"], "office": "LOT", "gridX": 76, "gridY": 73}}
+
+
+def test_concurrent_puts_are_all_saved(tmp_path):
+    path = str(tmp_path / "grids.json")
+    index = GridIndex(path=path)
+
+    async def run():
+        await asyncio.gather(*[index.put_from_points(40.0 + i / 100, -87.0, PROPERTIES) for i in range(50)])
+
+    asyncio.run(run())
+    assert len(read(path)) == 50
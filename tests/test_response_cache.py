@@ -0,0 +1,117 @@
+import asyncio
+
+import pytest
+
+httpx = pytest.importorskip("httpx")
+
+from checkr_agents.http_client import response_cache
+from checkr_agents.http_client.response_cache import ResponseCache, parse_cache_control
+
+URL = "https://api.example.com/points/1"
+
+
+class Upstream:
+    """An API whose document carries an ETag; it answers 304 to a request with that ETag."""
+
+    def __init__(self, headers: dict):
+        self.headers = headers
+        self.requests = [ ]
+
+    def __call__(self, request):
+        self.requests.append(request)
+        if request.headers.get("if-none-match") == '"v1"':
+            return httpx.Response(304, headers=self.headers)
+        return httpx.Response(200, json={"forecast": "sunny"}, headers={"etag": '"v1"', **self.headers})
+
+
+def make_cache(monkeypatch, headers: dict, **kwargs) -> tuple[ResponseCache, Upstream]:
+    upstream = Upstream(headers)
+    client = httpx.AsyncClient(transport=httpx.MockTransport(upstream))
+    monkeypatch.setattr(response_cache, "http_client", lambda url: client)
+    return ResponseCache(**kwargs), upstream
+
+
+def test_parse_cache_control():
+    assert parse_cache_control('max-age=60, public, community="UCI"') == {"max-age": "60", "public": None, "community": "UCI"}
+    assert parse_cache_control(None) == { }
+
+
+def test_fresh_entries_are_returned_without_a_request(monkeypatch):
+    cache, upstream = make_cache(monkeypatch, {"cache-control": "max-age=60"})
+
+    async def run():
+        assert await cache.get_json(URL) == {"forecast": "sunny"}
+        assert await cache.get_json(URL) == {"forecast": "sunny"}
+
+    asyncio.run(run())
+    assert len(upstream.requests) == 1
+    assert cache.metrics()["hits"] == 1 and cache.metrics()["misses"] == 1
+
+
+def test_stale_entries_are_revalidated_with_the_etag(monkeypatch):
+    cache, upstream = make_cache(monkeypatch, {"cache-control": "no-cache"})
+
+    async def run():
+        assert await cache.get_json(URL) == {"forecast": "sunny"}
+        assert await cache.get_json(URL) == {"forecast": "sunny"}
+
+    asyncio.run(run())
+    assert "if-none-match" not in upstream.requests[0].headers
+    assert upstream.requests[1].headers["if-none-match"] == '"v1"'
+    assert cache.metrics()["revalidated"] == 1 and cache.metrics()["misses"] == 1
+
+
+def test_no_store_responses_are_not_kept(monkeypatch):
+    cache, upstream = make_cache(monkeypatch, {"cache-control": "no-store"})
+
+    async def run():
+        await cache.get_json(URL)
+        await cache.get_json(URL)
+
+    asyncio.run(run())
+    assert len(cache.entries) == 0
+    assert all("if-none-match" not in r.headers for r in upstream.requests)
+    assert cache.metrics()["misses"] == 2
+
+
+def test_tool_ttl_overrides_the_response(monkeypatch):
+    cache, upstream = make_cache(monkeypatch, {"cache-control": "no-cache"})
+
+    async def run():
+        await cache.get_json(URL, ttl=60.0)
+        await cache.get_json(URL, ttl=60.0)
+
+    asyncio.run(run())
+    assert len(upstream.requests) == 1
+
+
+def test_entries_persist_in_sqlite(monkeypatch, tmp_path):
+    path = str(tmp_path / "responses.db")
+    cache, upstream = make_cache(monkeypatch, {"cache-control": "no-cache"}, path=path)
+
+    async def run():
+        await cache.get_json(URL)
+        await cache.aclose()
+
+        # a new cache (a restart) revalidates the stored entry instead of fetching it again
+        restarted = ResponseCache(path=path)
+        assert await restarted.get_json(URL) == {"forecast": "sunny"}
+        assert restarted.metrics()["revalidated"] == 1
+        await restarted.aclose()
+
+    asyncio.run(run())
+    assert upstream.requests[-1].headers["if-none-match"] == '"v1"'
+
+
+def test_invalidated_entries_are_fetched_in_full(monkeypatch, tmp_path):
+    cache, upstream = make_cache(monkeypatch, {"cache-control": "max-age=60"}, path=str(tmp_path / "responses.db"))
+
+    async def run():
+        await cache.get_json(URL)
+        await cache.invalidate(URL)
+        await cache.get_json(URL)
+        await cache.aclose()
+
+    asyncio.run(run())
+    assert len(upstream.requests) == 2
+    assert "if-none-match" not in upstream.requests[1].headers
@@ -0,0 +1,105 @@
+import asyncio
+
+import pytest
+
+from checkr_agents.http_server import session_backend
+from checkr_agents.http_server.session_backend import (
+    MemorySessionBackend, SqliteSessionBackend, session_backend_from_url
+)
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def backend(request, tmp_path):
+    if request.param == "memory":
+        backend = MemorySessionBackend()
+    else:
+        backend = SqliteSessionBackend(str(tmp_path / "sessions.db"))
+    yield backend
+    asyncio.run(backend.close())
+
+
+def test_round_trip(backend):
+    async def run():
+        assert await backend.load("s1") is None
+
+        await backend.save("s1", 1, {"messages": [{"role": "user", "content": "Hi"}]})
+        assert await backend.load("s1") == (1, {"messages": [{"role": "user", "content": "Hi"}]})
+
+        await backend.save("s1", 2, {"messages": [ ]})
+        assert await backend.load("s1") == (2, {"messages": [ ]})
+
+        await backend.delete("s1")
+        assert await backend.load("s1") is None
+
+    asyncio.run(run())
+
+
+def test_load_only_newer_versions(backend):
+    async def run():
+        await backend.save("s1", 3, {"n": 3})
+        assert await backend.load("s1", newer_than=2) == (3, {"n": 3})
+        assert await backend.load("s1", newer_than=3) is None
+        assert await backend.load("s1", newer_than=4) is None
+
+    asyncio.run(run())
+
+
+def test_save_is_a_compare_and_set(backend):
+    async def run():
+        assert await backend.save("s1", 1, {"n": 1})
+
+        # two workers hold version 1: the first to save version 2 wins
+        assert await backend.save("s1", 2, {"worker": "first"})
+        assert not await backend.save("s1", 2, {"worker": "second"})
+        assert not await backend.save("s1", 1, {"worker": "stale"})
+        assert await backend.load("s1") == (2, {"worker": "first"})
+
+        # a purged (or deleted) session is stored again at any version
+        await backend.delete("s1")
+        assert await backend.save("s1", 5, {"n": 5})
+
+    asyncio.run(run())
+
+
+def test_purge_idle_sessions(backend, monkeypatch):
+    async def run():
+        await backend.save("old", 1, { })
+        assert await backend.purge(idle_ttl=60.0) == 0
+
+        now = session_backend.time.time()
+        monkeypatch.setattr(session_backend.time, "time", lambda: now + 120.0)
+        await backend.save("new", 1, { })
+
+        assert await backend.purge(idle_ttl=60.0) == 1
+        assert await backend.load("old") is None
+        assert await backend.load("new") == (1, { })
+
+    asyncio.run(run())
+
+
+def test_sqlite_is_shared_by_workers(tmp_path):
+    path = str(tmp_path / "sessions.db")
+    first = SqliteSessionBackend(path)
+    second = SqliteSessionBackend(path)
+
+    async def run():
+        await first.save("s1", 1, {"n": 1})
+        assert await second.load("s1") == (1, {"n": 1})
+        await first.close()
+        await second.close()
+
+    asyncio.run(run())
+
+
+def test_backend_from_url(tmp_path):
+    assert session_backend_from_url(None) is None
+    assert session_backend_from_url("") is None
+    assert isinstance(session_backend_from_url("memory://"), MemorySessionBackend)
+
+    backend = session_backend_from_url(f"sqlite:///{tmp_path}/sessions.db")
+    assert isinstance(backend, SqliteSessionBackend)
+    assert backend.path == f"{tmp_path}/sessions.db"
+    asyncio.run(backend.close())
+
+    with pytest.raises(Exception):
+        session_backend_from_url("redis://localhost")
@@ -0,0 +1,123 @@
+from checkr_agents.http_server import session_store
+from checkr_agents.http_server.session_store import SessionStore
+
+
+class Clock:
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_store(monkeypatch, **kwargs) -> tuple[SessionStore, Clock]:
+    clock = Clock()
+    monkeypatch.setattr(session_store.time, "monotonic", clock)
+    return SessionStore(**kwargs), clock
+
+
+def test_get_and_put(monkeypatch):
+    store, clock = make_store(monkeypatch, max_sessions=10, idle_ttl=60.0)
+
+    assert store.put("a", "manager-a") == [ ]
+    assert store.get("a") == "manager-a"
+    assert store.get("b") is None
+    assert "a" in store and "b" not in store
+    assert len(store) == 1
+
+
+def test_lru_eviction_returns_the_evicted(monkeypatch):
+    store, clock = make_store(monkeypatch, max_sessions=2, idle_ttl=None)
+
+    store.put("a", "manager-a")
+    store.put("b", "manager-b")
+
+    # "a" becomes the most recently used, so "b" is evicted
+    assert store.get("a") == "manager-a"
+    assert store.put("c", "manager-c") == ["manager-b"]
+
+    assert "b" not in store
+    assert store.get("a") == "manager-a"
+    assert store.get("c") == "manager-c"
+    assert store.metrics()["evicted"] == 1
+
+
+def test_idle_ttl(monkeypatch):
+    store, clock = make_store(monkeypatch, max_sessions=10, idle_ttl=60.0)
+
+    store.put("a", "manager-a")
+    clock.now += 30.0
+    store.put("b", "manager-b")
+
+    clock.now += 40.0
+    assert store.get("a") is None
+    assert "a" not in store
+    assert store.get("b") == "manager-b"
+
+    # the expired session is removed (and handed back) by the reaper
+    assert store.reap() == ["manager-a"]
+    assert store.reap() == [ ]
+    assert len(store) == 1
+    assert store.metrics()["expired"] == 1
+
+
+def test_put_returns_expired_and_replaced(monkeypatch):
+    store, clock = make_store(monkeypatch, max_sessions=10, idle_ttl=60.0)
+
+    store.put("a", "manager-a")
+    store.put("b", "manager-b")
+    clock.now += 61.0
+
+    # "a" expired; "b" is rehydrated with a new manager
+    assert sorted(store.put("b", "manager-b2")) == ["manager-a", "manager-b"]
+    assert store.get("b") == "manager-b2"
+
+
+def test_remove_and_clear(monkeypatch):
+    store, clock = make_store(monkeypatch, max_sessions=10, idle_ttl=None)
+
+    store.put("a", "manager-a")
+    store.put("b", "manager-b")
+
+    assert store.remove("a") == "manager-a"
+    assert store.remove("a") is None
+    assert store.clear() == ["manager-b"]
+    assert len(store) == 0
+
+
+def test_busy_sessions_are_not_evicted(monkeypatch):
+    busy = {"manager-a"}
+    store, clock = make_store(monkeypatch, max_sessions=2, idle_ttl=None, is_busy=lambda m: m in busy)
+
+    store.put("a", "manager-a")
+    store.put("b", "manager-b")
+
+    # "a" is the least recently used, but has a request running
+    assert store.put("c", "manager-c") == ["manager-b"]
+    assert store.get("a") == "manager-a"
+
+    # with every other session busy, the store goes over its bound
+    busy.add("manager-c")
+    busy.add("manager-a")
+    assert store.put("d", "manager-d") == [ ]
+    assert len(store) == 3
+
+
+def test_busy_sessions_do_not_expire(monkeypatch):
+    busy = {"manager-a"}
+    store, clock = make_store(monkeypatch, max_sessions=10, idle_ttl=60.0, is_busy=lambda m: m in busy)
+
+    store.put("a", "manager-a")
+    store.put("b", "manager-b")
+    clock.now += 61.0
+
+    assert store.reap() == ["manager-b"]
+    assert store.get("a") == "manager-a"
+
+    # idle again: it expires a full ttl after its request was last seen
+    busy.clear()
+    clock.now += 30.0
+    assert store.reap() == [ ]
+    clock.now += 31.0
+    assert store.reap() == ["manager-a"]
@@ -0,0 +1,71 @@
+import asyncio
+
+import pytest
+
+from checkr_agents.agents.single_flight import SingleFlight, call_key, coalesce
+
+
+def normalize_state(state: str) -> str:
+    return state.strip().upper()
+
+
+@coalesce
+async def plain(state: str) -> str:
+    return state
+
+
+@coalesce(key=lambda state: {"state": normalize_state(state)})
+async def normalized(state: str) -> str:
+    return normalize_state(state)
+
+
+def test_coalesce_marks_the_tool():
+    assert plain.coalesce and plain.coalesce_key is None
+    assert normalized.coalesce and normalized.coalesce_key is not None
+
+
+def test_call_key_uses_the_normalizer():
+    assert call_key(plain, {"state": "ca"}) != call_key(plain, {"state": "CA"})
+    assert call_key(normalized, {"state": " ca"}) == call_key(normalized, {"state": "CA"})
+    assert call_key(normalized, {"state": "CA"}) != call_key(plain, {"state": "CA"})
+
+
+def test_call_key_with_arguments_the_normalizer_rejects():
+    # the tool itself reports the bad call
+    assert call_key(normalized, {"region": "CA"}) == call_key(normalized, {"region": "CA"})
+
+
+def test_equivalent_calls_share_one_execution():
+    flight = SingleFlight()
+    executions = [ ]
+
+    async def fetch(state):
+        executions.append(state)
+        await asyncio.sleep(0.01)
+        return normalize_state(state)
+
+    async def run():
+        calls = [{"state": "ca"}, {"state": "CA"}, {"state": " Ca "}, {"state": "NY"}]
+        return await asyncio.gather(*[
+            flight.do(call_key(normalized, args), lambda args=args: fetch(**args)) for args in calls
+        ])
+
+    results = asyncio.run(run())
+    assert results == ["CA", "CA", "CA", "NY"]
+    assert len(executions) == 2
+    assert flight.metrics() == {"inflight": 0, "calls": 2, "coalesced": 2}
+
+
+def test_waiters_share_the_exception():
+    flight = SingleFlight()
+
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise ValueError("upstream")
+
+    async def run():
+        return await asyncio.gather(flight.do("k", fail), flight.do("k", fail), return_exceptions=True)
+
+    results = asyncio.run(run())
+    assert all(isinstance(r, ValueError) for r in results)
+    assert flight.metrics()["calls"] == 1
@@ -0,0 +1,86 @@
+import asyncio
+
+import pytest
+
+httpx = pytest.importorskip("httpx")
+pytest.importorskip("litellm")
+pytest.importorskip("oroboro")
+
+from checkr_agents.agents import weather_nlip_agent
+from checkr_agents.agents.nws_grid_index import GridIndex
+from checkr_agents.agents.weather_nlip_agent import get_forecast
+from checkr_agents.http_client import response_cache
+from checkr_agents.http_client.response_cache import ResponseCache
+
+POINTS_URL = "https://api.weather.gov/points/41.8781,-87.6298"
+OLD_GRID = "https://api.weather.gov/gridpoints/LOT/76,73/forecast"
+NEW_GRID = "https://api.weather.gov/gridpoints/LOT/77,73/forecast"
+
+FORECAST = {"properties": {"periods": [{
+    "name": "Tonight", "temperature": 50, "temperatureUnit": "F",
+    "windSpeed": "5 mph", "windDirection": "N", "detailedForecast": "Clear",
+}]}}
+
+
+class NWS:
+    """The NWS API, with a status for each URL (default 200)."""
+
+    def __init__(self, grid: str):
+        self.grid = grid
+        self.status = { }
+        self.requests = [ ]
+
+    def __call__(self, request):
+        url = str(request.url)
+        self.requests.append(url)
+        status = self.status.get(url, 200)
+        if status != 200:
+            return httpx.Response(status)
+        if "/points/" in url:
+            return httpx.Response(200, json={"properties": {"forecast": self.grid, "gridId": "LOT"}},
+                                  headers={"cache-control": "max-age=86400"})
+        return httpx.Response(200, json=FORECAST)
+
+
+@pytest.fixture
+def nws(monkeypatch) -> NWS:
+    nws = NWS(OLD_GRID)
+    client = httpx.AsyncClient(transport=httpx.MockTransport(nws))
+    monkeypatch.setattr(response_cache, "http_client", lambda url: client)
+    monkeypatch.setattr(weather_nlip_agent, "RESPONSE_CACHE", ResponseCache())
+    monkeypatch.setattr(weather_nlip_agent, "GRID_INDEX", GridIndex())
+    return nws
+
+
+def forecast() -> str:
+    return asyncio.run(get_forecast(41.8781, -87.6298))
+
+
+def test_indexed_grid_saves_the_points_request(nws):
+    assert "Tonight" in forecast()
+    assert "Tonight" in forecast()
+    assert nws.requests == [POINTS_URL, OLD_GRID, OLD_GRID]
+
+
+def test_a_reassigned_grid_is_looked_up_again(nws):
+    forecast()
+
+    nws.grid = NEW_GRID
+    nws.status[OLD_GRID] = 404
+    assert "Tonight" in forecast()
+
+    # the cached /points response is bypassed, and the new grid is indexed
+    assert nws.requests[-3:] == [OLD_GRID, POINTS_URL, NEW_GRID]
+    assert weather_nlip_agent.GRID_INDEX.get(41.8781, -87.6298)["forecast"] == NEW_GRID
+
+
+def test_a_failing_forecast_keeps_the_grid(nws):
+    forecast()
+
+    nws.status[OLD_GRID] = 503
+    assert forecast() == "Unable to fetch detailed forecast."
+    assert weather_nlip_agent.GRID_INDEX.get(41.8781, -87.6298)["forecast"] == OLD_GRID
+
+    del nws.status[OLD_GRID]
+    assert "Tonight" in forecast()
+    assert POINTS_URL not in nws.requests[1:]
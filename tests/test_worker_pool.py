@@ -0,0 +1,64 @@
+import asyncio
+import os
+import time
+
+import pytest
+
+pytest.importorskip("uvicorn")
+
+from checkr_agents.http_server.session_backend import SESSION_BACKEND_ENV
+from checkr_agents.system import worker_pool
+from checkr_agents.system.worker_pool import WorkerPool, environment
+
+from worker_app import RECORD_ENV
+
+
+def read_records(path) -> list[list[str]]:
+    if not os.path.exists(path):
+        return [ ]
+    with open(path) as f:
+        return [line.split(" ", 1) for line in f.read().splitlines()]
+
+
+def test_environment_is_restored(monkeypatch):
+    monkeypatch.setenv("WORKER_POOL_TEST_A", "before")
+    monkeypatch.delenv("WORKER_POOL_TEST_B", raising=False)
+
+    with environment({"WORKER_POOL_TEST_A": "during", "WORKER_POOL_TEST_B": "during"}):
+        assert os.environ["WORKER_POOL_TEST_A"] == "during"
+        assert os.environ["WORKER_POOL_TEST_B"] == "during"
+
+    assert os.environ["WORKER_POOL_TEST_A"] == "before"
+    assert "WORKER_POOL_TEST_B" not in os.environ
+
+
+def test_workers_see_options_and_are_restarted(tmp_path, monkeypatch):
+    monkeypatch.setattr(worker_pool, "SUPERVISE_INTERVAL", 0.1)
+    monkeypatch.setattr(worker_pool, "RESTART_DELAY", 0.1)
+    monkeypatch.delenv(SESSION_BACKEND_ENV, raising=False)
+
+    record = str(tmp_path / "workers.txt")
+    monkeypatch.setenv(RECORD_ENV, record)
+    backend = f"sqlite:///{tmp_path}/sessions.db"
+
+    pool = WorkerPool("worker_app:app", "unix://pooltest/", lambda name: str(tmp_path / f"{name}.sock"),
+                      processes=1, session_backend=backend, log_level="warning")
+
+    async def run():
+        task = asyncio.create_task(pool.supervise())
+        deadline = time.monotonic() + 60.0
+        while len(read_records(record)) < 2 and time.monotonic() < deadline:
+            await asyncio.sleep(0.1)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+    asyncio.run(run())
+
+    records = read_records(record)
+    assert len(records) >= 2, "the crashed worker was not restarted"
+    assert records[0][0] != records[1][0]
+    assert all(r[1] == backend for r in records)
+
+    # the option was only set for the workers
+    assert SESSION_BACKEND_ENV not in os.environ
+    assert not os.path.exists(tmp_path / "pooltest.sock")
@@ -0,0 +1,33 @@
+#
+# A minimal ASGI app for the worker pool tests.  Each worker records its pid and the session
+# backend it saw when it imported this module; the first worker to start crashes, so that it is restarted.
+#
+
+import os
+
+from checkr_agents.http_server.session_backend import SESSION_BACKEND_ENV
+
+# the file the workers record themselves in, set by the test
+RECORD_ENV = "WORKER_APP_RECORD"
+
+# read when the module is imported, as the servers read their options
+SESSION_BACKEND = os.environ.get(SESSION_BACKEND_ENV, "")
+
+
+async def app(scope, receive, send):
+    if scope["type"] != "lifespan":
+        return
+
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            record = os.environ[RECORD_ENV]
+            first = not os.path.exists(record)
+            with open(record, "a") as f:
+                f.write(f"{os.getpid()} {SESSION_BACKEND}\n")
+            if first:
+                os._exit(3)
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await send({"type": "lifespan.shutdown.complete"})
+            return